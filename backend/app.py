@@ -1,15 +1,28 @@
-from fastapi import FastAPI, HTTPException, Request
+import asyncio
+import base64
+import hashlib
+import itertools
+from bisect import bisect_right
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import uvicorn
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from pydantic.error_wrappers import ErrorWrapper
+from starlette.requests import ClientDisconnect
 from typing import List, Dict, Any, Optional
 import os
 import json
 import sys
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import config
 from services.llm_service import LLMService
-from services.product_service import ProductService
+from services.metrics import REGISTRY, RequestMetricsMiddleware, SamplingProfiler, span
+from services.product_service import ProductService, SQLiteProductService
+from services.serialization import JSONBytesResponse, dumps, recommendation_json, recommendations_json
+from services.session_store import InMemorySessionBackend, SQLiteSessionBackend, SessionStore
 
 app = FastAPI(title="AI Product Recommendation API")
 
@@ -22,8 +35,28 @@ app.add_middleware(
     allow_headers=["*"],  
 )
 
-product_service = ProductService()
+profiler = SamplingProfiler(config['PROFILE_DIR'], interval=config['PROFILE_INTERVAL']) if config['PROFILE_SLOW_REQUESTS'] else None
+app.add_middleware(RequestMetricsMiddleware, slow_seconds=config['SLOW_REQUEST_SECONDS'], profiler=profiler)
+
+product_service = SQLiteProductService() if config['CATALOG_BACKEND'] == 'sqlite' else ProductService()
 llm_service = LLMService()
+product_service.add_reload_listener(llm_service.invalidate_cache)
+
+def collect_catalog_metrics():
+    catalog = product_service.get_catalog()
+    return [
+        ('recommender_catalog_products', 'gauge', 'Products in the serving catalog snapshot.', [({}, len(catalog))]),
+        ('recommender_catalog_version', 'gauge', 'Version of the serving catalog snapshot.', [({}, catalog.version or 0)])
+    ]
+
+REGISTRY.add_collector(llm_service.collect_metrics)
+REGISTRY.add_collector(collect_catalog_metrics)
+
+if config['SESSION_BACKEND'] == 'sqlite':
+    session_backend = SQLiteSessionBackend(config['SESSION_DB_PATH'], ttl_seconds=config['SESSION_TTL'])
+else:
+    session_backend = InMemorySessionBackend(max_sessions=config['SESSION_MAX'], ttl_seconds=config['SESSION_TTL'])
+session_store = SessionStore(session_backend)
 
 class LikedProduct(BaseModel):
     id: str
@@ -42,64 +75,471 @@ class RecommendationRequest(BaseModel):
     likedProducts: List[LikedProduct] = []
     browsing_history: List[str] = []  # For backward compatibility with test script
 
-PRODUCTS_FILE = os.path.join(os.path.dirname(__file__), 'data', 'products.json')
+class PreferencesDelta(BaseModel):
+    priceRange: Optional[str] = None
+    categories: Optional[List[str]] = None
+    brands: Optional[List[str]] = None
+
+class SessionCreateRequest(BaseModel):
+    preferences: UserPreferences = UserPreferences()
+    likedProductIds: List[str] = []
+
+class SessionDelta(BaseModel):
+    like: List[str] = []
+    unlike: List[str] = []
+    preferences: Optional[PreferencesDelta] = None
 
-try:
-    with open(PRODUCTS_FILE, 'r') as f:
-        products_data = json.load(f)
-except Exception as e:
-    print(f"Error loading product data: {e}")
-    products_data = []
+class BatchRecommendationItem(RecommendationRequest):
+    user_id: str
+
+class BatchRecommendationRequest(BaseModel):
+    requests: List[BatchRecommendationItem]
+
+def resolve_liked_products(liked_products, browsing_history, catalog):
+    """Fall back to browsing history (product IDs) when no liked products were sent.
+    
+    History entries resolve to the catalog's own Products, which carry every
+    LikedProduct field, so no request models are built for them.
+    """
+    if not liked_products and browsing_history:
+        products = (catalog.get(product_id) for product_id in browsing_history)
+        return [p for p in products if p is not None]
+    return liked_products
+
+def preferences_dict(preferences):
+    return {
+        "priceRange": preferences.priceRange,
+        "categories": preferences.categories,
+        "brands": preferences.brands
+    }
+
+# responses carry the snapshot version they were computed from
+CATALOG_VERSION_HEADER = "X-Catalog-Version"
+
+background_tasks = []
+
+@app.on_event("startup")
+async def start_catalog_watcher():
+    interval = config.get('CATALOG_WATCH_INTERVAL', 0)
+    if interval > 0:
+        background_tasks.append(asyncio.create_task(product_service.watch(interval)))
+
+@app.on_event("startup")
+async def start_profiler():
+    # started here rather than at import so each serve.py worker samples its own event loop
+    if profiler is not None:
+        profiler.start()
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    for task in background_tasks:
+        task.cancel()
+    if profiler is not None:
+        profiler.stop()
+    await llm_service.aclose()
+
+MAX_PAGE_SIZE = 1000
+NDJSON_CHUNK = 500  # products per streamed write
+PRODUCT_FIELDS = {"id", "name", "description", "price", "category", "brand", "image", "rating",
+                  "subcategory", "features", "tags", "inventory"}
+
+def encode_cursor(product_id):
+    return base64.urlsafe_b64encode(str(product_id).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Product id in a cursor; 400 unless it is exactly what encode_cursor() produces."""
+    try:
+        product_id = base64.b64decode(cursor.encode('ascii'), altchars=b'-_', validate=True).decode('utf-8')
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # b64decode tolerates '+', '/' and missing trailing bits, so check the round trip
+    if encode_cursor(product_id) != cursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return product_id
+
+def json_array_chunks(fragments):
+    """A JSON array of the given fragments, NDJSON_CHUNK items per write."""
+    yield b'['
+    separator = b''
+    for chunk in iter(lambda: list(itertools.islice(fragments, NDJSON_CHUNK)), []):
+        yield separator + b','.join(chunk)
+        separator = b','
+    yield b']'
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
 
 @app.get("/api/products")
-async def get_products():
-    """Return the full product catalog"""
-    products = product_service.get_all_products()
-    return products
+async def get_products(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    category: Optional[List[str]] = Query(None),
+    brand: Optional[List[str]] = Query(None),
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    output_format: str = Query("json", alias="format", regex="^(json|ndjson)$")
+):
+    """Return the product catalog.
+    
+    With no parameters this is the full catalog as a JSON array, served from bytes
+    pre-serialized once per catalog snapshot. `category`/`brand` (repeatable) and
+    `min_price`/`max_price` filter through the catalog indexes (with the sqlite backend
+    a page is filtered by SQLite), `fields` projects a
+    comma-separated subset of fields, `limit`/`cursor` paginate (the response becomes
+    {"items", "next_cursor"}), and `format=ndjson` streams one product per line.
+    Every response has an ETag; a matching If-None-Match gets an empty 304.
+    """
+    catalog = product_service.get_catalog()
+    
+    # the snapshot's content hash plus the query pins down the response body exactly
+    query = sorted(request.query_params.multi_items())
+    etag = catalog.etag
+    if query:
+        etag += "-" + hashlib.sha1(repr(query).encode('utf-8')).hexdigest()[:12]
+    headers = {"ETag": f'"{etag}"', CATALOG_VERSION_HEADER: str(catalog.version)}
+    if etag_matches(request, f'"{etag}"'):
+        return Response(status_code=304, headers=headers)
+    
+    if not query:
+        if catalog.in_memory:
+            return Response(content=catalog.products_json(), media_type="application/json", headers=headers)
+        # on-demand catalogs stream the listing rather than keep a serialized copy of it
+        return StreamingResponse(json_array_chunks(catalog.iter_products_json()), media_type="application/json",
+                                 headers=headers)
+    
+    after = None
+    if cursor is not None:
+        after = catalog.positions_by_id.get(decode_cursor(cursor))
+        if after is None:
+            raise HTTPException(status_code=400, detail="Cursor refers to a product that is no longer in the catalog")
+    
+    # (position, Product or None); a None product is read from the snapshot when encoded
+    rows = None
+    if limit is not None and not catalog.in_memory:
+        # the sqlite backend filters and pages in one indexed query; one extra row tells whether more follow
+        rows = await asyncio.get_running_loop().run_in_executor(
+            None, product_service.query_page, catalog, category, brand, min_price, max_price, after, limit + 1
+        )
+    if rows is None:
+        positions = catalog.query_positions(category, brand, min_price, max_price)
+        if after is not None:
+            positions = positions[bisect_right(positions, after):]
+        if limit is not None:
+            positions = positions[:limit + 1]
+        rows = [(position, None) for position in positions]
+    
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        position, product = rows[-1]
+        next_cursor = encode_cursor(catalog.products[position].id if product is None else product.id)
+    
+    if fields:
+        wanted = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = set(wanted) - PRODUCT_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        
+        def encode(position, product):
+            product = (catalog.products[position] if product is None else product).to_dict()
+            return json.dumps({f: product[f] for f in wanted}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    else:
+        encode = catalog.product_json
+    
+    if output_format == "ndjson":
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = next_cursor
+        
+        def stream_lines():
+            for start in range(0, len(rows), NDJSON_CHUNK):
+                yield b''.join(encode(*row) + b'\n' for row in rows[start:start + NDJSON_CHUNK])
+        
+        return StreamingResponse(stream_lines(), media_type="application/x-ndjson", headers=headers)
+    
+    items = b'[' + b','.join(encode(*row) for row in rows) + b']'
+    if limit is None and cursor is None:
+        # filtered/projected but unpaginated: keep the plain array shape
+        body = items
+    else:
+        body = b'{"items":' + items + b',"next_cursor":' + json.dumps(next_cursor).encode('utf-8') + b'}'
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/api/products/search")
+async def search_products(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE)):
+    """Full-text product search (SQLite FTS5 with the sqlite catalog backend, word matching otherwise)"""
+    products = await asyncio.get_running_loop().run_in_executor(None, product_service.search_products, q, limit)
+    return {"query": q, "items": [product.to_dict() for product in products]}
+
+@app.post("/api/admin/reload")
+async def reload_catalog():
+    """Re-read the product file off the event loop and atomically swap in the new snapshot"""
+    try:
+        version = await product_service.reload_async()
+    except Exception as e:
+        print(f"Error reloading product data: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Catalog reload failed, still serving version {product_service.version}: {e}")
+    return {"catalog_version": version, "products": len(product_service.get_catalog())}
+
+@app.get("/api/stats")
+async def get_stats():
+    """Return recommendation cache, prompt size, request coalescing and scheduler counters"""
+    return {
+        "catalog_version": product_service.version,
+        "cache": llm_service.cache.stats(),
+        "prompt": llm_service.prompt_stats,
+        "requests": llm_service.request_stats,
+        "scheduler": llm_service.scheduler_summary()
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics of this process (one worker's, under serve.py)"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 @app.post("/api/recommendations")
 async def get_recommendations(request: RecommendationRequest):
     """Generate personalized product recommendations based on user preferences and liked products"""
     try:
-        # Convert to dict ero
-        user_preferences = {
-            "priceRange": request.preferences.priceRange,
-            "categories": request.preferences.categories,
-            "brands": request.preferences.brands
-        }
-        
-        # Get all products
-        all_products = product_service.get_all_products()
-        
-        # Handle both liked products and browsing history
-        liked_products = request.likedProducts
-        
-        if not liked_products and request.browsing_history:
-            product_map = {p.id: p for p in all_products}
-            for product_id in request.browsing_history:
-                if product_id in product_map:
-                    product = product_map[product_id]
-                    liked_products.append(LikedProduct(
-                        id=product.id,
-                        name=product.name,
-                        category=product.category,
-                        brand=product.brand,
-                        price=product.price
-                    ))
+        with span('parse_request'):
+            # Convert to dict ero
+            user_preferences = preferences_dict(request.preferences)
+            
+            # Indexed catalog snapshot, built once at load; held for the whole request
+            catalog = product_service.get_catalog()
+            
+            # Handle both liked products and browsing history
+            liked_products = resolve_liked_products(request.likedProducts, request.browsing_history, catalog)
         
         # Generate recommendations
         recommendations = await llm_service.generate_recommendations(
             user_preferences,
             liked_products,
-            all_products
+            catalog
         )
         
-        return recommendations
+        with span('serialization'):
+            # assembled from the snapshot's per-product JSON; bypasses FastAPI's encoder
+            return JSONBytesResponse(
+                recommendations_json(recommendations, catalog),
+                headers={CATALOG_VERSION_HEADER: str(catalog.version)}
+            )
     
     except Exception as e:
         print(f"Error in recommendations: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def session_state(session, unknown_ids=()):
+    return {
+        "session_id": session.session_id,
+        "likedProductIds": session.liked_ids,
+        "preferences": session.preferences,
+        "affinity": {
+            "categories": dict(session.category_counts),
+            "brands": dict(session.brand_counts)
+        },
+        "unknownProductIds": list(unknown_ids)
+    }
+
+def get_session_or_404(session_id):
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session
+
+@app.post("/api/sessions")
+async def create_session(request: SessionCreateRequest = None):
+    """Start a session, optionally seeded with preferences and liked product IDs"""
+    request = request or SessionCreateRequest()
+    session, unknown = session_store.create(
+        product_service.get_catalog(),
+        preferences=preferences_dict(request.preferences),
+        liked_ids=request.likedProductIds
+    )
+    return session_state(session, unknown)
+
+@app.get("/api/sessions/{session_id}")
+async def get_session(session_id: str):
+    return session_state(get_session_or_404(session_id))
+
+@app.patch("/api/sessions/{session_id}")
+async def update_session(session_id: str, delta: SessionDelta):
+    """Apply a like/unlike/preference delta instead of resending the whole state"""
+    session = get_session_or_404(session_id)
+    unknown = session_store.apply_delta(
+        session,
+        product_service.get_catalog(),
+        like=delta.like,
+        unlike=delta.unlike,
+        preferences=delta.preferences.dict(exclude_none=True) if delta.preferences else None
+    )
+    return session_state(session, unknown)
+
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    session_store.delete(session_id)
+    llm_service.discard_ranking_state(session_id)
+    return {"deleted": session_id}
+
+@app.get("/api/sessions/{session_id}/recommendations")
+async def get_session_recommendations(session_id: str):
+    """Recommendations for the session's current liked set and preferences"""
+    session = get_session_or_404(session_id)
+    catalog = product_service.get_catalog()
+    try:
+        recommendations = await llm_service.generate_recommendations(
+            session.preferences,
+            session.liked_products(catalog),
+            catalog,
+            session_id=session.session_id
+        )
+        return JSONBytesResponse(
+            recommendations_json(recommendations, catalog),
+            headers={CATALOG_VERSION_HEADER: str(catalog.version)}
+        )
+    except Exception as e:
+        print(f"Error in session recommendations: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def sse_event(event, data):
+    """One server-sent event; `data` is a JSON-encodable value or already encoded bytes."""
+    if not isinstance(data, bytes):
+        data = dumps(data)
+    return b"event: " + event.encode('utf-8') + b"\ndata: " + data + b"\n\n"
+
+def recommendation_event_stream(preferences, liked_products, catalog):
+    """Server-sent events: one `recommendation` event per item as it arrives, then `done`."""
+    async def events():
+        count = 0
+        try:
+            async for recommendation in llm_service.stream_recommendations(preferences, liked_products, catalog):
+                count += 1
+                yield sse_event("recommendation", recommendation_json(recommendation, catalog))
+        except Exception as e:
+            print(f"Error streaming recommendations: {str(e)}")
+            yield sse_event("error", {"detail": str(e)})
+        yield sse_event("done", {"count": count})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={CATALOG_VERSION_HEADER: str(catalog.version), "Cache-Control": "no-cache"}
+    )
+
+@app.post("/api/recommendations/stream")
+async def stream_recommendations(request: RecommendationRequest):
+    """Stream recommendations as Server-Sent Events, each one as soon as it is ready"""
+    catalog = product_service.get_catalog()
+    liked_products = resolve_liked_products(request.likedProducts, request.browsing_history, catalog)
+    return recommendation_event_stream(preferences_dict(request.preferences), liked_products, catalog)
+
+@app.get("/api/sessions/{session_id}/recommendations/stream")
+async def stream_session_recommendations(session_id: str):
+    """Session recommendations as Server-Sent Events (usable with EventSource)"""
+    session = get_session_or_404(session_id)
+    catalog = product_service.get_catalog()
+    return recommendation_event_stream(session.preferences, session.liked_products(catalog), catalog)
+
+class BodyStreamingResponse(StreamingResponse):
+    """StreamingResponse for endpoints that keep reading the request body while they reply.
+    
+    Starlette's disconnect listener calls receive() too and would swallow body
+    chunks, so it only starts once `body_read` is set; until then the body
+    reader sees a disconnect itself (request.stream() raises ClientDisconnect).
+    """
+    
+    def __init__(self, content, body_read, **kwargs):
+        super().__init__(content, **kwargs)
+        self.body_read = body_read
+    
+    async def listen_for_disconnect(self, receive):
+        await self.body_read.wait()
+        await super().listen_for_disconnect(receive)
+
+async def ndjson_batch_items(request, catalog, errors, body_read):
+    """(user_id, preferences, liked products) per line of an NDJSON batch body, parsed as lines arrive.
+    
+    Invalid lines are skipped and reported in `errors` as {"line", "detail"}.
+    """
+    def parse(line_number, line):
+        try:
+            item = BatchRecommendationItem.parse_raw(line)
+        except ValidationError as e:
+            errors.append({"line": line_number, "detail": e.errors()})
+            return None
+        return item.user_id, preferences_dict(item.preferences), resolve_liked_products(item.likedProducts, item.browsing_history, catalog)
+    
+    try:
+        pending = b""
+        line_number = 0
+        async for chunk in request.stream():
+            *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                line_number += 1
+                parsed = parse(line_number, line) if line.strip() else None
+                if parsed is not None:
+                    yield parsed
+        if pending.strip():
+            parsed = parse(line_number + 1, pending)
+            if parsed is not None:
+                yield parsed
+    finally:
+        body_read.set()
+
+@app.post("/api/recommendations/batch")
+async def get_recommendations_batch(request: Request):
+    """Generate recommendations for many users, streamed back as NDJSON (one user per line)
+    
+    Takes {"requests": [...]} as JSON, or one request per line with
+    Content-Type: application/x-ndjson; NDJSON is read while results are
+    streamed, so neither side of a large batch is held in memory at once.
+    """
+    catalog = product_service.get_catalog()
+    errors = []
+    body_read = asyncio.Event()
+    if request.headers.get("content-type", "").split(";")[0].strip() == "application/x-ndjson":
+        batch = ndjson_batch_items(request, catalog, errors, body_read)
+    else:
+        try:
+            parsed = BatchRecommendationRequest.parse_raw(await request.body())
+        except ValidationError as e:
+            # same 422 body FastAPI gives for an invalid body parameter
+            raise RequestValidationError([ErrorWrapper(e, ("body",))])
+        body_read.set()
+        batch = (
+            (item.user_id, preferences_dict(item.preferences),
+             resolve_liked_products(item.likedProducts, item.browsing_history, catalog))
+            for item in parsed.requests
+        )
+    
+    def error_lines():
+        # rejected NDJSON lines and failed users, reported between result lines as they are found
+        lines = b"".join(dumps(error) + b"\n" for error in errors)
+        errors.clear()
+        return lines
+    
+    async def stream_lines():
+        try:
+            async for user_id, result in llm_service.generate_recommendations_batch(batch, catalog, errors=errors):
+                yield error_lines() + recommendations_json(result, catalog, user_id=user_id) + b"\n"
+        except ClientDisconnect:
+            print("Batch client disconnected while sending requests")
+            return
+        if errors:
+            yield error_lines()
+    
+    return BodyStreamingResponse(
+        stream_lines(),
+        body_read,
+        media_type="application/x-ndjson",
+        headers={CATALOG_VERSION_HEADER: str(catalog.version)}
+    )
+
 @app.exception_handler(Exception)
 async def generic_exception_handler(request: Request, exc: Exception):
     return {
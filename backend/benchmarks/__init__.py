@@ -0,0 +1,11 @@
+"""
+Benchmarks for the recommendation backend.
+
+Run modules from the backend directory, e.g. `python -m benchmarks.catalog_memory`.
+
+- synthetic, workloads: generated catalogs and request mixes
+- micro: per-call timings of the ranking, filtering, prompt and parsing paths
+- load: end-to-end HTTP load test with a stubbed LLM
+- serving_scale: throughput of serve.py from 1 to N workers
+- results: JSON result files and regression comparison between two runs
+"""
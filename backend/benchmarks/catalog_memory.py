@@ -0,0 +1,102 @@
+"""
+Memory held by the in-process catalog, before and after the slotted Product change.
+
+"before" reproduces the old layout: the parsed products.json kept twice (once in
+ProductService.raw_products, once in app.products_data) plus dict-backed Product
+objects. "after" is the current layout: slotted Products with interned strings,
+with the parsed JSON released after conversion.
+
+    python -m benchmarks.catalog_memory --products 1000000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+
+from benchmarks.synthetic import generate_products
+from services.catalog import Product
+
+
+class LegacyProduct:
+    # the pre-__slots__ Product: every instance carries its own __dict__
+    def __init__(self, id, name, description, price, category, brand, image=None, rating=None):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.price = price
+        self.category = category
+        self.brand = brand
+        self.image = image
+        self.rating = rating
+
+
+def _legacy_catalog(text):
+    raw_products = json.loads(text)
+    products_data = json.loads(text)
+    products = [
+        LegacyProduct(
+            id=p.get('id'),
+            name=p.get('name'),
+            description=p.get('description', ''),
+            price=p.get('price', 0),
+            category=p.get('category', ''),
+            brand=p.get('brand', ''),
+            image=p.get('image'),
+            rating=p.get('rating')
+        )
+        for p in raw_products
+    ]
+    return raw_products, products_data, products
+
+
+def _current_catalog(text):
+    return [Product.from_dict(p) for p in json.loads(text)]
+
+
+def measure(build, text):
+    """Bytes still allocated once `build(text)` returns (temporaries freed)."""
+    gc.collect()
+    tracemalloc.start()
+    held = build(text)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    gc.collect()
+    return current, peak
+
+
+def run(count):
+    text = json.dumps(generate_products(count))
+    before, before_peak = measure(_legacy_catalog, text)
+    after, after_peak = measure(_current_catalog, text)
+    return {
+        "products": count,
+        "before_bytes": before,
+        "before_peak_bytes": before_peak,
+        "after_bytes": after,
+        "after_peak_bytes": after_peak,
+        "saved_ratio": round(1 - after / before, 4) if before else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    result = run(args.products)
+    mb = 1024 * 1024
+    print(f"products:  {result['products']:,}")
+    print(f"before:    {result['before_bytes'] / mb:9.1f} MB held ({result['before_peak_bytes'] / mb:.1f} MB peak)")
+    print(f"after:     {result['after_bytes'] / mb:9.1f} MB held ({result['after_peak_bytes'] / mb:.1f} MB peak)")
+    print(f"saved:     {result['saved_ratio']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+End-to-end HTTP load test of POST /api/recommendations with a stubbed LLM.
+
+Starts tools/fake_llm_server.py and the app (through serve.py) on a synthetic
+catalog, then runs a closed-loop load: `--concurrency` clients, each sending the
+next workload request as soon as the previous one returns, for `--duration`
+seconds. Reports p50/p95/p99 latency, throughput, errors, which tier served
+the requests, and the server's memory (PSS summed over its processes, so pages
+shared between workers are only counted once; Linux only).
+
+    python -m benchmarks.load --products 100000 --concurrency 32 --duration 20 [--json load.json]
+    python -m benchmarks.load --mock            # mock engine only, no stub LLM
+    python -m benchmarks.load --url http://localhost:8000   # an already running server
+
+The recommendation cache is off unless --cache is given, so every request is
+computed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+
+from benchmarks.results import save
+from benchmarks.synthetic import generate_products
+from benchmarks.workloads import generate_workload
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] if ordered else None
+
+
+async def drive(url, bodies, concurrency, duration):
+    """Closed-loop load: `concurrency` clients cycling through `bodies` until `duration` seconds have passed."""
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(index, http):
+        nonlocal errors
+        sent = index
+        while time.perf_counter() < deadline:
+            body = bodies[sent % len(bodies)]
+            sent += concurrency
+            started = time.perf_counter()
+            try:
+                response = await http.post(url, json=body)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(i, http) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def ms(q):
+        return round(percentile(latencies, q) * 1000, 2) if latencies else None
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": ms(50),
+        "p95_ms": ms(95),
+        "p99_ms": ms(99)
+    }
+
+
+def wait_until_up(url, process=None, timeout=180):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{process.args[1]} exited with status {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up in time")
+
+
+def _process_tree(pid):
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # the command name may contain spaces; fields after it are fixed
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def memory_bytes(pid):
+    """PSS (falling back to RSS) summed over a process and its descendants; None off Linux."""
+    if pid is None or not os.path.exists('/proc'):
+        return None
+    total = 0
+    for member in _process_tree(pid):
+        for path, field in ((f'/proc/{member}/smaps_rollup', 'Pss:'), (f'/proc/{member}/status', 'VmRSS:')):
+            try:
+                with open(path) as f:
+                    line = next((line for line in f if line.startswith(field)), None)
+            except OSError:
+                continue
+            if line is not None:
+                total += int(line.split()[1]) * 1024
+                break
+    return total
+
+
+def start(command, env, stderr=None):
+    return subprocess.Popen([sys.executable, *command], env=env, stdout=subprocess.DEVNULL, stderr=stderr)
+
+
+def run(args):
+    records = generate_products(args.products)
+    bodies = generate_workload(records, args.workload_size)
+    report = {"products": args.products, "concurrency": args.concurrency, "duration_s": args.duration,
+              "workers": args.workers, "llm": "none" if args.mock else f"stub, {args.llm_delay}s delay",
+              "cache": args.cache}
+    processes = []
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            base_url, server = args.url, None
+            if base_url is None:
+                data_path = os.path.join(tmp, "products.json")
+                with open(data_path, "w") as f:
+                    json.dump(records, f)
+                env = {**os.environ, "CACHE_MAX_ENTRIES": os.environ.get("CACHE_MAX_ENTRIES", "1024") if args.cache else "0"}
+                if args.mock:
+                    env["USE_LLM"] = "false"
+                else:
+                    llm = start([os.path.join(backend_dir, "tools", "fake_llm_server.py"), "--port", str(args.llm_port),
+                                 "--data", data_path, "--delay", str(args.llm_delay)], env, stderr=subprocess.DEVNULL)
+                    processes.append(llm)
+                    wait_until_up(f"http://127.0.0.1:{args.llm_port}/docs", llm)
+                    env.update({"USE_LLM": "true", "OPENAI_API_KEY": "stub",
+                                "OPENAI_BASE_URL": f"http://127.0.0.1:{args.llm_port}/v1"})
+                server = start([os.path.join(backend_dir, "serve.py"), "--workers", str(args.workers),
+                                "--host", "127.0.0.1", "--port", str(args.port), "--data", data_path], env)
+                processes.append(server)
+                base_url = f"http://127.0.0.1:{args.port}"
+            wait_until_up(f"{base_url}/api/stats", server)
+
+            report["memory_idle_bytes"] = memory_bytes(server.pid if server else None)
+            url = f"{base_url}/api/recommendations"
+            asyncio.run(drive(url, bodies, args.concurrency, args.warmup))
+            report.update(asyncio.run(drive(url, bodies, args.concurrency, args.duration)))
+            report["memory_loaded_bytes"] = memory_bytes(server.pid if server else None)
+            # one worker's view; with several workers it covers only the requests that one served
+            report["server_stats"] = {key: value for key, value in httpx.get(f"{base_url}/api/stats").json().items()
+                                      if key in ("scheduler", "cache", "requests")}
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                process.wait()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of unmeasured load first")
+    parser.add_argument("--workload-size", type=int, default=2000, help="distinct requests cycled through")
+    parser.add_argument("--mock", action="store_true", help="serve from the mock engine, no stub LLM")
+    parser.add_argument("--llm-delay", type=float, default=0.2, help="stub LLM latency in seconds")
+    parser.add_argument("--cache", action="store_true", help="keep the recommendation cache on")
+    parser.add_argument("--url", help="load an already running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--llm-port", type=int, default=9766)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    mb = 1024 * 1024
+    print(f"{report['products']:,} products, {report['workers']} worker(s), {report['concurrency']} clients, "
+          f"LLM: {report['llm']}")
+    print(f"requests: {report['requests']} ({report['errors']} errors), {report['throughput_rps']} req/s")
+    print(f"latency:  p50 {report['p50_ms']} ms  p95 {report['p95_ms']} ms  p99 {report['p99_ms']} ms")
+    if report["memory_idle_bytes"] is not None:
+        print(f"memory:   {report['memory_idle_bytes'] / mb:.1f} MB idle, {report['memory_loaded_bytes'] / mb:.1f} MB after load")
+    served = report["server_stats"].get("scheduler", {}).get("served")
+    if served:
+        print(f"served:   {served}")
+    if args.json:
+        save("load", report, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Microbenchmarks of the recommendation hot paths on synthetic catalogs.
+
+Times, per request of a synthetic workload (see workloads.py):
+- mock_recommendations: LLMService._generate_mock_recommendations
+- filter_products: LLMService._filter_products_by_preferences
+- select_candidates + create_prompt: building the LLM prompt
+- parse_response: LLMService._parse_recommendation_response on a typical answer
+- serialize_response: encoding a recommendation result into the response body,
+  from the catalog's per-product JSON fragments (serialize_response_legacy: the
+  former to_dict() + FastAPI encoder path, for comparison)
+
+    python -m benchmarks.micro --sizes 1000,10000,100000 --requests 200 [--json micro.json]
+
+Service output (debug prints) is discarded while timing.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+
+from benchmarks.results import save
+from benchmarks.synthetic import generate_products
+from benchmarks.workloads import generate_workload, resolve
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from config import LLM_CONFIG
+from services.catalog import Catalog, Product
+from services.llm_service import LLMService
+from services.serialization import JSONBytesResponse, recommendations_json
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+
+    def ms(q):
+        return round(ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] * 1000, 4)
+
+    return {
+        "calls": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 4),
+        "p50_ms": ms(50),
+        "p95_ms": ms(95),
+        "p99_ms": ms(99)
+    }
+
+
+def llm_answer(service, preferences, liked, catalog):
+    """The kind of text the LLM returns: a fenced JSON array of three picks."""
+    picks = service._generate_mock_recommendations(preferences, liked, catalog)["recommendations"]
+    items = [{"product_id": r["product"].id, "explanation": r["explanation"]} for r in picks]
+    return "```json\n" + json.dumps(items, indent=2) + "\n```"
+
+
+def legacy_response(result):
+    """Response body as built before the per-product fragments: dict copies walked by FastAPI's encoder."""
+    content = {**result, "recommendations": [{**r, "product": r["product"].to_dict()} for r in result["recommendations"]]}
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def fragment_response(result, catalog):
+    return JSONBytesResponse(recommendations_json(result, catalog)).body
+
+
+def time_calls(function, arguments):
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for args in arguments:
+            started = time.perf_counter()
+            function(*args)
+            samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def run_size(size, request_count):
+    started = time.perf_counter()
+    records = generate_products(size)
+    catalog = Catalog([Product.from_dict(p) for p in records], version=1)
+    load_seconds = time.perf_counter() - started
+    # no API key: nothing here may reach the network
+    service = LLMService({**LLM_CONFIG, 'api_key': None, 'cache_max_entries': 0})
+    requests = [resolve(r, catalog) for r in generate_workload(records, request_count)]
+
+    # built lazily on first use; keep that one-off cost out of the per-call numbers
+    index_started = time.perf_counter()
+    catalog.content_index
+    index_seconds = time.perf_counter() - index_started
+
+    candidates = [service._select_candidates(p, liked, catalog) for p, liked in requests]
+    with contextlib.redirect_stdout(io.StringIO()):
+        answers = [llm_answer(service, p, liked, catalog) for p, liked in requests]
+        results = [service._generate_mock_recommendations(p, liked, catalog) for p, liked in requests]
+
+    benchmarks = {
+        "mock_recommendations": time_calls(
+            service._generate_mock_recommendations, [(p, liked, catalog) for p, liked in requests]),
+        "filter_products": time_calls(
+            service._filter_products_by_preferences, [(catalog, p) for p, _ in requests]),
+        "select_candidates": time_calls(
+            service._select_candidates, [(p, liked, catalog) for p, liked in requests]),
+        "create_prompt": time_calls(
+            service._create_recommendation_prompt,
+            [(p, liked, catalog, ranked) for (p, liked), ranked in zip(requests, candidates)]),
+        "parse_response": time_calls(
+            service._parse_recommendation_response,
+            [(answer, catalog, p, liked, ranked) for answer, (p, liked), ranked in zip(answers, requests, candidates)]),
+        "serialize_response": time_calls(fragment_response, [(result, catalog) for result in results]),
+        "serialize_response_legacy": time_calls(legacy_response, [(result,) for result in results])
+    }
+    return {
+        "products": size,
+        "catalog_build_s": round(load_seconds, 3),
+        "content_index_build_s": round(index_seconds, 3),
+        "benchmarks": [{"name": name, **stats} for name, stats in benchmarks.items()]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated catalog sizes")
+    parser.add_argument("--requests", type=int, default=200, help="workload requests timed per benchmark")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    report = {"requests": args.requests, "sizes": []}
+    for size in (int(s) for s in args.sizes.split(",")):
+        result = run_size(size, args.requests)
+        report["sizes"].append(result)
+        print(f"{size:,} products (catalog {result['catalog_build_s']}s, content index {result['content_index_build_s']}s)")
+        for bench in result["benchmarks"]:
+            print(f"  {bench['name']:<26} mean {bench['mean_ms']:>9.3f} ms  p50 {bench['p50_ms']:>9.3f}  "
+                  f"p95 {bench['p95_ms']:>9.3f}  p99 {bench['p99_ms']:>9.3f}")
+    if args.json:
+        save("micro", report, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark results as JSON, and a comparison of two result files.
+
+Every benchmark's --json output goes through `save()`, which adds when and
+where it ran. Compare a baseline with a new run:
+
+    python -m benchmarks.results baseline.json new.json [--threshold 0.1]
+
+Metrics are matched by their path in the JSON (list entries by their
+"workers"/"products"/"name" key when present). Latencies, times and bytes
+should go down; throughput should go up. The exit status is 1 when any metric
+regressed by more than the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# metric names containing these are "higher is better"; everything else numeric is "lower is better"
+HIGHER_IS_BETTER = ('rps', 'throughput', 'speedup', 'efficiency', 'hit_rate')
+# identifying fields, not measurements
+IGNORED = {'products', 'workers', 'concurrency', 'duration_s', 'cpus', 'requests', 'calls', 'seed', 'size'}
+LIST_KEYS = ('name', 'workers', 'products')
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def save(benchmark, report, path):
+    """Write `report` to `path` with the benchmark name and run metadata."""
+    document = {
+        "benchmark": benchmark,
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "report": report
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+    return document
+
+
+def _metrics(value, path=''):
+    """{path: number} for every numeric leaf."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key not in IGNORED:
+                yield from _metrics(item, f"{path}.{key}" if path else key)
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            label = index
+            if isinstance(item, dict):
+                label = next((f"{key}={item[key]}" for key in LIST_KEYS if key in item), index)
+            yield from _metrics(item, f"{path}[{label}]")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield path, value
+
+
+def compare(baseline, current, threshold=0.1):
+    """Rows of (metric, baseline, current, relative change, regressed) for metrics present in both."""
+    before = dict(_metrics(baseline.get("report", baseline)))
+    after = dict(_metrics(current.get("report", current)))
+    rows = []
+    for metric, old in before.items():
+        new = after.get(metric)
+        if new is None or not old:
+            continue
+        change = (new - old) / abs(old)
+        name = metric.rsplit('.', 1)[-1]
+        worse = -change if any(word in name for word in HIGHER_IS_BETTER) else change
+        rows.append((metric, old, new, change, worse > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change that counts as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baseline, current, args.threshold)
+    width = max((len(row[0]) for row in rows), default=10)
+    for metric, old, new, change, regressed in rows:
+        flag = "  REGRESSED" if regressed else ""
+        print(f"{metric:<{width}}  {old:>12.4g} -> {new:>12.4g}  {change:+8.1%}{flag}")
+    regressions = sum(row[4] for row in rows)
+    print(f"{len(rows)} metrics compared, {regressions} regressed by more than {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Throughput of the pre-forked server (serve.py) from 1 to N worker processes.
+
+For each worker count, starts serve.py on a synthetic catalog with the
+recommendation cache disabled (so every request is ranked), drives it with the
+synthetic workload for a fixed time (see load.py), and reports requests/second,
+latency percentiles, memory and speedup over one worker.
+
+    python -m benchmarks.serving_scale --max-workers 4 --products 20000 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+
+from benchmarks.load import drive, memory_bytes, wait_until_up
+from benchmarks.results import save
+from benchmarks.synthetic import generate_products
+from benchmarks.workloads import generate_workload
+
+
+def run(max_workers, products, duration, concurrency, port):
+    catalog = generate_products(products)
+    bodies = generate_workload(catalog, 2000)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, "products.json")
+        with open(data_path, "w") as f:
+            json.dump(catalog, f)
+        env = {**os.environ, "CACHE_MAX_ENTRIES": "0", "USE_LLM": "false"}
+        for workers in range(1, max_workers + 1):
+            process = subprocess.Popen(
+                [sys.executable, os.path.join(backend_dir, "serve.py"), "--workers", str(workers),
+                 "--host", "127.0.0.1", "--port", str(port), "--data", data_path],
+                env=env, stdout=subprocess.DEVNULL
+            )
+            base_url = f"http://127.0.0.1:{port}"
+            try:
+                wait_until_up(f"{base_url}/api/stats", process)
+                # a short warm-up so lazily built structures don't count against one worker count
+                asyncio.run(drive(f"{base_url}/api/recommendations", bodies, concurrency, 1))
+                result = asyncio.run(drive(f"{base_url}/api/recommendations", bodies, concurrency, duration))
+                result["memory_bytes"] = memory_bytes(process.pid)
+            finally:
+                process.terminate()
+                process.wait()
+            results.append({"workers": workers, **result})
+
+    baseline = results[0]["throughput_rps"] or 1
+    for result in results:
+        result["speedup"] = round(result["throughput_rps"] / baseline, 2)
+        result["efficiency"] = round(result["speedup"] / result["workers"], 2)
+    return {"products": products, "concurrency": concurrency, "duration_s": duration,
+            "cpus": os.cpu_count(), "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--duration", type=float, default=10, help="seconds of load per worker count")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    report = run(args.max_workers, args.products, args.duration, args.concurrency, args.port)
+    print(f"{report['products']:,} products, {report['concurrency']} clients, {report['cpus']} CPUs")
+    print(f"{'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'speedup':>8} {'eff':>5}")
+    for r in report["results"]:
+        print(f"{r['workers']:>7} {r['throughput_rps']:>9} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} "
+              f"{r['speedup']:>8} {r['efficiency']:>5}")
+    if args.json:
+        save("serving_scale", report, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Synthetic catalogs that follow the data/products.json schema.
+
+    python -m benchmarks.synthetic --products 1000000 --out /tmp/products_1m.json
+"""
+import argparse
+import json
+import random
+
+CATEGORIES = {
+    'Electronics': ['Audio', 'Wearables', 'Smart Home', 'Computer Accessories', 'Gaming'],
+    'Home': ['Kitchen', 'Decor', 'Bedding', 'Cleaning'],
+    'Sports': ['Fitness', 'Outdoor', 'Yoga', 'Cycling'],
+    'Health': ['Supplements', 'Personal Care', 'Monitoring'],
+    'Beauty': ['Skincare', 'Haircare', 'Makeup'],
+    'Footwear': ['Running', 'Casual', 'Hiking'],
+    'Clothing': ['Tops', 'Outerwear', 'Activewear'],
+    'Accessories': ['Bags', 'Wallets', 'Watches', 'Sunglasses']
+}
+ADJECTIVES = ['Premium', 'Ultra', 'Smart', 'Organic', 'Compact', 'Wireless', 'Classic', 'Pro', 'Eco', 'Portable']
+NOUNS = ['Headphones', 'Speaker', 'Watch', 'Backpack', 'Bottle', 'Mat', 'Jacket', 'Serum', 'Lamp', 'Blender',
+         'Shoes', 'Tracker', 'Charger', 'Skillet', 'Camera', 'Wallet', 'Tee', 'Scale', 'Purifier', 'Controller']
+FEATURES = ['Bluetooth 5.0', 'Water resistant', 'Long battery life', 'Lightweight', 'Recycled materials',
+            'Noise cancellation', 'Dishwasher safe', 'Adjustable fit', 'USB-C charging', 'Hypoallergenic',
+            'Machine washable', 'Stainless steel', 'Non-slip grip', 'Fast charging', 'Ergonomic design']
+TAGS = ['wireless', 'premium', 'eco-friendly', 'portable', 'durable', 'lightweight', 'smart', 'travel',
+        'fitness', 'organic', 'compact', 'comfortable', 'waterproof', 'gift', 'bestseller']
+
+
+def generate_products(count, seed=42, brand_count=None):
+    """`count` product dicts shaped like data/products.json records."""
+    rng = random.Random(seed)
+    brand_count = brand_count or max(20, count // 200)
+    brands = [f"Brand{i:05d}" for i in range(brand_count)]
+    categories = list(CATEGORIES)
+
+    products = []
+    for i in range(count):
+        category = rng.choice(categories)
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}"
+        products.append({
+            "id": f"prod{i + 1:07d}",
+            "name": name,
+            "category": category,
+            "subcategory": rng.choice(CATEGORIES[category]),
+            "price": round(rng.uniform(5, 400), 2),
+            "brand": rng.choice(brands),
+            "description": f"{name} with {rng.choice(FEATURES).lower()}, {rng.choice(FEATURES).lower()} and everyday reliability.",
+            "features": rng.sample(FEATURES, 3),
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "inventory": rng.randint(0, 200),
+            "tags": rng.sample(TAGS, 4)
+        })
+    return products
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    with open(args.out, 'w') as f:
+        json.dump(generate_products(args.products, seed=args.seed), f)
+    print(f"Wrote {args.products:,} products to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Synthetic user workloads: recommendation requests with a controlled mix of
+liked-set sizes and preference filters, for any catalog.
+"""
+import random
+
+# liked-set size -> share of requests; most shoppers have liked a few products, some none
+LIKED_SIZES = {0: 0.25, 1: 0.25, 3: 0.3, 10: 0.15, 50: 0.05}
+# how many categories / brands a request filters on -> share of requests
+CATEGORY_COUNTS = {0: 0.4, 1: 0.35, 2: 0.2, 4: 0.05}
+BRAND_COUNTS = {0: 0.7, 1: 0.2, 3: 0.1}
+PRICE_RANGES = {"all": 0.4, "0-50": 0.2, "50-100": 0.25, "100+": 0.15}
+
+
+def _weighted(rng, distribution):
+    return rng.choices(list(distribution), weights=list(distribution.values()))[0]
+
+
+def generate_workload(products, count, seed=7, liked_sizes=LIKED_SIZES, category_counts=CATEGORY_COUNTS,
+                      brand_counts=BRAND_COUNTS, price_ranges=PRICE_RANGES):
+    """`count` request bodies for POST /api/recommendations over the given product dicts.
+
+    Liked products are drawn from one "home" category for most shoppers, which
+    is what gives the ranker category affinity to work with.
+    """
+    rng = random.Random(seed)
+    categories = sorted({p["category"] for p in products})
+    brands = sorted({p["brand"] for p in products})
+    by_category = {}
+    for product in products:
+        by_category.setdefault(product["category"], []).append(product["id"])
+    all_ids = [p["id"] for p in products]
+
+    workload = []
+    for _ in range(count):
+        liked_count = _weighted(rng, liked_sizes)
+        home = by_category[rng.choice(categories)]
+        pool = home if rng.random() < 0.8 and len(home) >= liked_count else all_ids
+        workload.append({
+            "preferences": {
+                "priceRange": _weighted(rng, price_ranges),
+                "categories": rng.sample(categories, min(len(categories), _weighted(rng, category_counts))),
+                "brands": rng.sample(brands, min(len(brands), _weighted(rng, brand_counts)))
+            },
+            "browsing_history": rng.sample(pool, min(len(pool), liked_count))
+        })
+    return workload
+
+
+def resolve(request, catalog):
+    """(preferences, liked Products) for calling the service directly instead of over HTTP."""
+    liked = [catalog.get(product_id) for product_id in request["browsing_history"]]
+    return request["preferences"], [p for p in liked if p is not None]
@@ -10,14 +10,88 @@ MODEL_NAME = "gpt-3.5-turbo"
 MAX_TOKENS = 1000 
 TEMPERATURE = 0.7  
 
+# real LLM calls are opt-in; the mock engine serves otherwise
+USE_LLM = os.environ.get('USE_LLM', 'false').lower() == 'true'
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL') or None  # e.g. a local stub server
+LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 10))  # seconds per completion, including queueing
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 8))  # in-flight completions per worker
+LLM_MAX_CONNECTIONS = int(os.environ.get('LLM_MAX_CONNECTIONS', 20))  # pooled HTTP connections
+LLM_STREAM_STALL_TIMEOUT = float(os.environ.get('LLM_STREAM_STALL_TIMEOUT', 2))  # max gap between streamed chunks
+USE_MOCK_API = os.environ.get('USE_MOCK_API', 'false').lower() == 'true'  # force the mock engine
+LLM_HEDGE_REQUESTS = os.environ.get('LLM_HEDGE_REQUESTS', 'true').lower() == 'true'  # duplicate slow calls
+LLM_HEDGE_MIN_DELAY = float(os.environ.get('LLM_HEDGE_MIN_DELAY', 0.2))  # floor for the p95 hedge delay
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5))  # failures in a row to open
+BREAKER_RESET_TIMEOUT = float(os.environ.get('BREAKER_RESET_TIMEOUT', 30))  # seconds open before probing
+BREAKER_HALF_OPEN_PROBES = int(os.environ.get('BREAKER_HALF_OPEN_PROBES', 1))
+
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', 2000))  # tokens spent on the candidate list
+
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))  # 0 disables the recommendation cache
+CACHE_TTL = float(os.environ.get('CACHE_TTL', 300))  # seconds
+# precompute single-category-toggle neighbours of each request while idle (mock mode only)
+SPECULATIVE_PREFETCH = os.environ.get('SPECULATIVE_PREFETCH', 'false').lower() == 'true'
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')  # 'memory' or 'sqlite' (shared by all workers)
+CACHE_DB_PATH = os.environ.get('CACHE_DB_PATH', os.path.join(BACKEND_DIR, "data", "cache.db"))
+RANKING_PROCESSES = int(os.environ.get('RANKING_PROCESSES', 0))  # forked mock-ranking processes; 0 ranks in-process
+
+# final top-k selection shared by the mock and LLM paths (services/ranking.py)
+RANKING_WEIGHTS = {
+    'affinity': float(os.environ.get('RANKING_WEIGHT_AFFINITY', 1.0)),
+    'rating': float(os.environ.get('RANKING_WEIGHT_RATING', 0.3)),
+    'in_stock': float(os.environ.get('RANKING_WEIGHT_IN_STOCK', 0.1)),
+    'price_fit': float(os.environ.get('RANKING_WEIGHT_PRICE_FIT', 0.1))
+}
+RANKING_MIN_CATEGORIES = int(os.environ.get('RANKING_MIN_CATEGORIES', 2))
+RANKING_MAX_PER_BRAND = int(os.environ.get('RANKING_MAX_PER_BRAND', 1))
+RANKING_DIVERSITY = float(os.environ.get('RANKING_DIVERSITY', 0.15))  # score lost per earlier pick from the same category
+RANKING_EXCLUDE_OUT_OF_STOCK = os.environ.get('RANKING_EXCLUDE_OUT_OF_STOCK', 'true').lower() == 'true'
+RANKING_LOW_STOCK = int(os.environ.get('RANKING_LOW_STOCK', 10))  # units below which the stock score drops
+
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'memory')  # 'memory' or 'sqlite'
+SESSION_DB_PATH = os.environ.get('SESSION_DB_PATH', os.path.join(BACKEND_DIR, "data", "sessions.db"))
+SESSION_MAX = int(os.environ.get('SESSION_MAX', 10000))  # in-memory LRU size
+SESSION_TTL = float(os.environ.get('SESSION_TTL', 3600))  # seconds of inactivity
+RANKING_STATE_MAX_SESSIONS = int(os.environ.get('RANKING_STATE_MAX_SESSIONS', 256))  # ~2 bytes per product each
+BATCH_WINDOW = int(os.environ.get('BATCH_WINDOW', 1000))  # batch users read, grouped and ranked at a time
+
 DATA_PATH = os.path.join(BACKEND_DIR, "data", "products.json")
+CATALOG_FILE_PATH = os.path.join(BACKEND_DIR, "data", "products.bin")  # built by tools/compile_catalog.py
+CONTENT_INDEX_PATH = os.path.join(BACKEND_DIR, "data", "content_index.npz")  # built by tools/build_content_index.py
+NEIGHBORS_PATH = os.path.join(BACKEND_DIR, "data", "neighbors.npy")  # built by tools/build_neighbors.py
+CATALOG_BACKEND = os.environ.get('CATALOG_BACKEND', 'memory')  # 'memory' or 'sqlite'
+CATALOG_DB_PATH = os.environ.get('CATALOG_DB_PATH', os.path.join(BACKEND_DIR, "data", "catalog.db"))  # built by tools/import_catalog_db.py
+CATALOG_DB_CACHE = int(os.environ.get('CATALOG_DB_CACHE', 10000))  # Products kept in memory per worker
+CATALOG_WATCH_INTERVAL = float(os.environ.get('CATALOG_WATCH_INTERVAL', 0))  # seconds between mtime polls; 0 disables
+
+USE_ORJSON = os.environ.get('USE_ORJSON', 'true').lower() == 'true'  # encode responses with orjson when installed
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', 1.0))  # log span breakdowns above this; 0 disables
+# sample the event loop's stack and dump folded stacks for slow requests
+PROFILE_SLOW_REQUESTS = os.environ.get('PROFILE_SLOW_REQUESTS', 'false').lower() == 'true'
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))  # seconds between samples
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BACKEND_DIR, "data", "profiles"))
 
 config = {
     'OPENAI_API_KEY': OPENAI_API_KEY,
     'MODEL_NAME': MODEL_NAME,
     'MAX_TOKENS': MAX_TOKENS,
     'TEMPERATURE': TEMPERATURE,
-    'DATA_PATH': DATA_PATH
+    'DATA_PATH': DATA_PATH,
+    'CATALOG_FILE_PATH': CATALOG_FILE_PATH,
+    'CONTENT_INDEX_PATH': CONTENT_INDEX_PATH,
+    'NEIGHBORS_PATH': NEIGHBORS_PATH,
+    'CATALOG_BACKEND': CATALOG_BACKEND,
+    'CATALOG_DB_PATH': CATALOG_DB_PATH,
+    'CATALOG_DB_CACHE': CATALOG_DB_CACHE,
+    'CATALOG_WATCH_INTERVAL': CATALOG_WATCH_INTERVAL,
+    'USE_ORJSON': USE_ORJSON,
+    'SESSION_BACKEND': SESSION_BACKEND,
+    'SESSION_DB_PATH': SESSION_DB_PATH,
+    'SESSION_MAX': SESSION_MAX,
+    'SESSION_TTL': SESSION_TTL,
+    'SLOW_REQUEST_SECONDS': SLOW_REQUEST_SECONDS,
+    'PROFILE_SLOW_REQUESTS': PROFILE_SLOW_REQUESTS,
+    'PROFILE_INTERVAL': PROFILE_INTERVAL,
+    'PROFILE_DIR': PROFILE_DIR
 }
 
 LLM_CONFIG = {
@@ -25,5 +99,31 @@ LLM_CONFIG = {
     'model': MODEL_NAME,
     'max_tokens': MAX_TOKENS,
     'temperature': TEMPERATURE,
-    'use_mock_api': False # change to use mock api
+    'use_mock_api': USE_MOCK_API, # change to use mock api
+    'use_llm': USE_LLM,
+    'base_url': OPENAI_BASE_URL,
+    'timeout': LLM_TIMEOUT,
+    'max_concurrency': LLM_MAX_CONCURRENCY,
+    'max_connections': LLM_MAX_CONNECTIONS,
+    'stream_stall_timeout': LLM_STREAM_STALL_TIMEOUT,
+    'hedge_requests': LLM_HEDGE_REQUESTS,
+    'hedge_min_delay': LLM_HEDGE_MIN_DELAY,
+    'breaker_failure_threshold': BREAKER_FAILURE_THRESHOLD,
+    'breaker_reset_timeout': BREAKER_RESET_TIMEOUT,
+    'breaker_half_open_probes': BREAKER_HALF_OPEN_PROBES,
+    'prompt_token_budget': PROMPT_TOKEN_BUDGET,
+    'cache_max_entries': CACHE_MAX_ENTRIES,
+    'cache_ttl': CACHE_TTL,
+    'speculative_prefetch': SPECULATIVE_PREFETCH,
+    'cache_backend': CACHE_BACKEND,
+    'cache_db_path': CACHE_DB_PATH,
+    'ranking_processes': RANKING_PROCESSES,
+    'ranking_weights': RANKING_WEIGHTS,
+    'ranking_min_categories': RANKING_MIN_CATEGORIES,
+    'ranking_max_per_brand': RANKING_MAX_PER_BRAND,
+    'ranking_diversity': RANKING_DIVERSITY,
+    'ranking_exclude_out_of_stock': RANKING_EXCLUDE_OUT_OF_STOCK,
+    'ranking_low_stock': RANKING_LOW_STOCK,
+    'ranking_state_max_sessions': RANKING_STATE_MAX_SESSIONS,
+    'batch_window': BATCH_WINDOW
 }
\ No newline at end of file
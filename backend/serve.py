@@ -0,0 +1,115 @@
+"""
+Production launcher: load the catalog once, then pre-fork N uvicorn workers.
+
+The app module (catalog snapshot, indexes, scoring engine) is imported in the
+parent before forking, so every worker starts with it already in memory and
+shares those pages copy-on-write instead of loading its own copy. The parent
+only supervises: it restarts a worker that dies and stops them all on
+SIGTERM/SIGINT.
+
+    python serve.py --workers 4 [--host 0.0.0.0] [--port 8000] [--data data/products.json]
+
+Workers don't share in-process state. Use SESSION_BACKEND=sqlite and
+CACHE_BACKEND=sqlite so sessions and cached recommendations are seen by all of
+them. A catalog reload (/api/admin/reload) only reaches the worker that served
+it; use CATALOG_WATCH_INTERVAL so each worker picks up file changes itself.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+
+import uvicorn
+
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+
+from config import config
+
+
+def bind_socket(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(application, sock, log_level):
+    server = uvicorn.Server(uvicorn.Config(application, log_level=log_level, access_log=False))
+    server.run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--data", default=config['DATA_PATH'])
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    config['DATA_PATH'] = args.data
+    sock = bind_socket(args.host, args.port)
+
+    import app as app_module
+    print(f"Loaded {len(app_module.product_service.get_catalog())} products; "
+          f"starting {args.workers} worker(s) on {args.host}:{args.port}")
+
+    if not hasattr(os, 'fork'):
+        print("Warning: os.fork is unavailable on this platform; serving from a single process")
+        run_worker(app_module.app, sock, args.log_level)
+        return
+
+    # move everything loaded so far out of the collector's view, so gc passes in
+    # the workers don't write to (and un-share) the pages holding the catalog
+    gc.collect()
+    gc.freeze()
+
+    workers = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                run_worker(app_module.app, sock, args.log_level)
+            finally:
+                os._exit(0)
+        workers.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(args.workers):
+        spawn()
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited with status {status}, restarting it")
+            spawn()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+import hashlib
+import json
+import sys
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from collections.abc import Sequence
+
+import numpy as np
+
+from services.catalog_file import CatalogColumns
+from services.content_index import ContentIndex
+from services.explanations import feature_phrase
+from services.scoring_engine import ScoringEngine
+
+# content similarity memos per snapshot, keyed by liked set: whole-catalog score vectors
+# (4 bytes per product each) and top_similar() results
+SIMILARITY_MEMO = 16
+TOP_SIMILAR_MEMO = 256
+
+
+class Product:
+    """One catalog entry.
+
+    Slotted (no per-instance __dict__) with interned category/brand/feature/tag strings,
+    since a large catalog holds millions of these.
+    """
+
+    __slots__ = ('id', 'name', 'description', 'price', 'category', 'brand', 'image', 'rating',
+                 'subcategory', 'features', 'tags', 'inventory')
+
+    def __init__(self, id, name, description, price, category, brand, image=None, rating=None,
+                 subcategory=None, features=None, tags=None, inventory=None):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.price = price
+        self.category = _intern(category)
+        self.brand = _intern(brand)
+        self.image = image
+        self.rating = rating
+        self.subcategory = _intern(subcategory)
+        self.features = tuple(_intern(feature) for feature in features or ())
+        self.tags = tuple(_intern(tag) for tag in tags or ())
+        self.inventory = inventory
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a Product from one products.json record."""
+        return cls(
+            id=data.get('id'),
+            name=data.get('name'),
+            description=data.get('description', ''),
+            price=data.get('price', 0),
+            category=data.get('category', ''),
+            brand=data.get('brand', ''),
+            image=data.get('image'),
+            rating=data.get('rating'),
+            subcategory=data.get('subcategory'),
+            features=data.get('features'),
+            tags=data.get('tags'),
+            inventory=data.get('inventory')
+        )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "description": self.description,
+            "price": self.price,
+            "category": self.category,
+            "brand": self.brand,
+            "image": self.image,
+            "rating": self.rating,
+            "subcategory": self.subcategory,
+            "features": list(self.features),
+            "tags": list(self.tags),
+            "inventory": self.inventory
+        }
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Catalog:
+    """Read-only product list with id, category, brand and price indexes built once at load."""
+
+    def __init__(self, products, version=None, content_index=None, neighbors=None, columns=None, source_id=None):
+        # any sequence works, e.g. the LazyProducts of a memory-mapped catalog file
+        self.products = products if isinstance(products, Sequence) else list(products)
+        # None marks an ad-hoc catalog that results must not be cached against
+        self.version = version
+        # identifies the files the snapshot was read from; the same in every worker process
+        self.source_id = source_id
+        self._content_index = content_index
+        # precomputed NeighborIndex, only when a build matching this catalog was found
+        self.neighbors = neighbors
+        if columns is None:
+            columns = CatalogColumns.from_products(self.products)
+
+        self.positions_by_id = {}
+        for position, product_id in enumerate(columns.ids):
+            # first occurrence wins, same as the old linear scan
+            self.positions_by_id.setdefault(str(product_id), position)
+        self._category_positions = self._group_positions(columns.categories, columns.category_codes)
+        self._brand_positions = self._group_positions(columns.brands, columns.brand_codes)
+
+        # (price, position) order; products without a numeric price are left out
+        count = len(columns.prices)
+        priced = np.lexsort((np.arange(count), columns.prices))
+        priced = priced[~np.isnan(columns.prices[priced])]
+        self._prices = columns.prices[priced].tolist()
+        self._price_positions = priced.tolist()
+
+        # columnar price/rating/category/brand arrays for vectorized ranking
+        self.engine = ScoringEngine(self.products, columns)
+
+        # pre-serialized JSON, filled on first use and reused until the next snapshot
+        self._product_json = [None] * len(self.products)
+        # explanation phrases, memoized the same way
+        self._feature_phrases = [None] * len(self.products)
+        self._similarity = OrderedDict()
+        self._top_similar = OrderedDict()
+        self._products_json = None
+
+    @staticmethod
+    def _group_positions(values, codes):
+        # {value: ascending positions}, keyed in order of first appearance
+        order = np.argsort(codes, kind='stable')
+        groups = np.split(order, np.cumsum(np.bincount(codes, minlength=len(values)))[:-1])
+        return {value: group.tolist() for value, group in zip(values, groups)}
+
+    def __len__(self):
+        return len(self.products)
+
+    def __iter__(self):
+        return iter(self.products)
+
+    def __getitem__(self, index):
+        return self.products[index]
+
+    def get(self, product_id):
+        position = self.positions_by_id.get(str(product_id))
+        return None if position is None else self.products[position]
+
+    @property
+    def content_index(self):
+        """TF-IDF index over product text; built on first use if none was loaded."""
+        if self._content_index is None:
+            self._content_index = ContentIndex.build(self.products)
+        return self._content_index
+
+    def positions_of(self, product_ids):
+        positions = []
+        for product_id in product_ids:
+            position = self.positions_by_id.get(str(product_id))
+            if position is not None:
+                positions.append(position)
+        return positions
+
+    def similar_to(self, product_ids, k=10):
+        """Up to k (Product, cosine similarity) pairs closest in content to the given products."""
+        positions = self.positions_of(product_ids)
+        if not positions:
+            return []
+        return [(self.products[position], score) for position, score in self.top_similar(positions, k)]
+
+    @staticmethod
+    def _remember(memo, key, value, size):
+        memo[key] = value
+        while len(memo) > size:
+            memo.popitem(last=False)
+        return value
+
+    def similarity(self, positions, rows=None):
+        """ContentIndex.similarity, memoized by liked set.
+
+        Scoring the whole catalog walks the postings of every query term, which
+        for common terms span much of the catalog; the result is kept for the next
+        request with the same liked products (e.g. after a filter change). With
+        `rows`, only those are scored when that is cheaper, and nothing is kept.
+        """
+        key = frozenset(positions)
+        scores = self._similarity.get(key)
+        if scores is not None:
+            self._similarity.move_to_end(key)
+        else:
+            index = self.content_index
+            query = index.query(positions)
+            if rows is not None and index.prefers_rows(query, np.asarray(rows, dtype=np.intp)):
+                return index.scores(query, rows)
+            scores = index.scores(query)
+            scores.setflags(write=False)
+            self._remember(self._similarity, key, scores, SIMILARITY_MEMO)
+        return scores if rows is None else scores[rows]
+
+    def top_similar(self, positions, k):
+        """ContentIndex.top_similar, memoized by liked set; the list is shared, so don't modify it."""
+        key = (frozenset(positions), k)
+        similar = self._top_similar.get(key)
+        if similar is not None:
+            self._top_similar.move_to_end(key)
+            return similar
+        similar = self.content_index.top_similar(positions, k, scores=self.similarity(positions))
+        return self._remember(self._top_similar, key, similar, TOP_SIMILAR_MEMO)
+
+    def categories(self):
+        return list(self._category_positions)
+
+    def brands(self):
+        return list(self._brand_positions)
+
+    def products_in_category(self, category):
+        return [self.products[position] for position in self._category_positions.get(category, ())]
+
+    def query(self, categories=None, brands=None, min_price=None, max_price=None):
+        """Return products matching every given facet, in catalog order.
+
+        Empty category/brand collections mean "no filter". Price bounds are
+        inclusive and resolved with bisect over the sorted price index, so
+        products without a numeric price only match when no bound is set.
+        """
+        return [self.products[position] for position in self.query_positions(categories, brands, min_price, max_price)]
+
+    def query_positions(self, categories=None, brands=None, min_price=None, max_price=None):
+        """Like query(), but returns sorted catalog positions."""
+        selected = None
+
+        if categories:
+            selected = self._union(self._category_positions, categories)
+        if brands:
+            brand_positions = self._union(self._brand_positions, brands)
+            selected = brand_positions if selected is None else selected & brand_positions
+        if min_price is not None or max_price is not None:
+            lo = 0 if min_price is None else bisect_left(self._prices, min_price)
+            hi = len(self._prices) if max_price is None or max_price == float('inf') else bisect_right(self._prices, max_price)
+            price_positions = set(self._price_positions[lo:hi])
+            selected = price_positions if selected is None else selected & price_positions
+
+        if selected is None:
+            return list(range(len(self.products)))
+        return sorted(selected)
+
+    def product_json(self, position, product=None):
+        """Compact JSON bytes for one product, serialized once per snapshot (kept only for in-memory catalogs).
+
+        Pass the product when the caller already has it, so an on-demand catalog doesn't read it again.
+        """
+        fragment = self._product_json[position]
+        if fragment is None:
+            fragment = self._encode(self.products[position] if product is None else product)
+            if self.in_memory:
+                self._product_json[position] = fragment
+        return fragment
+
+    def feature_phrase(self, product):
+        """The product's explanation phrase (see explanations.feature_phrase), computed once per snapshot."""
+        position = self.positions_by_id.get(str(product.id))
+        # not from this snapshot, or a later product repeating an id
+        if position is None or self.products[position] is not product:
+            return feature_phrase(product)
+        phrase = self._feature_phrases[position]
+        if phrase is None:
+            phrase = self._feature_phrases[position] = feature_phrase(product)
+        return phrase
+
+    @property
+    def in_memory(self):
+        """Whether every Product is held in memory (not read on demand from a catalog file or database)."""
+        return isinstance(self.products, list)
+
+    def products_json(self):
+        """The whole catalog as a JSON array, serialized once per snapshot (see iter_products_json)."""
+        if self._products_json is None:
+            self._products_json = b'[' + b','.join(self.iter_products_json()) + b']'
+        return self._products_json
+
+    def iter_products_json(self):
+        """Every product's JSON fragment in catalog order.
+
+        Fragments are only kept for in-memory catalogs; walking an on-demand
+        catalog leaves no serialized copy of it behind.
+        """
+        keep = self.in_memory
+        # iterating lets a database-backed product list stream rows instead of fetching each one
+        for position, product in enumerate(self.products):
+            fragment = self._product_json[position]
+            if fragment is None:
+                fragment = self._encode(product)
+                if keep:
+                    self._product_json[position] = fragment
+            yield fragment
+
+    @staticmethod
+    def _encode(product):
+        return json.dumps(product.to_dict(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    @property
+    def etag(self):
+        """Tag of this snapshot's data, from its source identity; computed without serializing anything.
+
+        With a `source_id` (set by the ProductService) it is the same in every
+        process serving the same files; otherwise it is per-process, from the version.
+        """
+        identity = f"source:{self.source_id}" if self.source_id is not None else f"version:{self.version}"
+        return hashlib.sha1(identity.encode('utf-8')).hexdigest()[:20]
+
+    @staticmethod
+    def _union(index, keys):
+        positions = set()
+        for key in keys:
+            positions.update(index.get(key, ()))
+        return positions
@@ -0,0 +1,267 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+
+import numpy as np
+
+from services.catalog_file import CatalogColumns
+from services.sqlite_util import LocalConnection
+
+# price, rating and inventory are declared without a type so values keep the type they had in products.json;
+# price_value is the price as a number (NULL when it doesn't parse), for the price indexes
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS products ("
+    "position INTEGER PRIMARY KEY, id TEXT NOT NULL, name TEXT, description TEXT, price, category TEXT, "
+    "brand TEXT, image TEXT, rating, subcategory TEXT, features TEXT, tags TEXT, inventory, price_value REAL)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+    "name, description, tags, content='products', content_rowid='position')",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+)
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS products_id ON products (id)",
+    "CREATE INDEX IF NOT EXISTS products_category ON products (category, price_value)",
+    "CREATE INDEX IF NOT EXISTS products_brand ON products (brand, price_value)",
+    "CREATE INDEX IF NOT EXISTS products_price ON products (price_value)"
+)
+FIELDS = ('id', 'name', 'description', 'price', 'category', 'brand', 'image', 'rating',
+          'subcategory', 'features', 'tags', 'inventory')
+SELECT_PRODUCT = f"SELECT position, {', '.join(FIELDS)} FROM products"
+IMPORT_BATCH = 5000
+
+
+def _number(value, missing=None):
+    # same parsing as CatalogColumns.from_products
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return missing
+
+
+def _row(position, product):
+    return (position, str(product.id), product.name, product.description, product.price, product.category,
+            product.brand, product.image, product.rating, product.subcategory,
+            json.dumps(list(product.features)), json.dumps(list(product.tags)), product.inventory,
+            _number(product.price))
+
+
+def import_products(products, path, fingerprints=None, source=None):
+    """Replace the catalog in the database at `path` with `products`, in one transaction.
+
+    Readers keep seeing the previous catalog until the commit (WAL), and the
+    `generation` meta value goes up by one so workers can tell it changed.
+    Indexes are dropped for the bulk insert and rebuilt before the commit.
+    """
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.execute("BEGIN IMMEDIATE")
+        for statement in INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {statement.split()[5]}")
+        conn.execute("DELETE FROM products")
+        placeholders = ', '.join('?' * (len(FIELDS) + 2))
+        for start in range(0, len(products), IMPORT_BATCH):
+            conn.executemany(
+                f"INSERT INTO products (position, {', '.join(FIELDS)}, price_value) VALUES ({placeholders})",
+                (_row(position, products[position]) for position in range(start, min(start + IMPORT_BATCH, len(products))))
+            )
+        for statement in INDEXES:
+            conn.execute(statement)
+        conn.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+        generation = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        meta = {
+            "generation": str(int(generation[0]) + 1 if generation else 1),
+            "imported_at": str(time.time()),
+            "fingerprints": json.dumps(fingerprints or {}),
+            "source": json.dumps(source or {})
+        }
+        conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", meta.items())
+        conn.execute("COMMIT")
+        conn.execute("PRAGMA optimize")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def _fts_query(text):
+    # each word as a quoted FTS5 string, so user input can't form query syntax
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+class CatalogDatabase:
+    """Read side of a catalog imported into SQLite (see tools/import_catalog_db.py).
+
+    Connections are per thread and per process (see LocalConnection), opened
+    read-only so an import in WAL mode never blocks readers.
+    """
+
+    def __init__(self, path, product_class):
+        self.path = path
+        self._product_class = product_class
+        self._connection = LocalConnection(path, read_only=True)
+
+    def meta(self):
+        rows = self._connection().execute("SELECT key, value FROM meta").fetchall()
+        return dict(rows)
+
+    def generation(self):
+        row = self._connection().execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return int(row[0]) if row else 0
+
+    def snapshot(self):
+        """(meta, CatalogColumns) read in one transaction, so both describe the same import."""
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN")
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            rows = conn.execute(
+                "SELECT id, price_value, rating, category, brand, inventory FROM products ORDER BY position"
+            ).fetchall()
+        return meta, self._columns(rows)
+
+    @staticmethod
+    def _columns(rows):
+        ids, prices, ratings, categories, brands, inventories = zip(*rows) if rows else ((),) * 6
+        category_values, brand_values = {}, {}
+        category_codes = np.array([category_values.setdefault(c, len(category_values)) for c in categories], dtype=np.intp)
+        brand_codes = np.array([brand_values.setdefault(b, len(brand_values)) for b in brands], dtype=np.intp)
+        return CatalogColumns(
+            list(ids),
+            np.array([np.nan if price is None else price for price in prices], dtype=np.float64),
+            np.array([rating or 0.0 for rating in ratings], dtype=np.float64),
+            list(category_values), category_codes, list(brand_values), brand_codes,
+            np.array([_number(inventory, np.nan) for inventory in inventories], dtype=np.float64)
+        )
+
+    def _product(self, row):
+        fields = dict(zip(FIELDS, row[1:]))
+        fields['features'] = json.loads(fields['features'] or '[]')
+        fields['tags'] = json.loads(fields['tags'] or '[]')
+        return self._product_class(**fields)
+
+    def product_at(self, position, product_id):
+        """The product at a catalog position, or the first with its id if the catalog was re-imported since."""
+        conn = self._connection()
+        row = conn.execute(f"{SELECT_PRODUCT} WHERE position = ? AND id = ?", (position, product_id)).fetchone()
+        if row is None:
+            row = conn.execute(f"{SELECT_PRODUCT} WHERE id = ? ORDER BY position LIMIT 1", (product_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Product {product_id} is no longer in the catalog database")
+        return self._product(row)
+
+    def product(self, product_id):
+        row = self._connection().execute(
+            f"{SELECT_PRODUCT} WHERE id = ? ORDER BY position LIMIT 1", (str(product_id),)
+        ).fetchone()
+        return None if row is None else self._product(row)
+
+    def iter_rows(self):
+        """(position, Product) for the whole catalog, streamed in position order."""
+        for row in self._connection().execute(f"{SELECT_PRODUCT} ORDER BY position"):
+            yield row[0], self._product(row)
+
+    def query(self, categories=None, brands=None, min_price=None, max_price=None):
+        """Products matching every given facet, in catalog order; same semantics as Catalog.query()."""
+        return [product for _, product in self.query_rows(categories, brands, min_price, max_price)]
+
+    def query_rows(self, categories=None, brands=None, min_price=None, max_price=None, after=None, limit=None):
+        """(position, Product) for query() matches, filtered and paged by SQLite; `after` is a position to continue from."""
+        clauses, params = [], []
+        if categories:
+            clauses.append(f"category IN ({', '.join('?' * len(categories))})")
+            params.extend(categories)
+        if brands:
+            clauses.append(f"brand IN ({', '.join('?' * len(brands))})")
+            params.extend(brands)
+        if min_price is not None or max_price is not None:
+            # products without a numeric price only match when no bound is set
+            clauses.append("price_value IS NOT NULL")
+            if min_price is not None:
+                clauses.append("price_value >= ?")
+                params.append(min_price)
+            if max_price is not None and max_price != float('inf'):
+                clauses.append("price_value <= ?")
+                params.append(max_price)
+        if after is not None:
+            clauses.append("position > ?")
+            params.append(after)
+        sql = SELECT_PRODUCT + (f" WHERE {' AND '.join(clauses)}" if clauses else "") + " ORDER BY position"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [(row[0], self._product(row)) for row in self._connection().execute(sql, params)]
+
+    def search(self, text, limit=20):
+        """Full-text search over name, description and tags, best match (BM25) first."""
+        query = _fts_query(text)
+        if not query:
+            return []
+        rows = self._connection().execute(
+            f"SELECT p.position, {', '.join('p.' + field for field in FIELDS)} FROM products_fts "
+            "JOIN products p ON p.position = products_fts.rowid "
+            "WHERE products_fts MATCH ? ORDER BY bm25(products_fts) LIMIT ?",
+            (query, limit)
+        ).fetchall()
+        return [self._product(row) for row in rows]
+
+
+class DatabaseProducts(Sequence):
+    """Product list over a CatalogDatabase snapshot, fetched by position on demand.
+
+    At most `cache_size` Products are kept (least recently used go first), so
+    worker memory doesn't grow with the catalog. Iterating streams every row
+    in one query instead of one lookup per product.
+    """
+
+    def __init__(self, database, ids, cache_size=10000):
+        self.database = database
+        self.ids = ids
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self.ids):
+            raise IndexError(index)
+        with self._lock:
+            product = self._cache.get(index)
+            if product is not None:
+                self._cache.move_to_end(index)
+                return product
+        product = self.database.product_at(index, self.ids[index])
+        with self._lock:
+            self._cache[index] = product
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return product
+
+    def __iter__(self):
+        position = -1
+        for position, product in self.database.iter_rows():
+            if position >= len(self.ids):
+                break
+            # a re-import since the snapshot was taken moves products; fall back to lookups
+            yield product if str(product.id) == self.ids[position] else self[position]
+        for missing in range(position + 1, len(self.ids)):
+            yield self[missing]
+
+    def query(self, categories=None, brands=None, min_price=None, max_price=None, after=None, limit=None):
+        """CatalogDatabase.query_rows, or None if the database was re-imported since this snapshot."""
+        rows = self.database.query_rows(categories, brands, min_price, max_price, after, limit)
+        if any(position >= len(self.ids) or str(product.id) != self.ids[position] for position, product in rows):
+            return None
+        return rows
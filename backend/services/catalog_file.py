@@ -0,0 +1,299 @@
+import json
+import os
+import struct
+from collections.abc import Sequence
+
+import numpy as np
+
+MAGIC = b'RECCAT01'
+ALIGNMENT = 64
+# value kinds for numeric fields, so JSON output keeps 25 vs 25.0 and null
+NULL, INT, FLOAT = 0, 1, 2
+
+
+class CatalogColumns:
+    """Per-product arrays the catalog indexes and the scoring engine are built from.
+
+    `categories`/`brands` hold each distinct value once, in order of first
+    appearance; `category_codes`/`brand_codes` index into them per product.
+    Unparseable prices and inventories are NaN and missing ratings 0.0.
+    """
+
+    def __init__(self, ids, prices, ratings, categories, category_codes, brands, brand_codes, inventories):
+        self.ids = ids
+        self.prices = prices
+        self.ratings = ratings
+        self.inventories = inventories
+        self.categories = categories
+        self.category_codes = category_codes
+        self.brands = brands
+        self.brand_codes = brand_codes
+
+    @classmethod
+    def from_products(cls, products):
+        count = len(products)
+        prices = np.empty(count, dtype=np.float64)
+        ratings = np.empty(count, dtype=np.float64)
+        inventories = np.empty(count, dtype=np.float64)
+        category_codes = np.empty(count, dtype=np.intp)
+        brand_codes = np.empty(count, dtype=np.intp)
+        categories = {}
+        brands = {}
+        for position, product in enumerate(products):
+            try:
+                prices[position] = float(product.price)
+            except (TypeError, ValueError):
+                prices[position] = np.nan
+            ratings[position] = product.rating or 0.0
+            try:
+                inventories[position] = float(product.inventory)
+            except (TypeError, ValueError):
+                inventories[position] = np.nan
+            category_codes[position] = categories.setdefault(product.category, len(categories))
+            brand_codes[position] = brands.setdefault(product.brand, len(brands))
+        return cls([product.id for product in products], prices, ratings,
+                   list(categories), category_codes, list(brands), brand_codes, inventories)
+
+
+def source_stamp(path):
+    """Size and mtime of the products.json a catalog file was compiled from."""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _numbers(values, field, dtype):
+    array = np.zeros(len(values), dtype=dtype)
+    kinds = np.zeros(len(values), dtype=np.uint8)
+    for position, value in enumerate(values):
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{field} of product #{position} is not a number: {value!r}")
+        if isinstance(value, float) and array.dtype.kind == 'i':
+            raise ValueError(f"{field} of product #{position} is not an integer: {value!r}")
+        array[position] = value
+        kinds[position] = INT if isinstance(value, int) else FLOAT
+    return array, kinds
+
+
+def _strings(values):
+    """(offsets, utf-8 blob, null mask) for a list of optional strings."""
+    encoded = [b'' if value is None else str(value).encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(chunk) for chunk in encoded], out=offsets[1:])
+    nulls = np.array([value is None for value in values], dtype=np.uint8)
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8), nulls
+
+
+def _dictionary(values):
+    """(codes, distinct values in order of first appearance)."""
+    codes = {}
+    array = np.array([codes.setdefault(value, len(codes)) for value in values], dtype=np.int32)
+    return array, list(codes)
+
+
+def compile_catalog(products, path, fingerprints=None, source=None):
+    """Write Products to `path` as a binary columnar catalog.
+
+    Layout: 8-byte magic, a little-endian u64 header length, a JSON header
+    naming every column's dtype, offset and length, then the columns as raw
+    64-byte-aligned arrays. Numbers are fixed-width (with a kind column for
+    null/int/float), category/brand/subcategory are dictionary codes, features
+    and tags are code lists into one shared string table, and free text is an
+    offsets array plus a UTF-8 blob. Ids are read back as strings.
+
+    The file is written next to `path` and renamed over it, so processes that
+    still map the previous file keep a consistent view.
+    """
+    columns = {}
+
+    def add_strings(name, values):
+        offsets, blob, nulls = _strings(values)
+        columns[f"{name}.offsets"] = offsets
+        columns[f"{name}.data"] = blob
+        if nulls.any():
+            columns[f"{name}.nulls"] = nulls
+
+    add_strings('id', [str(product.id) for product in products])
+    for name in ('name', 'description', 'image'):
+        add_strings(name, [getattr(product, name) for product in products])
+    for name in ('category', 'brand', 'subcategory'):
+        codes, distinct = _dictionary(getattr(product, name) for product in products)
+        columns[f"{name}.codes"] = codes
+        add_strings(f"{name}.values", distinct)
+
+    term_codes = {}
+    for name in ('features', 'tags'):
+        offsets = np.zeros(len(products) + 1, dtype=np.int64)
+        np.cumsum([len(getattr(product, name)) for product in products], out=offsets[1:])
+        columns[f"{name}.offsets"] = offsets
+        columns[f"{name}.codes"] = np.array([
+            term_codes.setdefault(term, len(term_codes))
+            for product in products for term in getattr(product, name)
+        ], dtype=np.int32)
+    add_strings('terms', list(term_codes))
+
+    for name, dtype in (('price', np.float64), ('rating', np.float64), ('inventory', np.int64)):
+        values, kinds = _numbers([getattr(product, name) for product in products], name, dtype)
+        columns[name] = values
+        columns[f"{name}.kinds"] = kinds
+
+    layout = {}
+    offset = 0
+    for name, array in columns.items():
+        array = np.ascontiguousarray(array)
+        columns[name] = array
+        layout[name] = {"dtype": array.dtype.str, "offset": offset, "length": len(array)}
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({
+        "count": len(products),
+        "columns": layout,
+        "fingerprints": fingerprints or {},
+        "source": source or {}
+    }).encode('utf-8')
+    data_start = _align(len(MAGIC) + 8 + len(header))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for name, array in columns.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+class CatalogFile:
+    """Read-only, memory-mapped view of a compiled catalog.
+
+    Columns are NumPy views straight onto the mapping, so worker processes
+    share the pages through the OS page cache and nothing is parsed up front.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a compiled catalog (run tools/compile_catalog.py)")
+            (header_length,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_length))
+        self.count = header["count"]
+        self.fingerprints = header["fingerprints"]
+        self.source = header["source"]
+        self._layout = header["columns"]
+        self._data_start = _align(len(MAGIC) + 8 + header_length)
+        self._buffer = np.memmap(path, dtype=np.uint8, mode='r')
+
+        self.categories = self.strings('category.values')
+        self.brands = self.strings('brand.values')
+        self.subcategories = self.strings('subcategory.values')
+        self.terms = self.strings('terms')
+
+    def __len__(self):
+        return self.count
+
+    def column(self, name, default=None):
+        spec = self._layout.get(name)
+        if spec is None:
+            return default
+        dtype = np.dtype(spec["dtype"])
+        start = self._data_start + spec["offset"]
+        return self._buffer[start:start + spec["length"] * dtype.itemsize].view(dtype)
+
+    def string(self, name, position):
+        nulls = self.column(f"{name}.nulls")
+        if nulls is not None and nulls[position]:
+            return None
+        offsets = self.column(f"{name}.offsets")
+        return bytes(self.column(f"{name}.data")[offsets[position]:offsets[position + 1]]).decode('utf-8')
+
+    def strings(self, name):
+        """Decode a whole string column at once."""
+        offsets = self.column(f"{name}.offsets").tolist()
+        blob = bytes(self.column(f"{name}.data"))
+        if blob.isascii():
+            # byte offsets are character offsets; decode once and slice
+            text = blob.decode('ascii')
+            values = [text[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+        else:
+            values = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+        nulls = self.column(f"{name}.nulls")
+        if nulls is not None:
+            for position in np.flatnonzero(nulls).tolist():
+                values[position] = None
+        return values
+
+    def number(self, name, position):
+        kind = self.column(f"{name}.kinds")[position]
+        if kind == NULL:
+            return None
+        value = self.column(name)[position]
+        return int(value) if kind == INT else float(value)
+
+    def columns(self):
+        """CatalogColumns straight from the file, without building any Product."""
+        # a null price fails every price comparison, same as float(None) failing in from_products
+        prices = np.where(self.column('price.kinds') == NULL, np.nan, self.column('price'))
+        ratings = np.where(self.column('rating.kinds') == NULL, 0.0, self.column('rating'))
+        inventories = np.where(self.column('inventory.kinds') == NULL, np.nan, self.column('inventory'))
+        return CatalogColumns(
+            self.strings('id'), prices, ratings,
+            self.categories, self.column('category.codes').astype(np.intp),
+            self.brands, self.column('brand.codes').astype(np.intp),
+            inventories
+        )
+
+    def product_fields(self, position):
+        """Keyword arguments for Product(...) at one catalog position."""
+        def terms(name):
+            offsets = self.column(f"{name}.offsets")
+            codes = self.column(f"{name}.codes")[offsets[position]:offsets[position + 1]]
+            return [self.terms[code] for code in codes.tolist()]
+
+        return {
+            "id": self.string('id', position),
+            "name": self.string('name', position),
+            "description": self.string('description', position),
+            "price": self.number('price', position),
+            "category": self.categories[self.column('category.codes')[position]],
+            "brand": self.brands[self.column('brand.codes')[position]],
+            "image": self.string('image', position),
+            "rating": self.number('rating', position),
+            "subcategory": self.subcategories[self.column('subcategory.codes')[position]],
+            "features": terms('features'),
+            "tags": terms('tags'),
+            "inventory": self.number('inventory', position)
+        }
+
+
+class LazyProducts(Sequence):
+    """Product list over a CatalogFile; each Product is built on first access and then kept."""
+
+    def __init__(self, catalog_file, product_class):
+        self.file = catalog_file
+        self._product_class = product_class
+        self._products = [None] * len(catalog_file)
+
+    def __len__(self):
+        return len(self._products)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        product = self._products[index]
+        if product is None:
+            product = self._product_class(**self.file.product_fields(index))
+            self._products[index] = product
+        return product
+
+    @property
+    def materialized(self):
+        return sum(product is not None for product in self._products)
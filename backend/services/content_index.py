@@ -0,0 +1,180 @@
+import hashlib
+import math
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+# hashed feature space; collisions are rare enough at catalog vocabulary sizes
+HASH_DIM = 2 ** 18
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'by', 'for', 'from', 'in', 'is', 'it',
+    'of', 'on', 'or', 'that', 'the', 'to', 'with', 'your', 'you'
+])
+
+
+def product_text(product):
+    """Text the index is built from: name, subcategory, description, features and tags."""
+    parts = [product.name or '', getattr(product, 'subcategory', None) or '', product.description or '']
+    parts.extend(getattr(product, 'features', None) or [])
+    parts.extend(getattr(product, 'tags', None) or [])
+    return ' '.join(parts)
+
+
+def tokenize(text):
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOP_WORDS and len(t) > 1]
+
+
+def _term_id(token):
+    # crc32 rather than hash() so ids are stable across processes and runs
+    return zlib.crc32(token.encode('utf-8')) % HASH_DIM
+
+
+def catalog_fingerprint(products):
+    """Hash of ids and indexed text, used to tell whether a saved index is stale."""
+    digest = hashlib.sha1()
+    for product in products:
+        digest.update(str(product.id).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(product_text(product).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ContentIndex:
+    """Hashed TF-IDF vectors over product text, stored as sparse row/column arrays.
+
+    Rows (CSR) give a product's vector; the term-major copy (CSC) is an inverted
+    index, so scoring a query only touches postings of the query's terms.
+    """
+
+    def __init__(self, indptr, indices, data, fingerprint=None):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.fingerprint = fingerprint
+        self.size = len(indptr) - 1
+
+        # term-major copy of the same matrix
+        rows = np.repeat(np.arange(self.size, dtype=np.int32), np.diff(indptr))
+        by_term = np.argsort(indices, kind='stable')
+        self.term_indptr = np.zeros(HASH_DIM + 1, dtype=np.int64)
+        np.cumsum(np.bincount(indices, minlength=HASH_DIM), out=self.term_indptr[1:])
+        self.term_rows = rows[by_term]
+        self.term_data = data[by_term]
+
+    @classmethod
+    def build(cls, products):
+        """Build the index from Product objects (sublinear tf, smoothed idf, L2-normalized rows)."""
+        term_counts = []
+        document_frequency = Counter()
+        for product in products:
+            counts = Counter(_term_id(token) for token in tokenize(product_text(product)))
+            term_counts.append(counts)
+            document_frequency.update(counts.keys())
+
+        total = len(term_counts)
+        idf = {term: math.log((1 + total) / (1 + df)) + 1 for term, df in document_frequency.items()}
+
+        indptr = np.zeros(total + 1, dtype=np.int64)
+        indices = []
+        data = []
+        for row, counts in enumerate(term_counts):
+            weights = {term: (1 + math.log(count)) * idf[term] for term, count in counts.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term in sorted(weights):
+                indices.append(term)
+                data.append(weights[term] / norm)
+            indptr[row + 1] = len(indices)
+
+        return cls(
+            indptr,
+            np.array(indices, dtype=np.int32),
+            np.array(data, dtype=np.float32),
+            fingerprint=catalog_fingerprint(products)
+        )
+
+    def save(self, path):
+        np.savez(path, indptr=self.indptr, indices=self.indices, data=self.data,
+                 fingerprint=np.array(self.fingerprint or ''))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as saved:
+            return cls(saved['indptr'], saved['indices'], saved['data'], fingerprint=str(saved['fingerprint']) or None)
+
+    def query(self, positions):
+        """The L2-normalized centroid of the given catalog positions' vectors, as {term: weight}."""
+        query = {}
+        for position in positions:
+            start, stop = self.indptr[position], self.indptr[position + 1]
+            for term, weight in zip(self.indices[start:stop].tolist(), self.data[start:stop].tolist()):
+                query[term] = query.get(term, 0.0) + weight
+        norm = math.sqrt(sum(w * w for w in query.values()))
+        if not norm:
+            return {}
+        return {term: weight / norm for term, weight in query.items()}
+
+    def prefers_rows(self, query, rows):
+        """Whether scoring just `rows` from their own vectors touches fewer entries than the query's postings.
+
+        Common terms have postings spanning much of the catalog, so a few hundred
+        candidate rows are far cheaper to score directly.
+        """
+        terms = np.fromiter(query, dtype=np.int64, count=len(query))
+        postings = int((self.term_indptr[terms + 1] - self.term_indptr[terms]).sum())
+        return int((self.indptr[rows + 1] - self.indptr[rows]).sum()) < postings
+
+    def scores(self, query, rows=None):
+        """Cosine similarity of every product (or only `rows`, in the order given) to a query()."""
+        if rows is not None:
+            return self._row_scores(query, np.asarray(rows, dtype=np.intp))
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term, weight in query.items():
+            start, stop = self.term_indptr[term], self.term_indptr[term + 1]
+            scores[self.term_rows[start:stop]] += self.term_data[start:stop] * weight
+        return scores
+
+    def _row_scores(self, query, rows):
+        if not query or not len(rows):
+            return np.zeros(len(rows), dtype=np.float32)
+        # dense query vector, so each row entry's weight is one gather (terms not in the query read 0)
+        weights = np.zeros(HASH_DIM, dtype=np.float32)
+        weights[np.fromiter(query, dtype=np.int64, count=len(query))] = list(query.values())
+        # the CSR entries of every row, concatenated; row i's start at offsets[i]
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        offsets = np.cumsum(lengths) - lengths
+        entries = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+        products = self.data[entries] * weights[self.indices[entries]]
+        # the appended 0 keeps trailing empty rows in range; reduceat gives empty rows their next entry, so zero them
+        scores = np.add.reduceat(np.append(products, np.float32(0)), offsets)
+        scores[lengths == 0] = 0.0
+        return scores
+
+    def similarity(self, positions, rows=None):
+        """Cosine similarity of every product (or only `rows`) to the centroid of the given catalog positions."""
+        query = self.query(positions)
+        if rows is not None and not self.prefers_rows(query, np.asarray(rows, dtype=np.intp)):
+            return self.scores(query)[rows]
+        return self.scores(query, rows)
+
+    def top_similar(self, positions, k, exclude=(), scores=None):
+        """Up to k (position, score) pairs most similar to the given positions, best first.
+
+        The query positions themselves and anything in `exclude` are skipped, as are
+        products sharing no terms with the query. `scores` is an already computed
+        similarity(positions), which is left unchanged.
+        """
+        scores = self.similarity(positions) if scores is None else scores.copy()
+        scores[list(positions)] = 0.0
+        if exclude:
+            scores[list(exclude)] = 0.0
+        matching = np.flatnonzero(scores > 0)
+        if len(matching) > k:
+            matching = matching[np.argpartition(-scores[matching], k - 1)[:k]]
+        # best score first, catalog order on ties
+        matching = matching[np.lexsort((matching, -scores[matching]))]
+        return list(zip(matching.tolist(), scores[matching].tolist()))
@@ -0,0 +1,92 @@
+from services.neighbor_index import COMPLEMENTARY, SAME_BRAND
+
+
+def feature_phrase(product):
+    """What an explanation says a product offers: its first feature, else its description's first clause."""
+    if product.features:
+        phrase = product.features[0]
+    else:
+        phrase = (product.description or '').split(',')[0]
+    return phrase.strip().rstrip('.').lower()
+
+
+# the explanation templates; every explanation the mock recommender writes is one of these
+def since_you_liked(liked, product, phrase):
+    return f"Since you liked {liked.name}, you'll love {product.name} for its {phrase}"
+
+
+def since_you_liked_brand(liked, product):
+    return f"Since you liked {liked.name}, you'll love {product.name} for its premium {product.brand} quality"
+
+
+def since_you_liked_complement(liked, product, phrase):
+    return f"Since you liked {liked.name}, you'll love {product.name} to complement it with {phrase}"
+
+
+def based_on_interest(topic, product, phrase):
+    return f"Based on your interest in {topic}, you'll love {product.name} for its {phrase}"
+
+
+def based_on_interests(product, phrase):
+    return f"Based on your interests, you'll love {product.name} for its {phrase}"
+
+
+class Explainer:
+    """Writes the explanations for one request's picks.
+
+    The liked product each explanation refers to is looked up in maps built
+    once per request (first liked product per category, per brand and per
+    complementary category) rather than by rescanning the liked list, and
+    feature phrases come from the catalog snapshot's memo (see
+    Catalog.feature_phrase). Methods take the candidate product and return
+    the text; the mock, batch and streaming paths all go through here.
+    """
+
+    def __init__(self, catalog, liked_products, complementary_categories):
+        self.catalog = catalog
+        self.liked_products = liked_products
+        self.liked_by_category = {}
+        self.liked_by_brand = {}
+        self.liked_by_complement = {}
+        for liked in liked_products:
+            self.liked_by_category.setdefault(liked.category, liked)
+            self.liked_by_brand.setdefault(liked.brand, liked)
+            for category in complementary_categories.get(liked.category, []):
+                self.liked_by_complement.setdefault(category, liked)
+
+    def _phrase(self, product):
+        return self.catalog.feature_phrase(product)
+
+    def neighbor(self, kind, product, liked):
+        """For a candidate from `liked`'s precomputed neighbor list of the given kind."""
+        if kind == SAME_BRAND:
+            return since_you_liked_brand(liked, product)
+        if kind == COMPLEMENTARY:
+            return since_you_liked_complement(liked, product, self._phrase(product))
+        return since_you_liked(liked, product, self._phrase(product))
+
+    def preferred(self, product):
+        liked = self.liked_by_category.get(product.category)
+        if liked:
+            return since_you_liked(liked, product, self._phrase(product))
+        return based_on_interest(product.category, product, self._phrase(product))
+
+    def same_category(self, product):
+        liked = self.liked_by_category.get(product.category)
+        return since_you_liked(liked, product, self._phrase(product)) if liked else self.other(product)
+
+    def same_brand(self, product):
+        liked = self.liked_by_brand.get(product.brand)
+        return since_you_liked_brand(liked, product) if liked else self.other(product)
+
+    def complementary(self, product):
+        # the liked product this complements, else the first liked product
+        liked = self.liked_by_complement.get(product.category, self.liked_products[0])
+        return since_you_liked_complement(liked, product, self._phrase(product))
+
+    def other(self, product):
+        if self.liked_products:
+            liked = (self.liked_by_category.get(product.category) or self.liked_by_brand.get(product.brand)
+                     or self.liked_products[0])
+            return based_on_interest(liked.category, product, self._phrase(product))
+        return based_on_interests(product, self._phrase(product))
@@ -0,0 +1,70 @@
+import json
+
+
+class JSONArrayStream:
+    """Incremental parser for a JSON array of objects arriving in text chunks.
+
+    `feed()` returns every top-level object of the first array whose closing
+    brace has arrived, decoded, without waiting for the rest of the array.
+    Anything before the opening bracket (e.g. a ```json fence or a preamble)
+    is ignored, as is an element that fails to decode on its own.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._in_array = False
+        self._done = False
+        self._depth = 0  # object/array nesting inside the top-level array
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def done(self):
+        """True once the top-level array has closed."""
+        return self._done
+
+    def feed(self, text):
+        items = []
+        for char in text:
+            if self._done:
+                break
+            if not self._in_array:
+                if char == '[':
+                    self._in_array = True
+                continue
+
+            if self._depth:
+                self._buffer.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if not self._depth:
+                    self._buffer = [char]
+                self._depth += 1
+            elif char in '}]':
+                if not self._depth:
+                    # closing bracket of the top-level array
+                    self._done = True
+                    continue
+                self._depth -= 1
+                if not self._depth:
+                    item = self._decode(''.join(self._buffer))
+                    if isinstance(item, dict):
+                        items.append(item)
+                    self._buffer = []
+        return items
+
+    @staticmethod
+    def _decode(text):
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
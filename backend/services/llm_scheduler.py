@@ -0,0 +1,98 @@
+import math
+import time
+from collections import deque
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class LatencyWindow:
+    """Latencies (seconds) of the most recent calls, for percentiles such as the hedge delay."""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+
+    def record(self, seconds):
+        self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, q):
+        """Nearest-rank percentile (q in 0-100) of the window, or None when empty."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+    def summary(self):
+        def ms(q):
+            value = self.percentile(q)
+            return round(value * 1000, 1) if value is not None else None
+        return {"samples": len(self._samples), "p50_ms": ms(50), "p95_ms": ms(95), "p99_ms": ms(99)}
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker around the LLM.
+
+    Closed: calls go through. After `failure_threshold` failures in a row it opens
+    and calls are refused for `reset_timeout` seconds. Then it is half-open and
+    lets up to `half_open_probes` calls through: a success closes it, a failure
+    opens it again for another `reset_timeout`. Probes that never report back
+    (e.g. the caller went away) are replaced after another `reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, half_open_probes=1, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self._clock = clock
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probed_at = 0.0
+        self.trips = 0
+
+    @property
+    def state(self):
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probes = 0
+        elif self._state == HALF_OPEN and self._clock() - self._probed_at >= self.reset_timeout:
+            self._probes = 0
+        return self._state
+
+    def allow(self):
+        """Whether a call may go to the LLM now; half-open probes are counted as they are let through."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._probes < self.half_open_probes:
+            self._probes += 1
+            self._probed_at = self._clock()
+            return True
+        return False
+
+    def release(self):
+        """Hand back a half-open probe that allow() granted for a call that was never made."""
+        if self._state == HALF_OPEN and self._probes:
+            self._probes -= 1
+
+    def record_success(self):
+        self._state = CLOSED
+        self._failures = 0
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != OPEN:
+                self.trips += 1
+            self._state = OPEN
+            self._opened_at = self._clock()
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "trips": self.trips
+        }
@@ -1,238 +1,900 @@
+import asyncio
+import functools
+import itertools
 import json
 import random
-from openai import OpenAI
+import time
+from collections import OrderedDict
+import httpx
+import numpy as np
+from openai import AsyncOpenAI
 import os
 import sys
 
-class Product:
-    def __init__(self, id, name, description, price, category, brand, image=None, rating=None):
-        self.id = id
-        self.name = name
-        self.description = description
-        self.price = price
-        self.category = category
-        self.brand = brand
-        self.image = image
-        self.rating = rating
-
 current_dir = os.path.dirname(os.path.abspath(__file__))
 backend_dir = os.path.dirname(current_dir)
 sys.path.insert(0, backend_dir)
 
 from config import LLM_CONFIG
+from services.catalog import Catalog, Product
+from services.explanations import Explainer
+from services.json_stream import JSONArrayStream
+from services.llm_scheduler import CircuitBreaker, LatencyWindow
+from services.metrics import REGISTRY, background, span, timed
+from services.neighbor_index import COMPLEMENTARY, CONTENT, SAME_BRAND, SAME_CATEGORY
+from services.ranking import RankingStage
+from services.ranking_pool import RankingPool
+from services.recommendation_cache import RecommendationCache, SQLiteRecommendationCache, make_cache_key
+from services.scoring_engine import GroupRankingState, RankingState
+
+# categories that pair well with a liked/preferred category
+COMPLEMENTARY_CATEGORIES = {
+    'Electronics': ['Accessories', 'Home'],
+    'Home': ['Electronics', 'Accessories'],
+    'Sports': ['Health', 'Footwear'],
+    'Health': ['Sports', 'Electronics'],
+    'Beauty': ['Health', 'Accessories'],
+    'Footwear': ['Sports', 'Clothing'],
+    'Clothing': ['Accessories', 'Footwear'],
+    'Accessories': ['Electronics', 'Clothing']
+}
+
+# how many content-similar products may jump the rating order within their pool
+SIMILAR_CANDIDATES = 200
+
+# affinity handed to the RankingStage: neighbor-list picks, LLM picks, and the scoring
+# engine's pools (preferred, same category, same brand, complementary, other)
+NEIGHBOR_AFFINITY = 1.0
+LLM_AFFINITY = 1.0
+POOL_AFFINITY = (0.9, 0.7, 0.6, 0.5, 0.2)
+# affinity lost per place down a pool, a neighbor merge or the LLM's answer
+RANK_DECAY = 0.01
+# products drawn from each pool (and from the neighbor merge) for the ranking stage to choose from
+CANDIDATES_PER_POOL = 8
+# catalog products offered to the ranking stage when the LLM's answer leaves slots open
+FALLBACK_CANDIDATES = 40
+# most affinity an LLM candidate can collect (category, brand, complement, content similarity)
+MAX_CANDIDATE_AFFINITY = 5.5
+
+# rough chars-per-token ratio for English product text; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+LLM_CALL_SECONDS = REGISTRY.histogram('recommender_llm_call_seconds', 'Latency of single LLM completions.')
+REJECTED_RECOMMENDATIONS = REGISTRY.counter(
+    'recommender_llm_rejected_items_total', 'LLM-recommended items dropped during validation.', ('reason',)
+)
 
-# Initialize the OpenAI client with just the API key
+def _rank_in_pool(service, catalog, preferences, liked_products):
+    """Mock ranking inside a RankingPool process; products go back as catalog positions."""
+    result = service._generate_mock_recommendations(preferences, liked_products, catalog)
+    return [
+        {**r, "product": catalog.positions_by_id[str(r["product"].id)]}
+        for r in result["recommendations"]
+    ]
+
+# Initialize the async OpenAI client on one pooled HTTP connection
 class LLMService:
     def __init__(self, config=None):
         self.config = config or LLM_CONFIG
+        # caps in-flight completions so a burst can't open unbounded requests
+        self._llm_slots = asyncio.Semaphore(self.config.get('max_concurrency', 8))
+        self._http_client = None
+        self.prompt_stats = {
+            "prompts": 0,
+            "prompt_tokens_total": 0,
+            "last_prompt_tokens": 0,
+            "last_candidates_considered": 0,
+            "last_candidates_included": 0,
+            "api_prompt_tokens_total": 0
+        }
+        if self.config.get('cache_backend') == 'sqlite':
+            # shared by all worker processes pointed at the same file
+            self.cache = SQLiteRecommendationCache(
+                self.config['cache_db_path'],
+                max_entries=self.config.get('cache_max_entries', 1024),
+                ttl_seconds=self.config.get('cache_ttl', 300)
+            )
+        else:
+            self.cache = RecommendationCache(
+                max_entries=self.config.get('cache_max_entries', 1024),
+                ttl_seconds=self.config.get('cache_ttl', 300)
+            )
+        # final top-k selection (weights, stock and diversity constraints) for every path
+        self.ranking = RankingStage.from_config(self.config)
+        # stateless mock ranking in forked worker processes, so it doesn't block the event loop
+        self.ranking_pool = None
+        if self.config.get('ranking_processes', 0) > 0:
+            if RankingPool.available():
+                self.ranking_pool = RankingPool(self.config['ranking_processes'], owner=self)
+            else:
+                print("Warning: ranking processes need the fork start method; ranking in-process instead")
+        # per-session mock ranking state, most recently used last
+        self._ranking_states = OrderedDict()
+        # single-flight: cache key -> task computing it, shared by concurrent identical requests
+        self._in_flight = {}
+        self._active_requests = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._prefetch_task = None
+        # cache keys filled by prefetch and not yet requested, oldest first
+        self._prefetched = OrderedDict()
+        self.request_stats = {
+            "coalesced": 0,
+            "prefetched": 0,
+            "prefetch_hits": 0,
+            "streams": 0,
+            "stream_mock_fills": 0,
+            "pool_ranked": 0
+        }
+        # scheduler: cache -> LLM (deadline, hedged) -> mock, with a breaker in front of the LLM
+        self.breaker = CircuitBreaker(
+            failure_threshold=self.config.get('breaker_failure_threshold', 5),
+            reset_timeout=self.config.get('breaker_reset_timeout', 30),
+            half_open_probes=self.config.get('breaker_half_open_probes', 1)
+        )
+        self.llm_latency = LatencyWindow()
+        self.request_latency = LatencyWindow()
+        self.scheduler_stats = {
+            "served": {"cache": 0, "llm": 0, "mock": 0},
+            "llm_eligible": 0,
+            "llm_calls": 0,
+            "hedges_sent": 0,
+            "hedge_wins": 0,
+            "fallbacks": {"breaker_open": 0, "timeout": 0, "error": 0, "unusable_response": 0}
+        }
         try:
             self.client = None
             if self.config.get('api_key'):
-                self.client = OpenAI(api_key=self.config['api_key'])
+                max_connections = self.config.get('max_connections', 20)
+                self._http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+                    timeout=self.config.get('timeout', 10)
+                )
+                self.client = AsyncOpenAI(
+                    api_key=self.config['api_key'],
+                    base_url=self.config.get('base_url'),
+                    http_client=self._http_client,
+                    max_retries=0  # the deadline below owns retries/fallback
+                )
         except Exception as e:
             print(f"Warning: OpenAI client initialization failed: {e}")
             # This is fine, we'll use mock recommendations
             self.client = None
     
-    async def generate_recommendations(self, preferences, liked_products, products_catalog):
-        """Generate personalized product recommendations."""
+    async def aclose(self):
+        """Close the pooled HTTP connection; call on app shutdown."""
+        if self._prefetch_task is not None:
+            self._prefetch_task.cancel()
+        if self.ranking_pool is not None:
+            self.ranking_pool.close()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+    
+    def _llm_enabled(self):
+        # use_mock_api forces the mock engine even when an LLM is configured
+        return bool(self.config.get('use_llm') and self.client and not self.config.get('use_mock_api'))
+    
+    def _record_llm_failure(self, reason, trip_breaker=True):
+        self.scheduler_stats["fallbacks"][reason] += 1
+        if trip_breaker:
+            self.breaker.record_failure()
+    
+    def scheduler_summary(self):
+        """Scheduler counters with fallback rate, breaker state and latency percentiles."""
+        stats = self.scheduler_stats
+        fallbacks = sum(stats["fallbacks"].values())
+        return {
+            **stats,
+            "fallback_rate": round(fallbacks / stats["llm_eligible"], 4) if stats["llm_eligible"] else 0.0,
+            "breaker": self.breaker.stats(),
+            "llm_latency": self.llm_latency.summary(),
+            "request_latency": self.request_latency.summary()
+        }
+
+    def collect_metrics(self):
+        """Metric families for /metrics, read from the counters this service already keeps."""
+        cache = self.cache
+        stats = self.scheduler_stats
+        return [
+            ('recommender_cache_hits_total', 'counter', 'Recommendation cache hits.', [({}, cache.hits)]),
+            ('recommender_cache_misses_total', 'counter', 'Recommendation cache misses.', [({}, cache.misses)]),
+            ('recommender_cache_evictions_total', 'counter', 'Entries evicted from the recommendation cache.',
+             [({}, cache.evictions)]),
+            ('recommender_cache_expirations_total', 'counter', 'Expired recommendation cache entries.',
+             [({}, cache.expirations)]),
+            ('recommender_cache_entries', 'gauge', 'Entries in the recommendation cache.', [({}, len(cache))]),
+            ('recommender_served_total', 'counter', 'Recommendation requests by the tier that answered them.',
+             [({'tier': tier}, count) for tier, count in stats["served"].items()]),
+            ('recommender_llm_fallbacks_total', 'counter', 'LLM attempts that fell back to the mock engine.',
+             [({'reason': reason}, count) for reason, count in stats["fallbacks"].items()]),
+            ('recommender_llm_calls_total', 'counter', 'LLM completions requested.', [({}, stats["llm_calls"])]),
+            ('recommender_llm_hedges_total', 'counter', 'Hedged LLM requests sent.', [({}, stats["hedges_sent"])]),
+            ('recommender_llm_breaker_open', 'gauge', '1 while the LLM circuit breaker is open.',
+             [({}, int(self.breaker.state == 'open'))]),
+            ('recommender_prompt_tokens_total', 'counter', 'Prompt tokens sent to the LLM.',
+             [({'source': 'estimate'}, self.prompt_stats["prompt_tokens_total"]),
+              ({'source': 'api'}, self.prompt_stats["api_prompt_tokens_total"])]),
+            ('recommender_request_events_total', 'counter', 'Request-handling events (coalescing, prefetch, streams, pool).',
+             [({'event': event}, count) for event, count in self.request_stats.items()])
+        ]
+
+    def invalidate_cache(self, catalog=None):
+        """Drop cached results; registered as a ProductService reload listener."""
+        self.cache.clear()
+        self._ranking_states.clear()
+        self._prefetched.clear()
+        if self.ranking_pool is not None:
+            self.ranking_pool.reset(catalog)
+    
+    def _ranking_state(self, session_id, catalog):
+        """The session's RankingState for this catalog snapshot, created on first use."""
+        if session_id is None:
+            return None
+        state = self._ranking_states.get(session_id)
+        if state is None or state.engine is not catalog.engine:
+            state = RankingState(catalog.engine, k=CANDIDATES_PER_POOL, in_stock_only=self.ranking.exclude_out_of_stock)
+        self._ranking_states[session_id] = state
+        self._ranking_states.move_to_end(session_id)
+        while len(self._ranking_states) > self.config.get('ranking_state_max_sessions', 256):
+            self._ranking_states.popitem(last=False)
+        return state
+    
+    def discard_ranking_state(self, session_id):
+        self._ranking_states.pop(session_id, None)
+    
+    def _cache_key(self, preferences, liked_products, catalog):
+        if catalog.version is None:
+            return None
+        min_price, max_price = self._parse_price_range(preferences.get('priceRange', 'all'))
+        return make_cache_key(
+            preferences.get('categories', []),
+            preferences.get('brands', []),
+            min_price,
+            max_price,
+            [p.id for p in liked_products],
+            # the data files' identity, not the per-process version, so a shared cache works across workers
+            catalog.source_id if catalog.source_id is not None else catalog.version
+        )
+    
+    async def generate_recommendations(self, preferences, liked_products, products_catalog, session_id=None):
+        """Generate personalized product recommendations.
+        
+        With a `session_id`, the mock ranker keeps its intermediate state for that
+        session and applies the next request's changes as a delta.
+        
+        Concurrent requests with the same cache key share one computation (and one
+        LLM call) instead of each running their own.
+        """
+        self._active_requests += 1
+        self._idle.clear()
+        started = time.perf_counter()
         try:
-            return self._generate_mock_recommendations(preferences, liked_products, products_catalog)
+            catalog = self._as_catalog(products_catalog)
+            cache_key = self._cache_key(preferences, liked_products, catalog)
+            if cache_key is None:
+                return await self._compute_recommendations(preferences, liked_products, catalog, session_id)
+            
+            result = self.cache.get(cache_key)
+            if result is not None:
+                self.scheduler_stats["served"]["cache"] += 1
+                if self._prefetched.pop(cache_key, None):
+                    self.request_stats["prefetch_hits"] += 1
+            else:
+                task = self._in_flight.get(cache_key)
+                leader = task is None
+                if not leader:
+                    self.request_stats["coalesced"] += 1
+                else:
+                    task = asyncio.ensure_future(
+                        self._compute_recommendations(preferences, liked_products, catalog, session_id)
+                    )
+                    self._in_flight[cache_key] = task
+                    task.add_done_callback(functools.partial(self._finish_in_flight, cache_key))
+                # shielded so one caller disconnecting doesn't cancel the others' result
+                result = await asyncio.shield(task)
+            
+            self._schedule_prefetch(preferences, liked_products, catalog)
+            return result
         except Exception as e:
             print(f"Error generating recommendations: {e}")
             return {"recommendations": []}
-    # generate mock recommendations to fall back on if openai api is down
-    def _generate_mock_recommendations(self, preferences, liked_products, products_catalog):
-        """Generate mock recommendations based on user preferences and liked products."""
-        try:
-            liked_product_ids = set(p.id for p in liked_products)
-            liked_categories = set(p.category for p in liked_products)
-            liked_brands = set(p.brand for p in liked_products)
-            
-            price_range = preferences.get('priceRange', 'all')
-            min_price = 0
-            max_price = float('inf')
-            if isinstance(price_range, str) and price_range != 'all':
-                if '-' in price_range:
-                    parts = price_range.split('-')
-                    min_price = float(parts[0])
-                    max_price = float(parts[1])
-                elif '+' in price_range:
-                    min_price = float(price_range.rstrip('+'))
-                else:
-                    try:
-                        exact_price = float(price_range)
-                        min_price = exact_price * 0.8
-                        max_price = exact_price * 1.2
-                    except ValueError:
-                        pass
-
-            # Get preferred categories from preferences
-            preferred_categories = set(preferences.get('categories', []))
-            preferred_brands = set(preferences.get('brands', []))
-
-            # by price range
-            available_products = []
-            for product in products_catalog:
-                if product.id in liked_product_ids:
-                    continue
+        finally:
+            self.request_latency.record(time.perf_counter() - started)
+            self._active_requests -= 1
+            if not self._active_requests:
+                self._idle.set()
+    
+    async def _compute_recommendations(self, preferences, liked_products, catalog, session_id=None):
+        """Tiers after the cache: the LLM when enabled, else (or when it fails) the mock ranker.
+        
+        The LLM is skipped while the circuit breaker is open and gets a deadline and
+        a hedged duplicate request (see _call_llm_api).
+        """
+        if self._llm_enabled():
+            self.scheduler_stats["llm_eligible"] += 1
+            recommendations = await self._generate_llm_recommendations(preferences, liked_products, catalog)
+            if recommendations:
+                self.scheduler_stats["served"]["llm"] += 1
+                return {"recommendations": recommendations}
+        self.scheduler_stats["served"]["mock"] += 1
+        ranking_state = self._ranking_state(session_id, catalog)
+        # session deltas are cheap and their state lives here; full rankings go to the pool
+        if ranking_state is None and self.ranking_pool is not None:
+            ranked = self.ranking_pool.run(catalog, _rank_in_pool, preferences, liked_products)
+            if ranked is not None:
+                self.request_stats["pool_ranked"] += 1
+                with span('ranking'):
+                    ranked = await ranked
+                return {"recommendations": [{**r, "product": catalog.products[r["product"]]} for r in ranked]}
+        with span('ranking'):
+            return self._generate_mock_recommendations(
+                preferences, liked_products, catalog, ranking_state=ranking_state
+            )
+    
+    def _finish_in_flight(self, cache_key, task):
+        """Cache a shared computation's result when it completes, even if every caller went away."""
+        if not task.cancelled() and task.exception() is None and task.result()["recommendations"]:
+            self.cache.set(cache_key, task.result())
+        # cached first, so a request arriving now finds either the entry or the task
+        if self._in_flight.get(cache_key) is task:
+            del self._in_flight[cache_key]
+    
+    def _schedule_prefetch(self, preferences, liked_products, catalog):
+        """Start precomputing this request's likely next states, replacing any older prefetch."""
+        if not self.config.get('speculative_prefetch') or self.cache.max_entries <= 0:
+            return
+        # speculative LLM calls would cost real tokens; only the mock ranker is prefetched
+        if self._llm_enabled():
+            return
+        if self._prefetch_task is not None:
+            self._prefetch_task.cancel()
+        self._prefetch_task = asyncio.ensure_future(self._prefetch(preferences, liked_products, catalog))
+    
+    def _next_states(self, preferences, catalog):
+        """Preferences one category toggle away from the given ones."""
+        selected = preferences.get('categories', [])
+        for category in catalog.categories():
+            if category in selected:
+                categories = [c for c in selected if c != category]
+            else:
+                categories = selected + [category]
+            yield {**preferences, 'categories': categories}
+    
+    async def _prefetch(self, preferences, liked_products, catalog):
+        for next_preferences in self._next_states(preferences, catalog):
+            await asyncio.sleep(0)
+            # only run while no request is being served
+            while not self._idle.is_set():
+                await self._idle.wait()
+            cache_key = self._cache_key(next_preferences, liked_products, catalog)
+            if cache_key is None or cache_key in self.cache or cache_key in self._in_flight:
+                continue
+            # counted as background work, so prefetches don't skew the request-path ranking histogram
+            with background(), span('ranking'):
+                result = self._generate_mock_recommendations(next_preferences, liked_products, catalog)
+            if result["recommendations"]:
+                self.cache.set(cache_key, result)
+                self._prefetched[cache_key] = True
+                self.request_stats["prefetched"] += 1
+                while len(self._prefetched) > self.cache.max_entries:
+                    self._prefetched.popitem(last=False)
+    
+    async def generate_recommendations_batch(self, requests, products_catalog, yield_every=100, errors=None):
+        """Recommendations for many users at once, yielded as (user_id, result) pairs.
+        
+        `requests` is an iterable or async iterable of (user_id, preferences,
+        liked_products), consumed `batch_window` users at a time so a large batch
+        is never held in memory. Within a window users are grouped by identical
+        preference filters, and each group is ranked through one
+        GroupRankingState: its price-filtered candidates are computed once, and
+        its pool tables and pool heads once per distinct liked categories and
+        brands, so a user's own ranking only applies their liked ids and
+        content-similar boosts. Batch runs
+        always use the mock engine; LLM mode is reserved for interactive requests.
+        Results come back group by group within each window, not in input order.
+        
+        A user whose request fails (e.g. an unparseable priceRange) is skipped
+        and reported in `errors` as {"user_id", "detail"}; the rest of the batch
+        carries on.
+        """
+        catalog = self._as_catalog(products_catalog)
+        errors = [] if errors is None else errors
+        served = 0
+        async for window in self._batch_windows(requests, max(1, self.config.get('batch_window', 1000))):
+            groups = {}
+            for user_id, preferences, liked_products in window:
+                price_range = preferences.get('priceRange', 'all')
                 try:
-                    price = float(product.price)
-                    if price >= min_price and (max_price == float('inf') or price <= max_price):
-                        available_products.append(product)
-                except (ValueError, AttributeError):
+                    price_bounds = self._parse_price_range(price_range)
+                except ValueError:
+                    print(f"Batch request for {user_id} has an invalid priceRange: {price_range!r}")
+                    errors.append({"user_id": user_id, "detail": f"Invalid priceRange: {price_range!r}"})
                     continue
+                group_key = (
+                    tuple(sorted(preferences.get('categories', []))),
+                    tuple(sorted(preferences.get('brands', []))),
+                    price_bounds
+                )
+                groups.setdefault(group_key, []).append((user_id, preferences, liked_products))
             
-            if not available_products:
-                return {"recommendations": []}
-
-            # different types of recommendations
-            preferred_category_products = []
-            same_category_products = []
-            same_brand_products = []
-            complementary_products = []
-            other_products = []
-            
-            complementary_map = {
-                'Electronics': ['Accessories', 'Home'],
-                'Home': ['Electronics', 'Accessories'],
-                'Sports': ['Health', 'Footwear'],
-                'Health': ['Sports', 'Electronics'],
-                'Beauty': ['Health', 'Accessories'],
-                'Footwear': ['Sports', 'Clothing'],
-                'Clothing': ['Accessories', 'Footwear'],
-                'Accessories': ['Electronics', 'Clothing']
-            }
-            
-            complementary_categories = set()
-            for category in liked_categories.union(preferred_categories):
-                if category in complementary_map:
-                    complementary_categories.update(complementary_map[category])
-            
-            for product in available_products:
-                if preferred_categories and product.category in preferred_categories:
-                    preferred_category_products.append(product)
-                elif product.category in liked_categories:
-                    same_category_products.append(product)
-                elif product.brand in liked_brands.union(preferred_brands):
-                    same_brand_products.append(product)
-                elif product.category in complementary_categories:
-                    complementary_products.append(product)
-                else:
-                    other_products.append(product)
-            
-            recommendations = []
-            
-            preferred_limit = 2
-            if preferred_categories and preferred_category_products:
-                for product in preferred_category_products[:preferred_limit]:
-                    liked_ref = next((p for p in liked_products if p.category == product.category), None)
-                    if liked_ref:
-                        explanation = f"Since you liked {liked_ref.name}, you'll love {product.name} for its {product.description.split(',')[0].lower()}"
-                    else:
-                        category = next(iter(preferred_categories))
-                        explanation = f"Based on your interest in {category}, you'll love {product.name} for its {product.description.split(',')[0].lower()}"
-                    
-                    recommendations.append({
-                        "product": product,
-                        "explanation": explanation
-                    })
-            
-            if len(recommendations) < 3 and same_category_products:
-                product = same_category_products[0]
-                liked_ref = next((p for p in liked_products if p.category == product.category), None)
-                if liked_ref:
-                    recommendations.append({
-                        "product": product,
-                        "explanation": f"Since you liked {liked_ref.name}, you'll love {product.name} for its {product.description.split(',')[0].lower()}"
-                    })
-            
-            if len(recommendations) < 3 and same_brand_products:
-                product = same_brand_products[0]
-                liked_ref = next((p for p in liked_products if p.brand == product.brand), None)
-                if liked_ref:
-                    recommendations.append({
-                        "product": product,
-                        "explanation": f"Since you liked {liked_ref.name}, you'll love {product.name} for its premium {product.brand} quality"
-                    })
-            
-            # Add complementary products
-            while len(recommendations) < 3 and complementary_products:
-                product = complementary_products.pop(0)
-                # Find a liked product that this complements
-                for liked in liked_products:
-                    if liked.category in complementary_map and product.category in complementary_map[liked.category]:
-                        recommendations.append({
-                            "product": product,
-                            "explanation": f"Since you liked {liked.name}, you'll love {product.name} to complement it with {product.description.split(',')[0].lower()}"
-                        })
-                        break
-                else:
-                    if liked_products:
-                        liked_ref = liked_products[0]
-                        recommendations.append({
-                            "product": product,
-                            "explanation": f"Since you liked {liked_ref.name}, you'll love {product.name} to complement it with {product.description.split(',')[0].lower()}"
-                        })
-            
-            remaining_pools = [preferred_category_products, same_category_products, same_brand_products, complementary_products, other_products]
-            for pool in remaining_pools:
-                for product in pool:
-                    if len(recommendations) >= 3:
-                        break
-                    if any(r["product"].id == product.id for r in recommendations):
+            for (_, _, (min_price, max_price)), members in groups.items():
+                state = GroupRankingState(catalog.engine, min_price, max_price, k=CANDIDATES_PER_POOL,
+                                          in_stock_only=self.ranking.exclude_out_of_stock)
+                for user_id, preferences, liked_products in members:
+                    try:
+                        cache_key = self._cache_key(preferences, liked_products, catalog)
+                        result = self.cache.get(cache_key) if cache_key is not None else None
+                        if result is None:
+                            with background(), span('ranking'):
+                                result = self._generate_mock_recommendations(
+                                    preferences, liked_products, catalog, ranking_state=state
+                                )
+                            if cache_key is not None and result["recommendations"]:
+                                self.cache.set(cache_key, result)
+                    except Exception as e:
+                        print(f"Error generating batch recommendations for {user_id}: {e}")
+                        errors.append({"user_id": user_id, "detail": str(e)})
                         continue
+                    yield user_id, result
                     
-                    if liked_products:
-                        liked_ref = next(
-                            (p for p in liked_products if p.category == product.category),
-                            next((p for p in liked_products if p.brand == product.brand), liked_products[0])
-                        )
-                        recommendations.append({
-                            "product": product,
-                            "explanation": f"Based on your interest in {liked_ref.category}, you'll love {product.name} for its {product.description.split(',')[0].lower()}"
-                        })
-                    else:
-                        category = product.category
-                        recommendations.append({
-                            "product": product,
-                            "explanation": f"Based on your interests, you'll love {product.name} for its {product.description.split(',')[0].lower()}"
-                        })
-                
-                if len(recommendations) >= 3:
+                    served += 1
+                    if served % yield_every == 0:
+                        # ranking is CPU-bound; let other requests run between chunks
+                        await asyncio.sleep(0)
+    
+    @staticmethod
+    async def _batch_windows(requests, size):
+        """Lists of up to `size` consecutive items from an iterable or async iterable."""
+        window = []
+        if hasattr(requests, '__aiter__'):
+            async for item in requests:
+                window.append(item)
+                if len(window) >= size:
+                    yield window
+                    window = []
+        else:
+            for item in requests:
+                window.append(item)
+                if len(window) >= size:
+                    yield window
+                    window = []
+        if window:
+            yield window
+    
+    async def stream_recommendations(self, preferences, liked_products, products_catalog):
+        """Yield recommendations one at a time, as soon as each is known.
+        
+        Items are {"product", "explanation", "source"}. In LLM mode each object is
+        taken from the model's token stream as soon as it closes and validated
+        against the catalog; if the stream stalls, fails or comes up short, the
+        mock ranker fills the remaining slots. Cached results are replayed as is.
+        """
+        catalog = self._as_catalog(products_catalog)
+        self.request_stats["streams"] += 1
+        cache_key = self._cache_key(preferences, liked_products, catalog)
+        cached = self.cache.get(cache_key) if cache_key is not None else None
+        if cached is not None:
+            self.scheduler_stats["served"]["cache"] += 1
+            for recommendation in cached["recommendations"]:
+                yield {**recommendation, "source": "cache"}
+            return
+        
+        recommendations = []
+        if self._llm_enabled():
+            self.scheduler_stats["llm_eligible"] += 1
+            llm_recommendations = self._stream_llm_recommendations(preferences, liked_products, catalog)
+            try:
+                async for recommendation in llm_recommendations:
+                    recommendations.append(recommendation)
+                    yield {**recommendation, "source": "llm"}
+            finally:
+                await llm_recommendations.aclose()
+        # same tiers as the non-streaming path: the LLM when it got any pick through, else the mock
+        self.scheduler_stats["served"]["llm" if recommendations else "mock"] += 1
+        
+        if len(recommendations) < self.ranking.k:
+            self.request_stats["stream_mock_fills"] += 1
+            with span('ranking'):
+                mock = self._generate_mock_recommendations(preferences, liked_products, catalog)
+            # the streamed picks stay; the stage fits the mock ones around them
+            picks = self.ranking.select(
+                [(NEIGHBOR_AFFINITY - RANK_DECAY * rank, r["product"], r) for rank, r in enumerate(mock["recommendations"])],
+                selected=[r["product"] for r in recommendations]
+            )
+            for _, _, recommendation in picks:
+                recommendations.append(recommendation)
+                yield {**recommendation, "source": "mock"}
+        
+        if cache_key is not None and recommendations:
+            self.cache.set(cache_key, {"recommendations": recommendations})
+    
+    async def _stream_llm_recommendations(self, preferences, liked_products, catalog):
+        """Validated recommendations parsed from the LLM token stream, up to three."""
+        # checked first, so an open breaker costs no candidate selection or prompt building
+        if not self.breaker.allow():
+            self._record_llm_failure('breaker_open', trip_breaker=False)
+            return
+        candidates = self._select_candidates(preferences, liked_products, catalog)
+        if not candidates:
+            self.breaker.release()
+            return
+        
+        prompt = self._create_recommendation_prompt(preferences, liked_products, catalog, candidates)
+        parser = JSONArrayStream()
+        emitted = []
+        liked_ids = {str(p.id) for p in liked_products}
+        price_range = self._parse_price_range(preferences.get('priceRange', 'all'))
+        chunks = self._stream_llm_api(prompt)
+        try:
+            async for text in chunks:
+                for item in parser.feed(text):
+                    recommendation = self._validate_recommendation(item, catalog, liked_ids, *price_range)
+                    # picks go out as they arrive, so each must already fit the ranking constraints
+                    if recommendation is None or not self.ranking.accepts(recommendation["product"], emitted):
+                        continue
+                    if not emitted:
+                        # a stream that yields anything usable counts as a working LLM
+                        self.breaker.record_success()
+                    emitted.append(recommendation["product"])
+                    yield recommendation
+                    if len(emitted) >= self.ranking.k:
+                        return
+                if parser.done:
                     break
-            
-            return {"recommendations": recommendations[:3]}
-            
+            if not emitted:
+                self.breaker.record_failure()
+        finally:
+            await chunks.aclose()
+    
+    async def _generate_llm_recommendations(self, preferences, liked_products, catalog):
+        """Ask the LLM for recommendations; an empty list means the caller should fall back."""
+        # checked first, so an open breaker costs no candidate selection or prompt building
+        if not self.breaker.allow():
+            self._record_llm_failure('breaker_open', trip_breaker=False)
+            return []
+        candidates = self._select_candidates(preferences, liked_products, catalog)
+        if not candidates:
+            self.breaker.release()
+            return []
+        
+        prompt = self._create_recommendation_prompt(preferences, liked_products, catalog, candidates)
+        response_text = await self._call_llm_api(prompt)
+        if response_text is None:
+            return []  # timeout/error already recorded
+        recommendations = self._parse_recommendation_response(
+            response_text, catalog, preferences, liked_products, fallback=candidates
+        )
+        if recommendations:
+            self.breaker.record_success()
+        else:
+            self._record_llm_failure('unusable_response')
+        return recommendations
+    # generate mock recommendations to fall back on if openai api is down
+    def _generate_mock_recommendations(self, preferences, liked_products, products_catalog, ranking_state=None):
+        """Generate mock recommendations based on user preferences and liked products.
+        
+        Candidates come from merging the liked products' precomputed neighbor lists
+        ("because you liked X") and from the best products of each scoring pool, and
+        the RankingStage picks among them. The pools are only ranked when the
+        neighbor candidates alone can't fill every slot within the stage's
+        constraints. Arguments are those of the pool ranking.
+        """
+        catalog = self._as_catalog(products_catalog)
+        min_price, max_price = self._parse_price_range(preferences.get('priceRange', 'all'))
+        explainer = Explainer(catalog, liked_products, COMPLEMENTARY_CATEGORIES)
+        candidates = []
+        if liked_products and catalog.neighbors is not None:
+            try:
+                candidates = self._neighbor_candidates(preferences, liked_products, catalog, explainer)
+            except Exception as e:
+                print(f"Error merging neighbor lists: {e}")
+            picks = self.ranking.select(candidates, min_price, max_price, relax=False)
+            if len(picks) >= self.ranking.k:
+                return self._explained(picks)
+        
+        try:
+            candidates += self._pool_candidates(
+                preferences, liked_products, catalog, explainer, ranking_state=ranking_state
+            )
         except Exception as e:
             print(f"Error generating mock recommendations: {e}")
-            return {"recommendations": []}
+        return self._explained(self.ranking.select(candidates, min_price, max_price))
+    
+    @staticmethod
+    def _explained(picks):
+        """Recommendations from RankingStage picks whose payload builds the explanation."""
+        return {"recommendations": [{"product": product, "explanation": explain()} for _, product, explain in picks]}
+    
+    def _neighbor_candidates(self, preferences, liked_products, catalog, explainer):
+        """Ranking candidates merged from the liked products' precomputed neighbor lists.
+        
+        Kinds take turns (same category, same brand, complementary, content); within
+        a kind the liked products' lists are merged by rank, products matching the
+        preferred categories/brands first. Each explanation names the liked product
+        whose list the candidate came from.
+        """
+        min_price, max_price = self._parse_price_range(preferences.get('priceRange', 'all'))
+        preferred_categories = set(preferences.get('categories', []))
+        preferred_brands = set(preferences.get('brands', []))
+        has_preferences = bool(preferred_categories or preferred_brands)
+        liked_ids = {p.id for p in liked_products}
+        
+        def ranked(kind):
+            entries = []
+            for liked_index, liked in enumerate(liked_products):
+                position = catalog.positions_by_id.get(str(liked.id))
+                if position is None:
+                    continue
+                for rank, neighbor in enumerate(catalog.neighbors.neighbors(position, kind)):
+                    product = catalog[neighbor]
+                    preferred = product.category in preferred_categories or product.brand in preferred_brands
+                    entries.append(((has_preferences and not preferred), rank, liked_index, neighbor, liked))
+            entries.sort(key=lambda entry: entry[:4])
+            return entries
+        
+        ranked_by_kind = {kind: ranked(kind) for kind in (SAME_CATEGORY, SAME_BRAND, COMPLEMENTARY, CONTENT)}
+        candidates = []
+        picked_ids = set()
+        # with preferences, a first pass over every kind takes only preferred products
+        for preferred_only in ((True, False) if has_preferences else (False,)):
+            streams = {kind: iter(entries) for kind, entries in ranked_by_kind.items()}
+            while streams and len(candidates) < CANDIDATES_PER_POOL:
+                for kind, stream in list(streams.items()):
+                    for not_preferred, _, _, neighbor, liked in stream:
+                        if preferred_only and not_preferred:
+                            # entries are sorted preferred first, so this kind has no more
+                            del streams[kind]
+                            break
+                        product = catalog[neighbor]
+                        if (product.id in liked_ids or product.id in picked_ids or not self._in_price_range(product, min_price, max_price)
+                                or not self.ranking.available(product)):
+                            continue
+                        picked_ids.add(product.id)
+                        candidates.append((NEIGHBOR_AFFINITY - RANK_DECAY * len(candidates), product,
+                                           functools.partial(explainer.neighbor, kind, product, liked)))
+                        break
+                    else:
+                        del streams[kind]
+                    if len(candidates) >= CANDIDATES_PER_POOL:
+                        break
+        return candidates
+    
+    def _pool_candidates(self, preferences, liked_products, products_catalog, explainer, ranking_state=None):
+        """Ranking candidates from the best products of each pool (preferred, same category, ...).
+        
+        `ranking_state` is a session's RankingState (or a batch group's
+        GroupRankingState), updated in place instead of ranking the catalog from
+        scratch.
+        """
+        liked_product_ids = set(p.id for p in liked_products)
+        liked_categories = set(p.category for p in liked_products)
+        liked_brands = set(p.brand for p in liked_products)
+        
+        min_price, max_price = self._parse_price_range(preferences.get('priceRange', 'all'))
+
+        # Get preferred categories from preferences
+        preferred_categories = set(preferences.get('categories', []))
+        preferred_brands = set(preferences.get('brands', []))
+
+        complementary_categories = set()
+        for category in liked_categories.union(preferred_categories):
+            if category in COMPLEMENTARY_CATEGORIES:
+                complementary_categories.update(COMPLEMENTARY_CATEGORIES[category])
+        
+        # price/stock filter, pool assignment and scoring run vectorized over the catalog columns;
+        # we only get back the best few products of each pool, content-similar ones first
+        catalog = self._as_catalog(products_catalog)
+        similar_key = frozenset(liked_product_ids)
+        if ranking_state is not None and ranking_state.similar_key == similar_key:
+            similar_positions = ranking_state.similar_positions
+        else:
+            similar_positions = []
+            if liked_products:
+                similar_positions = self._similar_positions(catalog, catalog.positions_of(liked_product_ids))
+            if ranking_state is not None:
+                ranking_state.similar_key, ranking_state.similar_positions = similar_key, similar_positions
+        
+        pool_args = (
+            preferred_categories,
+            liked_categories,
+            liked_brands.union(preferred_brands),
+            complementary_categories
+        )
+        with span('pool_bucketing'):
+            if ranking_state is not None:
+                ranking_state.update(*pool_args, min_price=min_price, max_price=max_price, exclude_ids=liked_product_ids)
+                available_count, pools = ranking_state.rank(boosted_positions=similar_positions)
+            else:
+                available_count, pools = catalog.engine.rank(
+                    *pool_args,
+                    min_price=min_price,
+                    max_price=max_price,
+                    exclude_ids=liked_product_ids,
+                    k=CANDIDATES_PER_POOL,
+                    boosted_positions=similar_positions,
+                    in_stock_only=self.ranking.exclude_out_of_stock
+                )
+        
+        if not available_count:
+            return []
+        
+        candidates = []
+        explain_pools = (explainer.preferred, explainer.same_category, explainer.same_brand,
+                         explainer.complementary, explainer.other)
+        for affinity, products, explain in zip(POOL_AFFINITY, pools, explain_pools):
+            if explain == explainer.complementary and not liked_products:
+                # without a liked product to anchor them, complementary picks are dropped
+                continue
+            for rank, product in enumerate(products):
+                candidates.append((affinity - RANK_DECAY * rank, product, functools.partial(explain, product)))
+        return candidates
+    
+    @staticmethod
+    def _similar_positions(catalog, liked_positions):
+        """Up to SIMILAR_CANDIDATES content-similar catalog positions, best first, for boosting within pools.
+        
+        With neighbor tables these are the liked products' precomputed content
+        lists merged by rank, so nothing walks the catalog's postings; otherwise
+        the top matches for the liked set's centroid (memoized by the catalog).
+        """
+        if catalog.neighbors is None:
+            return [position for position, _ in catalog.top_similar(liked_positions, SIMILAR_CANDIDATES)]
+        liked = set(liked_positions)
+        lists = [catalog.neighbors.neighbors(position, CONTENT) for position in liked_positions]
+        merged = dict.fromkeys(
+            position for ranked in itertools.zip_longest(*lists) for position in ranked
+            if position is not None and position not in liked
+        )
+        return list(merged)[:SIMILAR_CANDIDATES]
+    
+    @staticmethod
+    def _in_price_range(product, min_price, max_price):
+        try:
+            return min_price <= float(product.price) <= max_price
+        except (TypeError, ValueError):
+            return False
+    
+    @staticmethod
+    def _parse_price_range(price_range):
+        """Turn a priceRange preference ("0-50", "100+", "75", "all") into inclusive bounds."""
+        min_price = 0
+        max_price = float('inf')
+        if isinstance(price_range, str) and price_range != 'all':
+            if '-' in price_range:
+                parts = price_range.split('-')
+                min_price = float(parts[0])
+                max_price = float(parts[1])
+            elif '+' in price_range:
+                min_price = float(price_range.rstrip('+'))
+            else:
+                try:
+                    exact_price = float(price_range)
+                    min_price = exact_price * 0.8
+                    max_price = exact_price * 1.2
+                except ValueError:
+                    pass
+        return min_price, max_price
+    
+    @staticmethod
+    def _as_catalog(products_catalog):
+        """Use the indexed catalog when given one, otherwise index the plain list once."""
+        if isinstance(products_catalog, Catalog):
+            return products_catalog
+        return Catalog(products_catalog)
     
     def _filter_products_by_preferences(self, products, preferences):
         """Filter products based on user preferences."""
-        filtered_products = []
+        min_price, max_price = self._parse_price_range(preferences.get('priceRange', 'all'))
+        return self._as_catalog(products).query(
+            categories=preferences.get('categories'),
+            brands=preferences.get('brands'),
+            min_price=min_price,
+            max_price=max_price
+        )
+    
+    @timed('candidate_filtering')
+    def _select_candidates(self, preferences, liked_products, catalog):
+        """Pre-filter and score the catalog so the prompt only carries plausible picks.
         
-        for product in products:
-            # category filter
-            if preferences['categories'] and product.category not in preferences['categories']:
-                continue
-                
-            # brand filter
-            if preferences['brands'] and product.brand not in preferences['brands']:
-                continue
-                
-            # price range filter
-            if preferences['priceRange'] != 'all':
-                min_price, max_price = map(float, preferences['priceRange'].split('-'))
-                if not (min_price <= product.price <= (max_price if max_price else float('inf'))):
-                    continue
-            
-            filtered_products.append(product)
-            
-        return filtered_products
+        In-stock products matching the preference filters are ranked by the
+        RankingStage score: affinity with the liked set (category, then brand, then
+        complementary category, plus content similarity) weighed with rating, stock
+        and price fit. If the filters leave nothing, the whole catalog is ranked.
+        Scores are computed over the scoring engine's columns. Returns the catalog
+        positions that could fit the prompt's token budget, best first; no
+        Product is built here.
+        """
+        catalog = self._as_catalog(catalog)
+        engine = catalog.engine
+        liked_product_ids = set(p.id for p in liked_products)
+        liked_categories = set(p.category for p in liked_products)
+        liked_brands = set(p.brand for p in liked_products)
+        complementary_categories = set()
+        for category in liked_categories.union(preferences.get('categories', [])):
+            complementary_categories.update(COMPLEMENTARY_CATEGORIES.get(category, []))
+        min_price, max_price = self._parse_price_range(preferences.get('priceRange', 'all'))
+        
+        excluded_rows = [engine.rows_by_id[i] for i in liked_product_ids if i in engine.rows_by_id]
+        excluded_rows = np.concatenate(excluded_rows) if excluded_rows else np.empty(0, dtype=np.intp)
+        
+        def eligible(positions):
+            rows = engine.rows[positions]
+            keep = ~np.isin(rows, excluded_rows)
+            if self.ranking.exclude_out_of_stock:
+                keep &= engine.in_stock[rows]
+            return positions[keep]
+        
+        positions = eligible(np.asarray(catalog.query_positions(
+            categories=preferences.get('categories'),
+            brands=preferences.get('brands'),
+            min_price=min_price,
+            max_price=max_price
+        ), dtype=np.intp))
+        if not len(positions):
+            positions = eligible(np.arange(len(catalog), dtype=np.intp))
+        
+        def codes(values, table):
+            return [table[value] for value in values if value in table]
+        
+        rows = engine.rows[positions]
+        affinity = (
+            2.0 * np.isin(engine.categories[rows], codes(liked_categories, engine.category_codes))
+            + 1.0 * np.isin(engine.brands[rows], codes(liked_brands, engine.brand_codes))
+            + 0.5 * np.isin(engine.categories[rows], codes(complementary_categories, engine.category_codes))
+        )
+        liked_positions = catalog.positions_of(liked_product_ids)
+        if liked_positions:
+            affinity += 2.0 * catalog.similarity(liked_positions, rows=positions)
+        scores = self.ranking.scores(
+            affinity / MAX_CANDIDATE_AFFINITY, engine.ratings[rows], engine.inventories[rows], engine.prices[rows],
+            min_price, max_price
+        )
+        # every prompt line costs at least two tokens, so no more than this can reach the prompt
+        limit = max(1, self.config.get('prompt_token_budget', 2000) // 2)
+        return positions[np.argsort(-scores, kind='stable')[:limit]].tolist()
+    
+    @staticmethod
+    def _estimate_tokens(text):
+        return -(-len(text) // CHARS_PER_TOKEN)
+    
+    @staticmethod
+    def _candidate_field(value):
+        # line breaks (any kind str.split() knows) and pipes would break the one-line, pipe-delimited format
+        return ' '.join(str(value).split()).replace('|', '/')
     
-    def _create_recommendation_prompt(self, preferences, liked_products, catalog):
-        """Create a prompt for the LLM to generate recommendations."""
+    @classmethod
+    def _encode_candidate(cls, product):
+        """One compact line per product: id|name|category|brand|price|summary."""
+        summary = (product.description or '').split(',')[0].strip().rstrip('.')
+        field = cls._candidate_field
+        return (f"{field(product.id)}|{field(product.name)}|{field(product.category)}|{field(product.brand)}|"
+                f"${field(product.price)}|{field(summary)}")
+    
+    def _encode_candidates(self, catalog, candidates):
+        """Encode ranked candidate positions until the configured catalog token budget is spent.
+        
+        Products are read from the catalog one line at a time, so candidates past
+        the budget are never materialized.
+        """
+        budget = self.config.get('prompt_token_budget', 2000)
+        lines = []
+        used = 0
+        for position in candidates:
+            line = self._encode_candidate(catalog.products[position])
+            cost = self._estimate_tokens(line) + 1  # newline
+            if lines and used + cost > budget:
+                break
+            lines.append(line)
+            used += cost
+        return lines
+    
+    @timed('prompt_build')
+    def _create_recommendation_prompt(self, preferences, liked_products, catalog, candidates):
+        """Create a prompt for the LLM to generate recommendations.
+        
+        `candidates` are catalog positions ranked best-first (see _select_candidates);
+        only as many products as fit the token budget are included.
+        """
         # liked products info
         liked_items = []
         for p in liked_products:
@@ -245,16 +907,8 @@ class LLMService:
         categories = ", ".join(preferences.get('categories', [])) or "all categories"
         brands = ", ".join(preferences.get('brands', [])) or "all brands"
         
-        catalog_items = []
-        for p in catalog:
-            catalog_items.append({
-                "id": p.id,
-                "name": p.name,
-                "category": p.category,
-                "brand": p.brand,
-                "price": p.price,
-                "description": p.description
-            })
+        catalog_lines = self._encode_candidates(catalog, candidates)
+        catalog_str = "\n".join(catalog_lines)
         
         # Create the prompt
         prompt = f"""You are an expert AI shopping assistant who personalizes product recommendations.
@@ -268,8 +922,8 @@ USER DATA:
    - Categories: {categories}
    - Brands: {brands}
 
-AVAILABLE PRODUCTS TO RECOMMEND:
-{json.dumps(catalog_items, indent=2)}
+AVAILABLE PRODUCTS TO RECOMMEND (one per line: id|name|category|brand|price|summary):
+{catalog_str}
 
 TASK:
 Based on the user's liked products and categorical, brand and price range preferences, recommend 3 products from the available catalog that this user would enjoy most.
@@ -303,47 +957,183 @@ Example response format:
 
 Return ONLY the JSON array, no other text."""
 
+        prompt_tokens = self._estimate_tokens(prompt)
+        self.prompt_stats["prompts"] += 1
+        self.prompt_stats["prompt_tokens_total"] += prompt_tokens
+        self.prompt_stats["last_prompt_tokens"] = prompt_tokens
+        self.prompt_stats["last_candidates_considered"] = len(candidates)
+        self.prompt_stats["last_candidates_included"] = len(catalog_lines)
         return prompt
     
+    @timed('llm_call')
     async def _call_llm_api(self, prompt):
-        """Call OpenAI API with the given prompt."""
+        """Call OpenAI API with the given prompt, within the configured deadline.
+        
+        Timeouts and errors are recorded against the circuit breaker and return None.
+        """
         try:
             if not self.client:
                 print("OpenAI client not available, cannot make API call")
                 return None
-                
-            messages = [
-                {"role": "system", "content": """You are a product recommendation system that MUST follow these exact formats for explanations:
+            
+            # the deadline covers waiting for a slot as well as the completion itself
+            completion = await self._hedged_completion(
+                self._build_messages(prompt),
+                timeout=self.config.get('timeout', 10)
+            )
+            
+            # get the response content
+            content = completion.choices[0].message.content
+            usage = getattr(completion, 'usage', None)
+            if usage is not None and usage.prompt_tokens:
+                self.prompt_stats["api_prompt_tokens_total"] += usage.prompt_tokens
+            return content
+        except asyncio.TimeoutError:
+            print(f"OpenAI API Error: no completion within {self.config.get('timeout', 10)}s, falling back")
+            self._record_llm_failure('timeout')
+            return None
+        except Exception as e:
+            print(f"OpenAI API Error: {str(e)}")
+            self._record_llm_failure('error')
+            return None  # Let the calling function handle the fallback
+    
+    def _hedge_delay(self):
+        """Seconds to wait before duplicating a slow request: the recent p95 LLM latency.
+        
+        None (no hedging) when disabled or until there are enough samples for a p95.
+        """
+        if not self.config.get('hedge_requests', True) or len(self.llm_latency) < 20:
+            return None
+        return max(self.config.get('hedge_min_delay', 0.2), self.llm_latency.percentile(95))
+    
+    async def _hedged_completion(self, messages, timeout):
+        """First completion from the request or, if it runs past the hedge delay, a duplicate.
+        
+        Whichever attempt succeeds first wins and the other is cancelled; raises
+        asyncio.TimeoutError at the deadline, or the last error if every attempt failed.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + timeout
+        hedge_delay = self._hedge_delay()
+        self.scheduler_stats["llm_calls"] += 1
+        primary = asyncio.ensure_future(self._timed_completion(messages))
+        pending = {primary}
+        hedged = hedge_delay is None
+        error = None
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                wait = remaining if hedged else min(hedge_delay, remaining)
+                done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is not primary:
+                            self.scheduler_stats["hedge_wins"] += 1
+                        return attempt.result()
+                    error = attempt.exception()
+                if not hedged and pending and loop.time() - started >= hedge_delay:
+                    hedged = True
+                    self.scheduler_stats["hedges_sent"] += 1
+                    pending.add(asyncio.ensure_future(self._timed_completion(messages)))
+            raise error
+        finally:
+            for attempt in pending:
+                attempt.cancel()
+    
+    async def _timed_completion(self, messages):
+        started = time.perf_counter()
+        completion = await self._create_completion(messages)
+        elapsed = time.perf_counter() - started
+        self.llm_latency.record(elapsed)
+        LLM_CALL_SECONDS.observe(elapsed)
+        return completion
+    
+    @staticmethod
+    def _build_messages(prompt):
+        return [
+            {"role": "system", "content": """You are a product recommendation system that MUST follow these exact formats for explanations:
 - REQUIRED FORMAT: "Since you liked [Product Name], you'll love [new product] for [specific feature]"
 - ONLY if no similar liked products exist: "Based on your interest in [category/brand], you'll love [product] for [specific feature]"
 
 You MUST use the first format ("Since you liked...") if the user has ANY liked products.
 NO OTHER FORMATS ARE ALLOWED."""},
-                {"role": "user", "content": prompt}
-            ]
-            
-            completion = await self.client.chat.completions.create(
+            {"role": "user", "content": prompt}
+        ]
+    
+    async def _stream_llm_api(self, prompt):
+        """Yield completion text as the model produces it.
+        
+        The first chunk may take until the overall deadline; after that, a gap longer
+        than the stall timeout ends the stream. Stalls and errors end it quietly so
+        the caller can fill in whatever is missing.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.config.get('timeout', 10)
+        stall_timeout = self.config.get('stream_stall_timeout', 2)
+        chunks = self._stream_completion(self._build_messages(prompt))
+        received = False
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                timeout = min(stall_timeout, remaining) if received else remaining
+                if timeout <= 0:
+                    raise asyncio.TimeoutError
+                text = await asyncio.wait_for(chunks.__anext__(), timeout)
+                received = True
+                yield text
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            print("OpenAI API stream stalled, filling in the rest")
+            # the caller decides on the breaker, based on whether anything usable arrived
+            self._record_llm_failure('timeout', trip_breaker=False)
+        except Exception as e:
+            print(f"OpenAI API Error: {str(e)}")
+            self._record_llm_failure('error', trip_breaker=False)
+        finally:
+            await chunks.aclose()
+    
+    async def _stream_completion(self, messages):
+        async with self._llm_slots:
+            stream = await self.client.chat.completions.create(
+                model=self.config.get('model', 'gpt-3.5-turbo'),
+                messages=messages,
+                temperature=0.5,
+                max_tokens=self.config.get('max_tokens', 1000),
+                stream=True
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await stream.close()
+    
+    async def _create_completion(self, messages):
+        async with self._llm_slots:
+            return await self.client.chat.completions.create(
                 model=self.config.get('model', 'gpt-3.5-turbo'),
                 messages=messages,
                 temperature=0.5, # or .6 for more creativity 
                 max_tokens=self.config.get('max_tokens', 1000)
             )
-            
-            # get the response content
-            content = completion.choices[0].message.content
-            print(f"OpenAI API Response: {content}")  # Debug log
-            return content
-        except Exception as e:
-            print(f"OpenAI API Error: {str(e)}")
-            print(f"Prompt used: {prompt}")  # Debug log
-            return None  # Let the calling function handle the fallback
     
-    def _parse_recommendation_response(self, response_text, products_catalog):
-        """Parse the LLM response into product recommendations."""
+    @timed('response_parse')
+    def _parse_recommendation_response(self, response_text, products_catalog, preferences=None, liked_products=(),
+                                       fallback=None):
+        """Parse the LLM response into product recommendations.
+        
+        Picks the user already liked, or outside the requested price range, are
+        dropped. Slots the LLM's picks can't fill within the ranking constraints
+        are offered to `fallback`, the ranked candidate positions the prompt was
+        built from (selected here if not given).
+        """
         if not response_text:
-            print("No response from OpenAI API")  # Debug log
             return []
-            
+        
         try:
             # Clean up the response text
             json_text = response_text.strip()
@@ -352,54 +1142,71 @@ NO OTHER FORMATS ARE ALLOWED."""},
             elif "```" in json_text:
                 json_text = json_text.split("```")[1].split("```")[0].strip()
             
-            print(f"Cleaned JSON text: {json_text}")  # Debug log
             recommendations_data = json.loads(json_text)
             
-            # Map product IDs to actual Product objects and track categories
-            product_map = {str(p.id): p for p in products_catalog}
-            recommended_categories = set()
-            
-            recommendations = []
+            # Resolve product IDs through the catalog's id index; the LLM's order is the affinity
+            catalog = self._as_catalog(products_catalog)
+            preferences = preferences or {}
+            min_price, max_price = self._parse_price_range(preferences.get('priceRange', 'all'))
+            liked_ids = {str(p.id) for p in liked_products}
+            candidates = []
             for item in recommendations_data:
-                product_id = str(item.get('product_id'))
-                explanation = item.get('explanation', '')
-                
-                print(f"Processing recommendation for product {product_id}") 
-                
-                if not product_id or product_id not in product_map:
-                    print(f"Skipping product {product_id}: not in catalog")  
-                    continue
-                
-                # Get product
-                product = product_map[product_id]
-                
-                # Skip if we already have too many recommendations from this category
-                if product.category in recommended_categories and len(recommended_categories) < 2:
-                    print(f"Skipping product {product_id}: too many from category {product.category}") 
-                    continue
-                
-                recommended_categories.add(product.category)
-                recommendations.append({
-                    "product": product,
-                    "explanation": explanation
-                })
+                recommendation = self._validate_recommendation(item, catalog, liked_ids, min_price, max_price)
+                if recommendation is not None:
+                    candidates.append((LLM_AFFINITY - RANK_DECAY * len(candidates),
+                                       recommendation["product"], recommendation["explanation"]))
             
-            # If we have fewer than 3 recommendations, try to add more from different categories
-            if len(recommendations) < 3:
-                for product in products_catalog:
-                    if len(recommendations) >= 3:
-                        break
-                    
-                    if (str(product.id) not in [r["product"].id for r in recommendations] and 
-                        product.category not in recommended_categories):
-                        recommendations.append({
-                            "product": product,
-                            "explanation": f"Based on your interests, you'll love {product.name} for {product.description.split(',')[0].lower()}"
-                        })
-                        recommended_categories.add(product.category)
+            picks = self.ranking.select(candidates, min_price, max_price, relax=False)
+            # If the LLM's picks can't fill every slot within the constraints, offer the prompt's candidates too
+            if len(picks) < self.ranking.k:
+                if fallback is None:
+                    fallback = self._select_candidates(preferences, liked_products, catalog)
+                explainer = Explainer(catalog, liked_products, COMPLEMENTARY_CATEGORIES)
+                # with no product matching the filters, candidate selection ranks the whole catalog;
+                # the price check runs on the engine's columns so only the offered products are built
+                engine = catalog.engine
+                fallback = np.asarray(fallback, dtype=np.intp)
+                prices = engine.prices[engine.rows[fallback]]
+                fallback = fallback[(prices >= min_price) & (prices <= max_price)][:FALLBACK_CANDIDATES]
+                for rank, position in enumerate(fallback.tolist()):
+                    product = catalog.products[position]
+                    candidates.append((-RANK_DECAY * rank, product, explainer.other(product)))
+                picks = self.ranking.select(candidates, min_price, max_price)
             
-            return recommendations[:3]
+            return [{"product": product, "explanation": explanation} for _, product, explanation in picks]
             
         except Exception as e:
             print(f"Error parsing recommendations: {e}") 
-            return [] 
+            return []
+    
+    def _validate_recommendation(self, item, catalog, liked_ids=(), min_price=0, max_price=float('inf')):
+        """Resolve one {"product_id", "explanation"} item against the catalog; None if rejected.
+        
+        Diversity is left to the RankingStage; this drops unknown, already liked,
+        out-of-stock and out-of-price-range products.
+        """
+        product_id = str(item.get('product_id'))
+        explanation = item.get('explanation', '')
+        
+        # Get product
+        product = catalog.get(product_id)
+        if not product_id or product is None:
+            REJECTED_RECOMMENDATIONS.inc(reason='unknown_product')
+            return None
+        
+        if product_id in liked_ids:
+            REJECTED_RECOMMENDATIONS.inc(reason='liked')
+            return None
+        
+        if not self.ranking.available(product):
+            REJECTED_RECOMMENDATIONS.inc(reason='out_of_stock')
+            return None
+        
+        if not self._in_price_range(product, min_price, max_price):
+            REJECTED_RECOMMENDATIONS.inc(reason='out_of_price_range')
+            return None
+        
+        return {
+            "product": product,
+            "explanation": explanation
+        } 
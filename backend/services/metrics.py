@@ -0,0 +1,351 @@
+import collections
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from time import perf_counter
+
+# seconds; spans range from microsecond-scale lookups to multi-second LLM calls
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (stage, seconds) spans of the request being handled when a middleware is tracing it,
+# or _BACKGROUND while prefetch or batch work runs (see background())
+_trace = contextvars.ContextVar('trace', default=None)
+_BACKGROUND = object()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+
+class Counter:
+    """Monotonic counter, optionally split by label values."""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, '') for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {value}")
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram:
+    """Fixed-bucket histogram, optionally split by label values; `labels()` children are cached."""
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._children = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _HistogramChild(self.buckets)
+        return child
+
+    def observe(self, value, *label_values):
+        self.labels(*label_values).observe(value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, child in self._children.items():
+            labels = dict(zip(self.labelnames, values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), child.counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {child.sum}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {child.count}")
+        return lines
+
+
+class Registry:
+    """Metrics of this process, rendered in the Prometheus text format.
+
+    Counters that already live elsewhere (cache and scheduler stats) are read
+    through collectors at scrape time rather than duplicated on the hot path.
+    A collector returns (name, type, help, [(labels, value), ...]) tuples.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        return self._metrics.setdefault(name, Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._metrics.setdefault(name, Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"Error collecting metrics: {str(e)}")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {value}" for labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(
+    'recommender_stage_seconds', 'Time spent in each stage of request handling.', ('stage',)
+)
+BACKGROUND_STAGE_SECONDS = REGISTRY.histogram(
+    'recommender_background_stage_seconds', 'Time spent in each stage of prefetch and batch work.', ('stage',)
+)
+
+
+class _Stage:
+    """A stage's histogram children, resolved once so recording a span is a few list and float updates."""
+    __slots__ = ('name', 'request', 'background')
+
+    def __init__(self, name):
+        self.name = name
+        self.request = STAGE_SECONDS.labels(name)
+        self.background = BACKGROUND_STAGE_SECONDS.labels(name)
+
+
+_stages = {}
+
+
+def _stage(name):
+    stage = _stages.get(name)
+    if stage is None:
+        stage = _stages[name] = _Stage(name)
+    return stage
+
+
+def _observe(stage, elapsed):
+    trace = _trace.get()
+    if trace is _BACKGROUND:
+        child = stage.background
+    else:
+        child = stage.request
+        if trace is not None:
+            trace.append((stage.name, elapsed))
+    child.counts[bisect_left(child.bounds, elapsed)] += 1
+    child.sum += elapsed
+    child.count += 1
+
+
+class _Span:
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _observe(self.stage, perf_counter() - self.started)
+        return False
+
+
+def span(stage):
+    """Context manager timing one stage into recommender_stage_seconds (and the request's trace)."""
+    return _Span(_stages.get(stage) or _stage(stage))
+
+
+def timed(stage):
+    """Decorator form of span() for plain and async functions."""
+    def decorate(function):
+        resolved = _stage(stage)
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                started = perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    _observe(resolved, perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _observe(resolved, perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+@contextlib.contextmanager
+def background():
+    """Record the spans inside into recommender_background_stage_seconds, out of the request histograms.
+
+    Wrap synchronous work only: a context variable set across an await or a
+    yield would leak into whatever runs in between.
+    """
+    token = _trace.set(_BACKGROUND)
+    try:
+        yield
+    finally:
+        _trace.reset(token)
+
+
+class SamplingProfiler:
+    """Samples the serving thread's Python stack every `interval` seconds into a ring buffer.
+
+    `dump()` writes the samples taken during one (slow) request as folded
+    stacks ("outer;inner;leaf count" per line), the input format of
+    flamegraph.pl and speedscope. The event loop interleaves requests, so a
+    dump can include work done for other requests in the same window.
+    """
+
+    def __init__(self, out_dir, interval=0.005, max_samples=20000, min_dump_interval=1.0):
+        self.out_dir = out_dir
+        self.interval = interval
+        self.min_dump_interval = min_dump_interval
+        self._samples = collections.deque(maxlen=max_samples)
+        self._target = None
+        self._stopped = threading.Event()
+        self._last_dump = 0.0
+        self.dumps = 0
+
+    def start(self):
+        """Start sampling the calling thread (the event loop's)."""
+        self._target = threading.get_ident()
+        os.makedirs(self.out_dir, exist_ok=True)
+        threading.Thread(target=self._run, name='sampling-profiler', daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self._samples.append((time.perf_counter(), ';'.join(reversed(stack))))
+
+    def dump(self, started, finished, label):
+        """Write the samples between two perf_counter() times; returns the file path, or None."""
+        if finished - self._last_dump < self.min_dump_interval:
+            return None
+        folded = collections.Counter(stack for at, stack in list(self._samples) if started <= at <= finished)
+        if not folded:
+            return None
+        self._last_dump = finished
+        self.dumps += 1
+        path = os.path.join(self.out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{label}-"
+                                          f"{(finished - started) * 1000:.0f}ms.folded")
+        with open(path, 'w') as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in folded.most_common())
+        return path
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware: per-endpoint latency histogram and status counter, plus slow-request reports.
+
+    Latency runs until the last body chunk is sent, so streamed responses are
+    timed in full. A request slower than `slow_seconds` (0 disables) prints its
+    span breakdown as one JSON line and, with a profiler, dumps its stacks.
+    """
+
+    def __init__(self, app, registry=REGISTRY, slow_seconds=0.0, profiler=None):
+        self.app = app
+        self.slow_seconds = slow_seconds
+        self.profiler = profiler
+        self.latency = registry.histogram(
+            'recommender_http_request_duration_seconds', 'HTTP request latency by endpoint.', ('endpoint',)
+        )
+        self.requests = registry.counter(
+            'recommender_http_requests_total', 'HTTP requests by endpoint and status code.', ('endpoint', 'status')
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        trace = []
+        token = _trace.set(trace)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _trace.reset(token)
+            finished = time.perf_counter()
+            # the router stores the matched endpoint in the scope; label by it, not the raw path
+            endpoint = getattr(scope.get('endpoint'), '__name__', 'unmatched')
+            self.latency.observe(finished - started, endpoint)
+            self.requests.inc(endpoint=endpoint, status=str(status))
+            if self.slow_seconds and finished - started >= self.slow_seconds:
+                self._report_slow(endpoint, status, started, finished, trace)
+
+    def _report_slow(self, endpoint, status, started, finished, trace):
+        report = {
+            "slow_request": endpoint,
+            "status": status,
+            "ms": round((finished - started) * 1000, 1),
+            "spans": [{"stage": stage, "ms": round(seconds * 1000, 2)} for stage, seconds in trace]
+        }
+        if self.profiler is not None:
+            report["profile"] = self.profiler.dump(started, finished, endpoint)
+        print(json.dumps(report))
@@ -0,0 +1,127 @@
+import hashlib
+import json
+
+import numpy as np
+
+from services.content_index import catalog_fingerprint
+
+# neighbor lists stored per product, in this order
+SAME_CATEGORY, SAME_BRAND, COMPLEMENTARY, CONTENT = range(4)
+KINDS = ('same_category', 'same_brand', 'complementary', 'content')
+EMPTY = -1
+
+
+def neighbor_fingerprint(products):
+    """Hash of everything the tables depend on: ids, indexed text, category, brand and rating."""
+    digest = hashlib.sha1(catalog_fingerprint(products).encode('ascii'))
+    for product in products:
+        digest.update(f"{product.category}\0{product.brand}\0{product.rating}\0".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _meta_path(path):
+    return path[:-4] + '.json' if path.endswith('.npy') else path + '.json'
+
+
+def _content_neighbors(index, depth, max_df):
+    """(position, most similar positions) for every product with at least one rare term."""
+    document_frequency = np.diff(index.term_indptr)
+    max_count = max(1, int(max_df * index.size))
+    # one score buffer for all queries; only the rows a query touched are read and reset
+    scores = np.zeros(index.size, dtype=np.float32)
+    for position in range(index.size):
+        start, stop = index.indptr[position], index.indptr[position + 1]
+        terms, weights = index.indices[start:stop], index.data[start:stop]
+        keep = document_frequency[terms] <= max_count
+        touched = []
+        for term, weight in zip(terms[keep].tolist(), weights[keep].tolist()):
+            postings = slice(index.term_indptr[term], index.term_indptr[term + 1])
+            rows = index.term_rows[postings]
+            scores[rows] += index.term_data[postings] * weight
+            touched.append(rows)
+        if not touched:
+            continue
+        rows = np.unique(np.concatenate(touched))
+        candidates = rows[rows != position]
+        values = scores[candidates]
+        scores[rows] = 0.0
+        if len(candidates) > depth:
+            best = np.argpartition(-values, depth - 1)[:depth]
+            candidates, values = candidates[best], values[best]
+        # best score first, catalog order on ties
+        yield position, candidates[np.lexsort((candidates, -values))]
+
+
+class NeighborIndex:
+    """Top-N related products for every product, one list per relation kind.
+
+    `table[position, kind]` holds catalog positions, best first, padded with -1.
+    Category, brand and complementary lists are ordered by rating (catalog order
+    on ties); content lists by TF-IDF similarity over the catalog's rarer terms
+    (see `build`). The table is saved as a plain .npy (plus a small JSON
+    sidecar) so it can be memory-mapped at load instead of read into the heap.
+    """
+
+    def __init__(self, table, fingerprint=None):
+        self.table = table
+        self.fingerprint = fingerprint
+        self.size, _, self.depth = table.shape
+
+    def neighbors(self, position, kind):
+        row = self.table[position, kind]
+        return row[row != EMPTY].tolist()
+
+    @classmethod
+    def build(cls, catalog, complementary_categories, depth=20, max_df=0.05):
+        """Compute the tables for a Catalog; `complementary_categories` maps a category to its partners.
+
+        Content neighbors ignore terms found in more than `max_df` of the products:
+        they carry the least weight, yet their postings would make the all-pairs
+        pass quadratic in catalog size.
+        """
+        products = catalog.products
+        count = len(products)
+        table = np.full((count, len(KINDS), depth), EMPTY, dtype=np.int32)
+        # catalog positions in rating order, so each group's best products come first
+        by_rating = catalog.engine.order.tolist()
+
+        def top_of(groups):
+            # the best depth + 1 positions of each group: enough to still have depth after dropping the product itself
+            top = {}
+            for position in by_rating:
+                for key in groups(products[position]):
+                    members = top.setdefault(key, [])
+                    if len(members) <= depth:
+                        members.append(position)
+            return top
+
+        by_category = top_of(lambda p: (p.category,))
+        by_brand = top_of(lambda p: (p.brand,))
+        by_partners = top_of(lambda p: [
+            category for category, partners in complementary_categories.items() if p.category in partners
+        ])
+
+        def fill(position, kind, candidates):
+            row = [candidate for candidate in candidates if candidate != position][:depth]
+            table[position, kind, :len(row)] = row
+
+        for position, product in enumerate(products):
+            fill(position, SAME_CATEGORY, by_category.get(product.category, []))
+            fill(position, SAME_BRAND, by_brand.get(product.brand, []))
+            fill(position, COMPLEMENTARY, by_partners.get(product.category, []))
+        for position, similar in _content_neighbors(catalog.content_index, depth, max_df):
+            table[position, CONTENT, :len(similar)] = similar
+
+        return cls(table, fingerprint=neighbor_fingerprint(products))
+
+    def save(self, path):
+        np.save(path, self.table)
+        with open(_meta_path(path), 'w') as f:
+            json.dump({"fingerprint": self.fingerprint, "kinds": list(KINDS), "depth": self.depth}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(_meta_path(path), 'r') as f:
+            meta = json.load(f)
+        table = np.load(path, mmap_mode='r' if mmap else None)
+        return cls(table, fingerprint=meta.get('fingerprint'))
@@ -1,4 +1,8 @@
+import asyncio
+import hashlib
+import itertools
 import json
+import threading
 from config import config
 import sys
 import os
@@ -7,45 +11,322 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 backend_dir = os.path.dirname(current_dir)
 sys.path.insert(0, backend_dir)
 
-from services.llm_service import Product
+from services.catalog import Catalog, Product
+from services.catalog_db import CatalogDatabase, DatabaseProducts
+from services.catalog_file import CatalogFile, LazyProducts, source_stamp
+from services.content_index import ContentIndex, catalog_fingerprint
+from services.neighbor_index import NeighborIndex, neighbor_fingerprint
 
 class ProductService:
+    """Serves the current catalog snapshot.
+
+    Each load builds a complete, immutable Catalog (products, indexes, engine,
+    content index) tagged with a version number, then swaps it in with a single
+    reference assignment. Readers grab `get_catalog()` once per request and keep a
+    consistent view even if a reload lands mid-request.
+    """
     def __init__(self):
         self.data_path = config['DATA_PATH']
-        self.raw_products = self._load_products()
-        self.products = self._convert_to_product_objects()
+        self.catalog_file_path = config['CATALOG_FILE_PATH']
+        self.content_index_path = config['CONTENT_INDEX_PATH']
+        self.neighbors_path = config['NEIGHBORS_PATH']
+        self._versions = itertools.count(1)
+        self._reload_lock = threading.Lock()
+        self._reload_listeners = []
+        self._loaded_mtime = self._data_mtime()
+        self._catalog = self._build_catalog(strict=False)
+    
+    @property
+    def version(self):
+        return self._catalog.version
+    
+    @property
+    def products(self):
+        return self._catalog.products
+    
+    @property
+    def catalog(self):
+        return self._catalog
+    
+    def _build_catalog(self, strict=True):
+        """Parse the data file and build a full snapshot; touches no shared state."""
+        # taken before reading, so a write that lands mid-load leaves a mismatched id rather than a wrong one
+        source_id = self._source_id()
+        catalog_file = self._open_catalog_file()
+        if catalog_file is not None:
+            # columns come straight off the mapping; Products are only built when touched
+            products = LazyProducts(catalog_file, Product)
+            columns = catalog_file.columns()
+            fingerprints = catalog_file.fingerprints
+        else:
+            # the parsed JSON is only needed while converting; don't keep a second copy around
+            products = self._convert_to_product_objects(self._load_products(strict))
+            columns = None
+            fingerprints = {}
+        return Catalog(
+            products,
+            version=next(self._versions),
+            content_index=self._load_content_index(products, fingerprints.get('content')),
+            neighbors=self._load_neighbors(products, fingerprints.get('neighbors')),
+            columns=columns,
+            source_id=source_id
+        )
+    
+    def _open_catalog_file(self):
+        """The compiled catalog, if present and compiled from the current products.json."""
+        if not os.path.exists(self.catalog_file_path):
+            return None
+        try:
+            catalog_file = CatalogFile(self.catalog_file_path)
+            # deployments may ship only the compiled file
+            if not os.path.exists(self.data_path) or catalog_file.source == source_stamp(self.data_path):
+                return catalog_file
+            print("Compiled catalog is stale, loading products.json instead (run tools/compile_catalog.py)")
+        except Exception as e:
+            print(f"Error loading compiled catalog: {str(e)}")
+        return None
+    
+    def install(self, catalog):
+        """Atomically make `catalog` current and notify listeners (e.g. caches)."""
+        self._catalog = catalog
+        for listener in self._reload_listeners:
+            listener(catalog)
+        return catalog.version
+    
+    def reload(self):
+        """Re-read the catalog file and swap in the new snapshot.
+        
+        If the file can't be parsed the current snapshot stays in place and the
+        error is raised to the caller.
+        """
+        with self._reload_lock:
+            mtime = self._data_mtime()
+            catalog = self._build_catalog()
+            self._loaded_mtime = mtime
+        return self.install(catalog)
+    
+    async def reload_async(self):
+        """Like reload(), but parses and indexes in a worker thread, off the event loop.
+        
+        Listeners still run on the event loop thread, so they can safely touch
+        loop-owned state such as the recommendation cache.
+        """
+        loop = asyncio.get_running_loop()
+        
+        def build():
+            with self._reload_lock:
+                mtime = self._data_mtime()
+                return mtime, self._build_catalog()
+        
+        mtime, catalog = await loop.run_in_executor(None, build)
+        self._loaded_mtime = mtime
+        return self.install(catalog)
+    
+    def is_stale(self):
+        """True when products.json or the compiled catalog changed since the current snapshot was read."""
+        return self._data_mtime() != self._loaded_mtime
     
-    def _load_products(self):
+    async def watch(self, interval):
+        """Poll the data file's mtime and hot-reload whenever it changes."""
+        while True:
+            await asyncio.sleep(interval)
+            if not self.is_stale():
+                continue
+            try:
+                version = await self.reload_async()
+                print(f"Catalog reloaded from {self.data_path} (version {version})")
+            except Exception as e:
+                # keep serving the previous snapshot; try again on the next change
+                self._loaded_mtime = self._data_mtime()
+                print(f"Error reloading product data: {str(e)}")
+    
+    def add_reload_listener(self, listener):
+        self._reload_listeners.append(listener)
+    
+    def _data_mtime(self):
+        # recompiling the catalog file counts as a change too
+        return tuple(self._mtime(path) for path in (self.data_path, self.catalog_file_path))
+    
+    def _source_id(self):
+        """Hash of the data files' size and mtime: equal in every worker that read the same files."""
+        stamps = []
+        for path in (self.data_path, self.catalog_file_path):
+            try:
+                stamps.append(source_stamp(path))
+            except OSError:
+                stamps.append(None)
+        return hashlib.sha1(json.dumps(stamps).encode('utf-8')).hexdigest()[:16]
+    
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _load_products(self, strict=False):
         try:
             with open(self.data_path, 'r') as file:
                 return json.load(file)
         except Exception as e:
+            if strict:
+                raise
             print(f"Error loading product data: {str(e)}")
             return []
     
-    def _convert_to_product_objects(self):
-        product_objects = []
-        for p in self.raw_products:
-            product_objects.append(Product(
-                id=p.get('id'),
-                name=p.get('name'),
-                description=p.get('description', ''),
-                price=p.get('price', 0),
-                category=p.get('category', ''),
-                brand=p.get('brand', ''),
-                image=p.get('image'),
-                rating=p.get('rating')
-            ))
-        return product_objects
+    def _load_content_index(self, products, fingerprint=None):
+        """Use the prebuilt index next to the catalog if it matches; otherwise build in memory."""
+        index = self._prebuilt_content_index(products, fingerprint)
+        return index if index is not None else ContentIndex.build(products)
+    
+    def _prebuilt_content_index(self, products, fingerprint=None):
+        """The saved content index, if present and built from these products."""
+        if not os.path.exists(self.content_index_path):
+            return None
+        try:
+            index = ContentIndex.load(self.content_index_path)
+            if index.fingerprint == (fingerprint or catalog_fingerprint(products)):
+                return index
+            print("Content index is stale, not using it (run tools/build_content_index.py)")
+        except Exception as e:
+            print(f"Error loading content index: {str(e)}")
+        return None
+    
+    def _load_neighbors(self, products, fingerprint=None):
+        """Memory-map the prebuilt neighbor tables if they match; unlike the content index they are never built here."""
+        if not os.path.exists(self.neighbors_path):
+            return None
+        try:
+            neighbors = NeighborIndex.load(self.neighbors_path)
+            if neighbors.fingerprint == (fingerprint or neighbor_fingerprint(products)):
+                return neighbors
+            print("Neighbor tables are stale, ignoring them (run tools/build_neighbors.py)")
+        except Exception as e:
+            print(f"Error loading neighbor tables: {str(e)}")
+        return None
+    
+    def _convert_to_product_objects(self, raw_products):
+        return [Product.from_dict(p) for p in raw_products]
     
     def get_all_products(self):
-        return self.products
+        return self._catalog.products
+    
+    def get_catalog(self):
+        return self._catalog
     
     def get_product_by_id(self, product_id):
-        for product in self.products:
-            if product.id == product_id:
-                return product
+        return self._catalog.get(product_id)
+    
+    def get_products_by_category(self, category):
+        return self._catalog.products_in_category(category)
+    
+    def similar_to(self, product_ids, k=10):
+        return self._catalog.similar_to(product_ids, k)
+    
+    def query_products(self, categories=None, brands=None, min_price=None, max_price=None):
+        return self._catalog.query(categories, brands, min_price, max_price)
+    
+    def query_page(self, catalog, categories=None, brands=None, min_price=None, max_price=None, after=None, limit=None):
+        """(position, Product) pairs for one page of `catalog.query()` after position `after`, read from the store.
+        
+        None when the products aren't in a store that can filter and page them;
+        callers then page the snapshot's own indexes.
+        """
         return None
     
+    def search_products(self, text, limit=20):
+        """Products whose name, description or tags contain every word of `text`, in catalog order."""
+        words = text.lower().split()
+        if not words:
+            return []
+        matches = []
+        for product in self._catalog.products:
+            haystack = ' '.join([product.name or '', product.description or '', *product.tags]).lower()
+            if all(word in haystack for word in words):
+                matches.append(product)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+
+class SQLiteProductService(ProductService):
+    """Serves the catalog from the SQLite database written by tools/import_catalog_db.py.
+    
+    Snapshots hold only the columns the indexes and ranking need; Products are
+    read from the database on demand through a bounded cache, so a worker's
+    memory doesn't grow with the catalog. Category, brand and price queries run
+    against the database indexes and text search uses its FTS5 index. An import
+    bumps the database's generation, which is what `is_stale()` and the catalog
+    watcher look at. Without the database it falls back to products.json.
+    """
+    def __init__(self):
+        self.database = CatalogDatabase(config['CATALOG_DB_PATH'], Product)
+        self.cache_size = config['CATALOG_DB_CACHE']
+        super().__init__()
+    
+    def _has_database(self):
+        return os.path.exists(self.database.path)
+    
+    def _build_catalog(self, strict=True):
+        if not self._has_database():
+            print(f"Catalog database {self.database.path} not found, loading products.json instead "
+                  f"(run tools/import_catalog_db.py)")
+            return super()._build_catalog(strict)
+        meta, columns = self.database.snapshot()
+        fingerprints = json.loads(meta.get('fingerprints', '{}'))
+        products = DatabaseProducts(self.database, columns.ids, self.cache_size)
+        return Catalog(
+            products,
+            version=next(self._versions),
+            content_index=self._load_content_index(products, fingerprints.get('content')),
+            neighbors=self._load_neighbors(products, fingerprints.get('neighbors')),
+            columns=columns,
+            source_id=self._database_id(meta)
+        )
+    
+    def _load_content_index(self, products, fingerprint=None):
+        if not isinstance(products, DatabaseProducts):
+            return super()._load_content_index(products, fingerprint)
+        # building or fingerprinting the index reads every row, so a load only takes a prebuilt index
+        # matching the import; without one the catalog builds it on first use
+        if fingerprint is None:
+            return None
+        return self._prebuilt_content_index(products, fingerprint)
+    
+    def _data_mtime(self):
+        if not self._has_database():
+            return super()._data_mtime()
+        try:
+            return ('generation', self.database.generation())
+        except Exception as e:
+            print(f"Error reading catalog database: {str(e)}")
+            return None
+    
+    @staticmethod
+    def _database_id(meta):
+        """Hash of the import's generation and time: equal in every worker that read the same import."""
+        stamp = [meta.get('generation'), meta.get('imported_at')]
+        return hashlib.sha1(json.dumps(stamp).encode('utf-8')).hexdigest()[:16]
+    
+    def _using_database(self):
+        return isinstance(self._catalog.products, DatabaseProducts)
+    
     def get_products_by_category(self, category):
-        return [p for p in self.products if p.category == category]
\ No newline at end of file
+        if not self._using_database():
+            return super().get_products_by_category(category)
+        return self.database.query(categories=[category])
+    
+    def query_products(self, categories=None, brands=None, min_price=None, max_price=None):
+        if not self._using_database():
+            return super().query_products(categories, brands, min_price, max_price)
+        return self.database.query(categories, brands, min_price, max_price)
+    
+    def query_page(self, catalog, categories=None, brands=None, min_price=None, max_price=None, after=None, limit=None):
+        if not isinstance(catalog.products, DatabaseProducts):
+            return None
+        return catalog.products.query(categories, brands, min_price, max_price, after, limit)
+    
+    def search_products(self, text, limit=20):
+        if not self._using_database():
+            return super().search_products(text, limit)
+        return self.database.search(text, limit)
\ No newline at end of file
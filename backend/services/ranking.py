@@ -0,0 +1,175 @@
+import heapq
+import math
+from collections import Counter
+
+import numpy as np
+
+DEFAULT_WEIGHTS = {"affinity": 1.0, "rating": 0.3, "in_stock": 0.1, "price_fit": 0.1}
+
+
+class RankingStage:
+    """Final top-k selection shared by the mock and LLM recommenders.
+
+    Candidates are (affinity, product, payload) tuples. The path that produced
+    them sets the affinity: pool, neighbor-list or LLM order. The payload is
+    passed through untouched. A candidate's score is the weighted sum of its
+    affinity, its rating (0-5 scaled to 0-1), its stock level (1 at `low_stock`
+    units or more, or when unknown) and its price fit (1 at the middle of the
+    requested range, 0 at its edges).
+
+    The k picks are chosen greedily under these constraints:
+    - out-of-stock products are never picked (unless `exclude_out_of_stock` is off)
+    - at most `max_per_brand` picks share a brand
+    - the picks cover at least `min_categories` categories
+    Each earlier pick from a product's category also lowers that product's
+    score by `diversity` (maximal marginal relevance). Scores only go down as
+    picks are made, so candidates sit in a max-heap and are rescored lazily
+    when popped. A pick usually costs a couple of heap operations, whatever
+    the number of candidates.
+
+    Greedy picks are not always the set that satisfies the most constraints.
+    Slots the brand and category constraints leave empty are filled in score
+    order without them.
+    """
+
+    def __init__(self, weights=None, k=3, min_categories=2, max_per_brand=1, diversity=0.15,
+                 exclude_out_of_stock=True, low_stock=10):
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.k = k
+        self.min_categories = min_categories
+        self.max_per_brand = max_per_brand
+        self.diversity = diversity
+        self.exclude_out_of_stock = exclude_out_of_stock
+        self.low_stock = low_stock
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            weights=config.get('ranking_weights'),
+            min_categories=config.get('ranking_min_categories', 2),
+            max_per_brand=config.get('ranking_max_per_brand', 1),
+            diversity=config.get('ranking_diversity', 0.15),
+            exclude_out_of_stock=config.get('ranking_exclude_out_of_stock', True),
+            low_stock=config.get('ranking_low_stock', 10)
+        )
+
+    @staticmethod
+    def _inventory(product):
+        try:
+            return float(product.inventory)
+        except (TypeError, ValueError):
+            return math.nan
+
+    def available(self, product):
+        """Whether the product may be picked at all; unknown inventory counts as in stock."""
+        return not (self.exclude_out_of_stock and self._inventory(product) <= 0)
+
+    def stock_level(self, product):
+        inventory = self._inventory(product)
+        if math.isnan(inventory) or self.low_stock <= 0:
+            return 1.0
+        return min(max(inventory, 0.0) / self.low_stock, 1.0)
+
+    @staticmethod
+    def price_fit(product, min_price=0, max_price=float('inf')):
+        try:
+            price = float(product.price)
+        except (TypeError, ValueError):
+            return 0.0
+        if not min_price <= price <= max_price:
+            return 0.0
+        if max_price == float('inf') or max_price <= min_price:
+            return 1.0
+        half_width = (max_price - min_price) / 2
+        return 1.0 - abs(price - (min_price + half_width)) / half_width
+
+    def score(self, product, affinity, min_price=0, max_price=float('inf')):
+        weights = self.weights
+        return (
+            weights["affinity"] * affinity
+            + weights["rating"] * (product.rating or 0) / 5
+            + weights["in_stock"] * self.stock_level(product)
+            + weights["price_fit"] * self.price_fit(product, min_price, max_price)
+        )
+
+    def scores(self, affinity, ratings, inventories, prices, min_price=0, max_price=float('inf')):
+        """`score()` over NumPy columns (NaN inventory: unknown, NaN price: unparseable)."""
+        weights = self.weights
+        if self.low_stock > 0:
+            stock = np.where(np.isnan(inventories), 1.0, np.clip(inventories / self.low_stock, 0.0, 1.0))
+        else:
+            stock = np.ones(len(inventories))
+        with np.errstate(invalid='ignore'):
+            inside = (prices >= min_price) & (prices <= max_price)
+        if max_price == float('inf') or max_price <= min_price:
+            fit = inside.astype(np.float64)
+        else:
+            half_width = (max_price - min_price) / 2
+            fit = np.where(inside, 1.0 - np.abs(prices - (min_price + half_width)) / half_width, 0.0)
+        return (
+            weights["affinity"] * affinity
+            + weights["rating"] * ratings / 5
+            + weights["in_stock"] * stock
+            + weights["price_fit"] * fit
+        )
+
+    def _blocked(self, product, brand_counts, category_counts, open_slots):
+        if brand_counts[product.brand] >= self.max_per_brand:
+            return True
+        # the remaining slots are all needed for categories not picked yet
+        missing = self.min_categories - len(category_counts)
+        return product.category in category_counts and 0 < missing and open_slots <= missing
+
+    def accepts(self, product, selected):
+        """Whether `product` can join the already `selected` products (for picks made one at a time)."""
+        if not self.available(product) or any(p.id == product.id for p in selected):
+            return False
+        brand_counts = Counter(p.brand for p in selected)
+        category_counts = Counter(p.category for p in selected)
+        return not self._blocked(product, brand_counts, category_counts, self.k - len(selected))
+
+    def select(self, candidates, min_price=0, max_price=float('inf'), selected=(), relax=True):
+        """Pick up to k - len(selected) candidates, best first.
+
+        `selected` products were picked earlier and count towards the
+        constraints. With `relax=False` slots the constraints can't fill stay
+        empty. A product listed twice keeps its first entry.
+        """
+        slots = self.k - len(selected)
+        if slots <= 0:
+            return []
+        seen = {p.id for p in selected}
+        heap = []
+        for order, candidate in enumerate(candidates):
+            affinity, product = candidate[0], candidate[1]
+            if product.id in seen or not self.available(product):
+                continue
+            seen.add(product.id)
+            score = self.score(product, affinity, min_price, max_price)
+            heap.append((-score, order, score, candidate))
+        heapq.heapify(heap)
+
+        brand_counts = Counter(p.brand for p in selected)
+        category_counts = Counter(p.category for p in selected)
+        picks = []
+        blocked = []
+        while heap and len(picks) < slots:
+            entry = heapq.heappop(heap)
+            _, order, score, candidate = entry
+            product = candidate[1]
+            if self._blocked(product, brand_counts, category_counts, slots - len(picks)):
+                # a brand stays full and a needed category stays needed, so this is final
+                blocked.append(entry)
+                continue
+            current = score - self.diversity * category_counts[product.category]
+            if heap and current < -entry[0] and current < -heap[0][0]:
+                heapq.heappush(heap, (-current, order, score, candidate))
+                continue
+            picks.append(candidate)
+            brand_counts[product.brand] += 1
+            category_counts[product.category] += 1
+
+        if relax and len(picks) < slots:
+            rest = sorted(blocked + heap, key=lambda entry: (-entry[2], entry[1]))
+            picks.extend(entry[3] for entry in rest[:slots - len(picks)])
+        return picks
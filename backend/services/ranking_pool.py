@@ -0,0 +1,67 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# (owner, snapshot), set in each pool process by the initializer; inherited through fork, never pickled
+_worker_context = None
+
+
+def _init_worker(owner, snapshot):
+    global _worker_context
+    _worker_context = (owner, snapshot)
+
+
+def _call(function, args):
+    return function(*_worker_context, *args)
+
+
+class RankingPool:
+    """CPU-bound ranking in worker processes, off the event loop.
+
+    Workers are forked from the serving process with the owner (e.g. the
+    service doing the ranking) and a catalog snapshot already in memory, so
+    they share both copy-on-write and only the request arguments and the result
+    are pickled. A pool serves one snapshot: after `reset(snapshot)` the old
+    workers finish what they have and the next call forks new ones. Needs the
+    fork start method (Linux, macOS).
+    """
+
+    def __init__(self, processes, owner=None):
+        self.processes = processes
+        self.owner = owner
+        self._executor = None
+        self._snapshot = None
+        self.tasks = 0
+
+    @staticmethod
+    def available():
+        return 'fork' in multiprocessing.get_all_start_methods()
+
+    def reset(self, snapshot=None):
+        """Retire the current workers; the next call forks workers for `snapshot`."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = None
+        self._snapshot = snapshot
+
+    def run(self, snapshot, function, *args):
+        """Awaitable for `function(owner, snapshot, *args)` in a worker, or None if the pool serves another snapshot.
+
+        `function` must be a module-level function so it can be pickled.
+        """
+        if self._snapshot is None:
+            self._snapshot = snapshot
+        if snapshot is not self._snapshot:
+            return None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_worker,
+                initargs=(self.owner, snapshot)
+            )
+        self.tasks += 1
+        return asyncio.get_running_loop().run_in_executor(self._executor, _call, function, args)
+
+    def close(self):
+        self.reset()
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+from services.catalog import Product
+from services.sqlite_util import LocalConnection
+
+
+def make_cache_key(categories, brands, min_price, max_price, liked_ids, catalog_version):
+    """Canonical hash of everything a recommendation result depends on."""
+    payload = json.dumps([
+        sorted(categories or []),
+        sorted(brands or []),
+        # inf isn't valid JSON, and "no upper bound" needs a stable spelling anyway
+        [min_price, None if max_price == float('inf') else max_price],
+        sorted(str(i) for i in liked_ids),
+        catalog_version
+    ], separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class RecommendationCache:
+    """Bounded LRU cache with a per-entry TTL for recommendation results."""
+
+    def __init__(self, max_entries=1024, ttl_seconds=300, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if self._clock() >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def __contains__(self, key):
+        # live-entry check that doesn't count as a lookup or refresh LRU order
+        entry = self._entries.get(key)
+        return entry is not None and self._clock() < entry[0]
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.invalidations += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+
+class SQLiteRecommendationCache(RecommendationCache):
+    """Recommendation cache shared by every worker process through a local SQLite file.
+
+    Results are stored as JSON with full product dicts and come
+    back with fresh Product objects. Entries expire by wall-clock TTL and the
+    oldest-written go first once `max_entries` is exceeded; hit/miss counters
+    are per process.
+    """
+
+    def __init__(self, path, max_entries=1024, ttl_seconds=300, clock=time.time):
+        super().__init__(max_entries=max_entries, ttl_seconds=ttl_seconds, clock=clock)
+        self.path = path
+        self._connection = LocalConnection(path)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS recommendations "
+                "(cache_key TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL, written_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS recommendations_written ON recommendations (written_at)")
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT data, expires_at FROM recommendations WHERE cache_key = ?", (key,)
+        ).fetchone()
+        if row is None or self._clock() >= row[1]:
+            if row is not None:
+                self.expirations += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return _decode_result(row[0])
+
+    def __contains__(self, key):
+        row = self._connection().execute(
+            "SELECT 1 FROM recommendations WHERE cache_key = ? AND expires_at > ?", (key, self._clock())
+        ).fetchone()
+        return row is not None
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        now = self._clock()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO recommendations (cache_key, data, expires_at, written_at) VALUES (?, ?, ?, ?)",
+                (key, _encode_result(value), now + self.ttl_seconds, now)
+            )
+            evicted = conn.execute(
+                "DELETE FROM recommendations WHERE cache_key IN ("
+                "SELECT cache_key FROM recommendations ORDER BY written_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+        self.evictions += max(evicted, 0)
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM recommendations")
+        self.invalidations += 1
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM recommendations").fetchone()[0]
+
+    def stats(self):
+        return {**super().stats(), "size": len(self), "backend": "sqlite"}
+
+
+def _encode_result(result):
+    return json.dumps({
+        **result,
+        "recommendations": [{**r, "product": r["product"].to_dict()} for r in result["recommendations"]]
+    })
+
+
+def _decode_result(data):
+    result = json.loads(data)
+    result["recommendations"] = [
+        {**r, "product": Product.from_dict(r["product"])} for r in result["recommendations"]
+    ]
+    return result
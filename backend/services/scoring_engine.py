@@ -0,0 +1,417 @@
+import numpy as np
+
+from services.catalog_file import CatalogColumns
+
+# recommendation pools, in the order the mock recommender draws from them
+PREFERRED, SAME_CATEGORY, SAME_BRAND, COMPLEMENTARY, OTHER = range(5)
+POOL_COUNT = 5
+# marks products that are not candidates for this request (price, liked, out of stock)
+EXCLUDED = POOL_COUNT
+# rows evaluated per step while looking for each pool's best products
+SCAN_CHUNK = 4096
+
+
+class ScoringEngine:
+    """Columnar (NumPy) encoding of the catalog for vectorized mock ranking.
+
+    Price, category and brand are stored as flat arrays at catalog load, laid out
+    in rating order (best first, catalog order on ties). Ranking a request is then
+    a price (and stock) mask plus per-category/per-brand table lookups: the pool a product
+    lands in is its score, and rating order within a pool comes for free from
+    the layout.
+    """
+
+    def __init__(self, products, columns=None):
+        self.products = products
+        if columns is None:
+            columns = CatalogColumns.from_products(products)
+        count = len(products)
+
+        self.category_codes = {category: code for code, category in enumerate(columns.categories)}
+        self.brand_codes = {brand: code for code, brand in enumerate(columns.brands)}
+        # NaN prices fail every price comparison, so those products are never candidates
+        prices = columns.prices
+        ratings = columns.ratings
+        categories = columns.category_codes
+        brands = columns.brand_codes
+        positions_by_id = {}
+        for position, product_id in enumerate(columns.ids):
+            positions_by_id.setdefault(product_id, []).append(position)
+
+        # rows are stored best-rated first; `order` maps a row back to its catalog position
+        self.order = np.lexsort((np.arange(count), -ratings))
+        rows = np.empty(count, dtype=np.intp)
+        rows[self.order] = np.arange(count)
+        self.rows = rows
+        self.prices = prices[self.order]
+        self.ratings = ratings[self.order]
+        self.categories = categories[self.order]
+        self.brands = brands[self.order]
+        self.inventories = columns.inventories[self.order]
+        # unknown inventory (NaN) counts as in stock
+        self.in_stock = ~(self.inventories <= 0)
+        self.rows_by_id = {product_id: rows[positions] for product_id, positions in positions_by_id.items()}
+        # row groups for incremental ranking, built on first use (see RankingState)
+        self._category_rows = None
+        self._brand_rows = None
+        self._price_rows = None
+        self._sorted_prices = None
+
+    def __len__(self):
+        return len(self.products)
+
+    @staticmethod
+    def _group_rows(codes, count):
+        # rows of each code, ascending (i.e. in rating order)
+        order = np.argsort(codes, kind='stable')
+        return np.split(order, np.cumsum(np.bincount(codes, minlength=count))[:-1])
+
+    def category_rows(self, code):
+        if self._category_rows is None:
+            self._category_rows = self._group_rows(self.categories, len(self.category_codes))
+        return self._category_rows[code]
+
+    def brand_rows(self, code):
+        if self._brand_rows is None:
+            self._brand_rows = self._group_rows(self.brands, len(self.brand_codes))
+        return self._brand_rows[code]
+
+    def price_span(self, min_price, max_price):
+        """(start, stop) slice of `price_rows()` holding the rows priced within the range."""
+        if self._price_rows is None:
+            # NaN prices sort last, past any finite or infinite bound
+            self._price_rows = np.argsort(self.prices, kind='stable')
+            self._sorted_prices = self.prices[self._price_rows]
+        start = int(np.searchsorted(self._sorted_prices, min_price, side='left'))
+        stop = int(np.searchsorted(self._sorted_prices, max_price, side='right'))
+        return start, max(start, stop)
+
+    def price_rows(self, start, stop):
+        return self._price_rows[start:stop]
+
+    def candidate_mask(self, min_price=0, max_price=float('inf'), exclude_ids=(), in_stock_only=False):
+        """Rows inside the price range, minus the excluded (liked) ids and, optionally, out-of-stock rows."""
+        with np.errstate(invalid='ignore'):
+            mask = self.prices >= min_price
+            if max_price != float('inf'):
+                mask &= self.prices <= max_price
+        if in_stock_only:
+            mask &= self.in_stock
+        for product_id in exclude_ids:
+            rows = self.rows_by_id.get(product_id)
+            if rows is not None:
+                mask[rows] = False
+        return mask
+
+    def _table(self, codes, pool_by_value):
+        table = np.full(len(codes), OTHER, dtype=np.int8)
+        for value, pool in pool_by_value.items():
+            code = codes.get(value)
+            if code is not None:
+                table[code] = pool
+        return table
+
+    def pool_tables(self, preferred_categories, liked_categories, brands, complementary_categories):
+        """Per-category and per-brand pool lookup tables; a row's pool is the min of the two."""
+        category_pools = {}
+        # stronger pools last so they overwrite weaker ones
+        for pool, categories in ((COMPLEMENTARY, complementary_categories),
+                                 (SAME_CATEGORY, liked_categories),
+                                 (PREFERRED, preferred_categories)):
+            for category in categories:
+                category_pools[category] = pool
+        category_table = self._table(self.category_codes, category_pools)
+        brand_table = self._table(self.brand_codes, {brand: SAME_BRAND for brand in brands})
+        return category_table, brand_table
+
+    def top_by_pool(self, category_table, brand_table, mask, k, boosted_positions=()):
+        """First k candidate rows of each pool, i.e. its k best-rated products.
+
+        `boosted_positions` (catalog positions, best first, e.g. content-similar
+        products) go to the front of their pool ahead of the rating order.
+
+        Rows are scanned in rating order a chunk at a time and the scan stops as
+        soon as every pool that can occur has k rows, so typical requests only
+        touch the first chunk instead of the whole catalog.
+        """
+        possible = set(category_table.tolist())
+        if (brand_table == SAME_BRAND).any():
+            possible.add(SAME_BRAND)
+        found = {pool: [] for pool in sorted(possible)}
+        taken = set()
+
+        if len(boosted_positions):
+            boosted = self.rows[np.asarray(boosted_positions, dtype=np.intp)]
+            boosted = boosted[mask[boosted]]
+            pools = np.minimum(category_table[self.categories[boosted]], brand_table[self.brands[boosted]])
+            for pool, rows in found.items():
+                rows.extend(boosted[pools == pool][:k].tolist())
+                taken.update(rows)
+
+        for start in range(0, len(self.products), SCAN_CHUNK):
+            if all(len(rows) >= k for rows in found.values()):
+                break
+            stop = start + SCAN_CHUNK
+            pools = np.minimum(category_table[self.categories[start:stop]], brand_table[self.brands[start:stop]])
+            pools[~mask[start:stop]] = EXCLUDED
+            for pool, rows in found.items():
+                if len(rows) < k:
+                    # over-fetch by what was already boosted so skipping those still leaves k
+                    for row in (np.flatnonzero(pools == pool)[:k + len(taken)] + start).tolist():
+                        if len(rows) >= k:
+                            break
+                        if row not in taken:
+                            rows.append(row)
+
+        return [found.get(pool, []) for pool in range(POOL_COUNT)]
+
+    def rank(self, preferred_categories, liked_categories, brands, complementary_categories,
+             min_price=0, max_price=float('inf'), exclude_ids=(), k=3, mask=None, boosted_positions=(),
+             in_stock_only=False):
+        """Return (candidate count, top-k Products per pool) for one request.
+
+        `mask` lets callers that share a price range reuse one candidate mask.
+        """
+        if mask is None:
+            mask = self.candidate_mask(min_price, max_price, exclude_ids, in_stock_only)
+        candidate_count = int(np.count_nonzero(mask))
+        if not candidate_count:
+            return 0, [[] for _ in range(POOL_COUNT)]
+
+        category_table, brand_table = self.pool_tables(preferred_categories, liked_categories, brands, complementary_categories)
+        return candidate_count, [
+            [self.products[position] for position in self.order[rows].tolist()]
+            for rows in self.top_by_pool(category_table, brand_table, mask, k, boosted_positions)
+        ]
+
+
+class RankingState:
+    """One session's ranking intermediates, kept between requests and updated by delta.
+
+    Holds the candidate mask, every row's pool and the best rows of each pool.
+    When the liked set or filters change, only the rows of the categories,
+    brands, price band or liked ids that changed are recomputed, and only the
+    pools those rows left or entered are rescanned. `rank()` returns exactly
+    what `ScoringEngine.rank()` would for the same arguments.
+    """
+
+    def __init__(self, engine, k=3, in_stock_only=False):
+        self.engine = engine
+        self.k = k
+        self.in_stock_only = in_stock_only
+        self.min_price, self.max_price = 0, float('inf')
+        self.price_span = engine.price_span(self.min_price, self.max_price)
+        self.excluded_ids = set()
+        self.mask = engine.candidate_mask(in_stock_only=in_stock_only)
+        self.candidate_count = int(np.count_nonzero(self.mask))
+        self.category_table = np.full(len(engine.category_codes), OTHER, dtype=np.int8)
+        self.brand_table = np.full(len(engine.brand_codes), OTHER, dtype=np.int8)
+        self.pools = np.full(len(engine), OTHER, dtype=np.int8)
+        self.pools[~self.mask] = EXCLUDED
+        # first 2k rows of each pool: enough to still have k once up to k boosted rows are skipped
+        self.heads = {}
+        # boosted positions the caller computed, and the liked set they were computed for
+        self.similar_key = None
+        self.similar_positions = []
+
+    def _repool(self, rows):
+        """Recompute the pool of the given rows, marking pools they left or joined as stale."""
+        if not len(rows):
+            return
+        pools = np.minimum(self.category_table[self.engine.categories[rows]], self.brand_table[self.engine.brands[rows]])
+        pools[~self.mask[rows]] = EXCLUDED
+        changed = pools != self.pools[rows]
+        if changed.any():
+            for pool in np.union1d(self.pools[rows][changed], pools[changed]).tolist():
+                self.heads.pop(pool, None)
+            self.pools[rows[changed]] = pools[changed]
+
+    def _set_candidates(self, rows, value):
+        rows = rows[self.mask[rows] != value]
+        if len(rows):
+            self.mask[rows] = value
+            self.candidate_count += len(rows) if value else -len(rows)
+            self._repool(rows)
+
+    def _eligible(self, rows):
+        """Rows that are candidates once no longer excluded: in the price range and, if required, in stock."""
+        with np.errstate(invalid='ignore'):
+            eligible = (self.engine.prices[rows] >= self.min_price) & (self.engine.prices[rows] <= self.max_price)
+        if self.in_stock_only:
+            eligible &= self.engine.in_stock[rows]
+        return eligible
+
+    def set_price_range(self, min_price, max_price):
+        if (min_price, max_price) == (self.min_price, self.max_price):
+            return
+        (old_start, old_stop), (start, stop) = self.price_span, self.engine.price_span(min_price, max_price)
+        self.min_price, self.max_price, self.price_span = min_price, max_price, (start, stop)
+        # only the rows between the old and new bounds change
+        for left, right in ((old_start, min(old_stop, start)), (max(old_start, stop), old_stop)):
+            if left < right:
+                self._set_candidates(self.engine.price_rows(left, right), False)
+        for left, right in ((start, min(stop, old_start)), (max(start, old_stop), stop)):
+            if left < right:
+                rows = self.engine.price_rows(left, right)
+                if self.in_stock_only:
+                    rows = rows[self.engine.in_stock[rows]]
+                if self.excluded_ids:
+                    rows = rows[~np.isin(rows, self._excluded_rows(self.excluded_ids))]
+                self._set_candidates(rows, True)
+
+    def _excluded_rows(self, ids):
+        rows = [self.engine.rows_by_id[i] for i in ids if i in self.engine.rows_by_id]
+        return np.concatenate(rows) if rows else np.empty(0, dtype=np.intp)
+
+    def set_excluded(self, exclude_ids):
+        exclude_ids = set(exclude_ids)
+        added, removed = exclude_ids - self.excluded_ids, self.excluded_ids - exclude_ids
+        self.excluded_ids = exclude_ids
+        self._set_candidates(self._excluded_rows(added), False)
+        rows = self._excluded_rows(removed)
+        self._set_candidates(rows[self._eligible(rows)], True)
+
+    def set_pools(self, preferred_categories, liked_categories, brands, complementary_categories):
+        category_table, brand_table = self.engine.pool_tables(
+            preferred_categories, liked_categories, brands, complementary_categories
+        )
+        changed_categories = np.flatnonzero(category_table != self.category_table).tolist()
+        changed_brands = np.flatnonzero(brand_table != self.brand_table).tolist()
+        self.category_table, self.brand_table = category_table, brand_table
+        for code in changed_categories:
+            self._repool(self.engine.category_rows(code))
+        for code in changed_brands:
+            self._repool(self.engine.brand_rows(code))
+
+    def update(self, preferred_categories, liked_categories, brands, complementary_categories,
+               min_price=0, max_price=float('inf'), exclude_ids=()):
+        """Bring the state in line with a request; arguments are those of `ScoringEngine.rank()`."""
+        self.set_price_range(min_price, max_price)
+        self.set_excluded(exclude_ids)
+        self.set_pools(preferred_categories, liked_categories, brands, complementary_categories)
+
+    def _head(self, pool):
+        head = self.heads.get(pool)
+        if head is None:
+            limit = 2 * self.k
+            head = []
+            for start in range(0, len(self.pools), SCAN_CHUNK):
+                head.extend((np.flatnonzero(self.pools[start:start + SCAN_CHUNK] == pool)[:limit - len(head)] + start).tolist())
+                if len(head) >= limit:
+                    break
+            self.heads[pool] = head
+        return head
+
+    def rank(self, boosted_positions=()):
+        """(candidate count, top-k Products per pool) for the current state."""
+        if not self.candidate_count:
+            return 0, [[] for _ in range(POOL_COUNT)]
+
+        boosted = np.empty(0, dtype=np.intp)
+        if len(boosted_positions):
+            boosted = self.engine.rows[np.asarray(boosted_positions, dtype=np.intp)]
+        boosted_pools = self.pools[boosted]
+        top = []
+        for pool in range(POOL_COUNT):
+            rows = boosted[boosted_pools == pool][:self.k].tolist()
+            taken = set(rows)
+            rows.extend([row for row in self._head(pool) if row not in taken][:self.k - len(rows)])
+            top.append(rows)
+
+        return self.candidate_count, [
+            [self.engine.products[position] for position in self.engine.order[rows].tolist()]
+            for rows in top
+        ]
+
+
+class GroupRankingState:
+    """Ranking intermediates shared by a batch group: users with the same filters but their own liked sets.
+
+    Same interface as RankingState. The candidate mask depends only on the
+    group's price range, and the pool tables and each pool's leading rows only
+    on the pool arguments, so those are computed once per group and once per
+    pool arguments that recur (the first user with new ones is ranked alone,
+    which costs no more); each user's liked ids and boosted products are
+    applied on top at rank time. `rank()` returns exactly what
+    `ScoringEngine.rank()` would for the same arguments.
+    """
+
+    def __init__(self, engine, min_price=0, max_price=float('inf'), k=3, in_stock_only=False):
+        self.engine = engine
+        self.k = k
+        self.in_stock_only = in_stock_only
+        # leading rows kept per pool: only the user's liked rows, skipped in a head, can leave it short of k
+        # (boosted rows it skips already hold a slot); with more than two of them the user is ranked alone
+        self.depth = k + 2
+        self._set_price_range(min_price, max_price)
+        self.similar_key = None
+        self.similar_positions = []
+
+    def _set_price_range(self, min_price, max_price):
+        self.price_range = (min_price, max_price)
+        self.mask = self.engine.candidate_mask(min_price, max_price, in_stock_only=self.in_stock_only)
+        self.candidate_count = int(np.count_nonzero(self.mask))
+        # pool arguments -> (category table, brand table, first `depth` rows of each pool), once seen twice
+        self.heads = {}
+        self.seen = set()
+
+    def update(self, preferred_categories, liked_categories, brands, complementary_categories,
+               min_price=0, max_price=float('inf'), exclude_ids=()):
+        """Select the shared pools for a user; arguments are those of `ScoringEngine.rank()`."""
+        if (min_price, max_price) != self.price_range:
+            self._set_price_range(min_price, max_price)
+        self.pool_args = (preferred_categories, liked_categories, brands, complementary_categories)
+        key = tuple(frozenset(values) for values in self.pool_args)
+        self.pools = self.heads.get(key)
+        if self.pools is None and key in self.seen:
+            category_table, brand_table = self.engine.pool_tables(*self.pool_args)
+            heads = self.engine.top_by_pool(category_table, brand_table, self.mask, self.depth)
+            self.pools = self.heads[key] = (category_table, brand_table, heads)
+        self.seen.add(key)
+        self.excluded = set()
+        for product_id in exclude_ids:
+            rows = self.engine.rows_by_id.get(product_id)
+            if rows is not None:
+                self.excluded.update(row for row in rows.tolist() if self.mask[row])
+
+    def rank(self, boosted_positions=()):
+        """(candidate count, top-k Products per pool) for the user of the last update()."""
+        candidate_count = self.candidate_count - len(self.excluded)
+        if not candidate_count:
+            return 0, [[] for _ in range(POOL_COUNT)]
+
+        engine, k = self.engine, self.k
+        if self.pools is None:
+            return self._rank_alone(boosted_positions)
+        category_table, brand_table, heads = self.pools
+        boosted = np.empty(0, dtype=np.intp)
+        if len(boosted_positions):
+            boosted = engine.rows[np.asarray(boosted_positions, dtype=np.intp)]
+            boosted = boosted[self.mask[boosted]]
+            # a user likes a handful of products; np.isin costs more than these comparisons
+            for row in self.excluded:
+                boosted = boosted[boosted != row]
+        boosted_pools = np.minimum(category_table[engine.categories[boosted]], brand_table[engine.brands[boosted]])
+        top = []
+        for pool in range(POOL_COUNT):
+            rows = boosted[boosted_pools == pool][:k].tolist()
+            taken = set(rows)
+            for row in heads[pool]:
+                if len(rows) >= k:
+                    break
+                if row not in taken and row not in self.excluded:
+                    rows.append(row)
+            if len(rows) < k and len(heads[pool]) >= self.depth:
+                # the pool continues past the shared head
+                return self._rank_alone(boosted_positions)
+            top.append(rows)
+
+        return candidate_count, [
+            [engine.products[position] for position in engine.order[rows].tolist()]
+            for rows in top
+        ]
+
+    def _rank_alone(self, boosted_positions):
+        mask = self.mask.copy()
+        mask[list(self.excluded)] = False
+        return self.engine.rank(*self.pool_args, k=self.k, mask=mask, boosted_positions=boosted_positions)
@@ -0,0 +1,64 @@
+import json
+
+from fastapi.responses import Response
+
+from config import config
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder produces the same JSON, only slower
+    orjson = None
+
+USE_ORJSON = orjson is not None and config.get('USE_ORJSON', True)
+
+
+def dumps(value):
+    """Compact UTF-8 JSON bytes, in the same format as Catalog.product_json fragments."""
+    if USE_ORJSON:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _object(head, rest):
+    # `head` holds pre-encoded '"key":value' members; `rest` is encoded after them
+    if not rest:
+        return b'{' + head + b'}'
+    return b'{' + head + b',' + dumps(rest)[1:]
+
+
+def product_json(product, catalog):
+    """The snapshot's cached fragment for a catalog product, or a fresh encoding for anything else."""
+    position = catalog.positions_by_id.get(str(product.id))
+    if position is None:
+        return dumps(product.to_dict())
+    return catalog.product_json(position)
+
+
+def recommendation_json(recommendation, catalog):
+    """One {"product", "explanation", ...} recommendation as JSON bytes."""
+    rest = {key: value for key, value in recommendation.items() if key != "product"}
+    return _object(b'"product":' + product_json(recommendation["product"], catalog), rest)
+
+
+def recommendations_json(result, catalog, **leading):
+    """A recommendation result as JSON bytes, assembled from the per-product fragments.
+
+    Replaces converting each Product to a dict and letting FastAPI's encoder walk
+    the result: only the explanations and the few top-level values are encoded
+    per request. `leading` members (e.g. a batch line's user_id) come first.
+    """
+    items = b'[' + b','.join(recommendation_json(r, catalog) for r in result["recommendations"]) + b']'
+    head = b'"recommendations":' + items
+    if leading:
+        head = dumps(leading)[1:-1] + b',' + head
+    return _object(head, {key: value for key, value in result.items() if key != "recommendations"})
+
+
+class JSONBytesResponse(Response):
+    """JSON response for bodies that are already encoded; anything else goes through dumps()."""
+    media_type = "application/json"
+
+    def render(self, content):
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
@@ -0,0 +1,191 @@
+import json
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+
+from services.sqlite_util import LocalConnection
+
+
+class Session:
+    """One shopper's liked set, preferences and running category/brand affinity."""
+
+    def __init__(self, session_id, liked_ids=None, preferences=None,
+                 category_counts=None, brand_counts=None, updated_at=None):
+        self.session_id = session_id
+        # like order matters: explanations reference the earliest matching like
+        self.liked_ids = list(liked_ids or [])
+        self.preferences = preferences or {"priceRange": "all", "categories": [], "brands": []}
+        self.category_counts = Counter(category_counts or {})
+        self.brand_counts = Counter(brand_counts or {})
+        self.updated_at = updated_at or time.time()
+
+    def like(self, product):
+        if product.id in self.liked_ids:
+            return False
+        self.liked_ids.append(product.id)
+        self.category_counts[product.category] += 1
+        self.brand_counts[product.brand] += 1
+        return True
+
+    def unlike(self, product_id, product=None):
+        if product_id not in self.liked_ids:
+            return False
+        self.liked_ids.remove(product_id)
+        # the product may have left the catalog since it was liked; then only the id goes
+        if product is not None:
+            _decrement(self.category_counts, product.category)
+            _decrement(self.brand_counts, product.brand)
+        return True
+
+    def update_preferences(self, changes):
+        self.preferences = {**self.preferences, **{k: v for k, v in changes.items() if v is not None}}
+
+    def liked_products(self, catalog):
+        """Liked Products still present in the given catalog snapshot, in like order."""
+        products = (catalog.get(product_id) for product_id in self.liked_ids)
+        return [p for p in products if p is not None]
+
+    def to_dict(self):
+        return {
+            "session_id": self.session_id,
+            "liked_ids": self.liked_ids,
+            "preferences": self.preferences,
+            "category_counts": dict(self.category_counts),
+            "brand_counts": dict(self.brand_counts),
+            "updated_at": self.updated_at
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def _decrement(counts, key):
+    counts[key] -= 1
+    if counts[key] <= 0:
+        del counts[key]
+
+
+class SessionBackend(ABC):
+    """Storage interface for sessions; swap implementations without touching callers."""
+
+    @abstractmethod
+    def get(self, session_id):
+        """The live session, or None if unknown or expired."""
+
+    @abstractmethod
+    def put(self, session):
+        """Store the session, replacing any earlier state."""
+
+    @abstractmethod
+    def delete(self, session_id):
+        """Forget the session; unknown ids are ignored."""
+
+
+class InMemorySessionBackend(SessionBackend):
+    """Per-process LRU of live Session objects, expiring idle sessions after a TTL."""
+
+    def __init__(self, max_sessions=10000, ttl_seconds=3600):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()
+
+    def get(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.time() - session.updated_at > self.ttl_seconds:
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def put(self, session):
+        session.updated_at = time.time()
+        self._sessions[session.session_id] = session
+        self._sessions.move_to_end(session.session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def delete(self, session_id):
+        self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Sessions as JSON rows in a local SQLite file shared by every worker process."""
+
+    def __init__(self, path, ttl_seconds=3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._connection = LocalConnection(path)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def get(self, session_id):
+        row = self._connection().execute(
+            "SELECT data, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        return Session.from_dict(json.loads(row[0]))
+
+    def put(self, session):
+        session.updated_at = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+                (session.session_id, json.dumps(session.to_dict()), session.updated_at)
+            )
+
+    def delete(self, session_id):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+
+class SessionStore:
+    """Creates sessions and applies like/unlike/preference deltas to them."""
+
+    def __init__(self, backend=None):
+        # an empty in-memory backend has len() 0, so test for None rather than truthiness
+        self.backend = backend if backend is not None else InMemorySessionBackend()
+
+    def create(self, catalog, preferences=None, liked_ids=()):
+        session = Session(uuid.uuid4().hex)
+        if preferences:
+            session.update_preferences(preferences)
+        unknown = self._like(session, liked_ids, catalog)
+        self.backend.put(session)
+        return session, unknown
+
+    def get(self, session_id):
+        return self.backend.get(session_id)
+
+    def delete(self, session_id):
+        self.backend.delete(session_id)
+
+    def apply_delta(self, session, catalog, like=(), unlike=(), preferences=None):
+        """Apply one client delta; returns the ids that weren't found in the catalog."""
+        for product_id in unlike:
+            session.unlike(product_id, catalog.get(product_id))
+        unknown = self._like(session, like, catalog)
+        if preferences:
+            session.update_preferences(preferences)
+        self.backend.put(session)
+        return unknown
+
+    @staticmethod
+    def _like(session, product_ids, catalog):
+        unknown = []
+        for product_id in product_ids:
+            product = catalog.get(product_id)
+            if product is None:
+                unknown.append(product_id)
+            else:
+                session.like(product)
+        return unknown
@@ -0,0 +1,36 @@
+"""SQLite connections for the stores that pre-forked workers share.
+
+The session, recommendation-cache and catalog databases are local files that
+stand in for an external shared store (e.g. Redis): every worker process
+pointed at the same file sees the same data.
+"""
+import os
+import sqlite3
+import threading
+
+
+class LocalConnection:
+    """Calling it returns this thread's connection to `path`, opened on first use.
+
+    Connections must not cross a fork, and pre-forked workers inherit the
+    objects holding this one, so a connection opened in another process is
+    replaced. Writable connections use WAL so readers never wait on a writer.
+    """
+
+    def __init__(self, path, read_only=False, timeout=5):
+        self.path = path
+        self.read_only = read_only
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __call__(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            if self.read_only:
+                conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=self.timeout)
+            else:
+                conn = sqlite3.connect(self.path, timeout=self.timeout)
+                conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
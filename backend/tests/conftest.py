@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from benchmarks.synthetic import generate_products
+from services.catalog import Catalog, Product
+
+
+@pytest.fixture(scope="session")
+def synthetic_catalog():
+    """2,000 generated products, with enough brands that every pool occurs."""
+    return Catalog([Product.from_dict(p) for p in generate_products(2000, brand_count=40)], version=1)
+
+
+
+@pytest.fixture
+def fake_clock():
+    """A settable monotonic clock: call it for the time, advance it with clock.now += seconds."""
+    class Clock:
+        now = 1000.0
+
+        def __call__(self):
+            return self.now
+
+    return Clock()
+
+
+@pytest.fixture(scope="module")
+def client():
+    """The app in-process (mock recommender, data/products.json), with startup and shutdown run."""
+    from fastapi.testclient import TestClient
+
+    import app
+
+    with TestClient(app.app) as client:
+        yield client
+
+
+@pytest.fixture
+def catalog_paths(tmp_path, monkeypatch):
+    """Point the ProductService's data files at tmp_path; products.json holds 200 generated products."""
+    from config import config
+
+    paths = {
+        'DATA_PATH': tmp_path / "products.json",
+        'CATALOG_FILE_PATH': tmp_path / "products.bin",
+        'CONTENT_INDEX_PATH': tmp_path / "content_index.npz",
+        'NEIGHBORS_PATH': tmp_path / "neighbors.npy",
+        'CATALOG_DB_PATH': tmp_path / "catalog.db"
+    }
+    for key, path in paths.items():
+        monkeypatch.setitem(config, key, str(path))
+    paths['DATA_PATH'].write_text(json.dumps(generate_products(200, seed=7)))
+    return {key: str(path) for key, path in paths.items()}
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import random
+
+from services.llm_service import LLMService
+from services.scoring_engine import GroupRankingState
+
+PRICE_RANGES = ['all', '0-50', '50-100', '100+', '25-300']
+
+
+def _ids(result):
+    count, pools = result
+    return count, [[p.id for p in pool] for pool in pools]
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_group_state_matches_engine(synthetic_catalog):
+    """Shared pool heads, including users whose liked products push a head past its depth."""
+    catalog = synthetic_catalog
+    engine = catalog.engine
+    rng = random.Random(4)
+    categories, brands = catalog.categories(), catalog.brands()
+    templates = [
+        ({rng.choice(categories)}, {rng.choice(categories)}, {rng.choice(brands)}, set(rng.sample(categories, 2)))
+        for _ in range(4)
+    ]
+    for min_price, max_price in ((0, float('inf')), (20, 80)):
+        state = GroupRankingState(engine, min_price, max_price, k=3)
+        for step in range(300):
+            pool_args = rng.choice(templates)
+            # liked products from the top of the pools' categories, so they sit inside the shared heads
+            category = rng.choice(sorted(pool_args[0] | pool_args[1]))
+            best = sorted(catalog.products_in_category(category), key=lambda p: -(p.rating or 0))[:8]
+            exclude_ids = {p.id for p in rng.sample(best, rng.randint(0, 6))}
+            boosted = rng.sample(range(len(catalog)), rng.randint(0, 30))
+            state.update(*pool_args, min_price=min_price, max_price=max_price, exclude_ids=exclude_ids)
+            expected = engine.rank(*pool_args, min_price=min_price, max_price=max_price, exclude_ids=exclude_ids,
+                                   k=3, boosted_positions=boosted)
+            assert _ids(state.rank(boosted)) == _ids(expected), step
+
+
+def test_batch_matches_single_requests(synthetic_catalog):
+    """Group-shared ranking gives every user what ranking them alone would."""
+    catalog = synthetic_catalog
+    service = LLMService({'cache_max_entries': 0, 'batch_window': 50})
+    rng = random.Random(5)
+    categories = sorted(catalog.categories())
+    requests = []
+    for i in range(200):
+        preferences = {'priceRange': rng.choice(PRICE_RANGES), 'categories': rng.sample(categories, rng.randint(0, 1)),
+                       'brands': []}
+        requests.append((f"u{i}", preferences, [catalog[rng.randrange(len(catalog))] for _ in range(rng.randint(0, 3))]))
+
+    async def run():
+        return [pair async for pair in service.generate_recommendations_batch(iter(requests), catalog)]
+
+    results = dict(asyncio.run(run()))
+    assert sorted(results) == sorted(user_id for user_id, _, _ in requests)
+    for user_id, preferences, liked in requests:
+        alone = service._generate_mock_recommendations(preferences, liked, catalog)
+        assert ([(r["product"].id, r["explanation"]) for r in results[user_id]["recommendations"]]
+                == [(r["product"].id, r["explanation"]) for r in alone["recommendations"]]), user_id
+
+
+def _batch_requests(client):
+    products = client.get("/api/products").json()
+    return [
+        {"user_id": "u1", "preferences": {"priceRange": "all", "categories": [], "brands": []},
+         "browsing_history": [products[0]["id"]]},
+        {"user_id": "u2", "preferences": {"priceRange": "cheap-ish", "categories": [], "brands": []}},
+        {"user_id": "u3", "preferences": {"priceRange": "x-y", "categories": [], "brands": []}},
+        {"user_id": "u4", "preferences": {"priceRange": "0-100", "categories": [], "brands": []},
+         "browsing_history": [products[1]["id"]]}
+    ]
+
+
+def test_json_batch_reports_failed_users(client):
+    response = client.post("/api/recommendations/batch", json={"requests": _batch_requests(client)})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = _lines(response)
+    results = {line["user_id"]: line for line in lines if "recommendations" in line}
+    failed = {line["user_id"]: line["detail"] for line in lines if "detail" in line}
+    assert sorted(results) == ["u1", "u4"]
+    assert all(len(line["recommendations"]) == 3 for line in results.values())
+    assert failed == {"u2": "Invalid priceRange: 'cheap-ish'", "u3": "Invalid priceRange: 'x-y'"}
+
+
+def test_ndjson_batch_reports_invalid_lines_and_failed_users(client):
+    requests = _batch_requests(client)
+    body = "\n".join([json.dumps(requests[0]), '{"user_id": }', json.dumps(requests[1]), json.dumps(requests[3])])
+    response = client.post("/api/recommendations/batch", content=body.encode(),
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    lines = _lines(response)
+    assert sorted(line["user_id"] for line in lines if "recommendations" in line) == ["u1", "u4"]
+    assert [line["line"] for line in lines if "line" in line] == [2]
+    assert [line["user_id"] for line in lines if "user_id" in line and "detail" in line] == ["u2"]
+
+
+def test_batch_results_match_the_single_endpoint(client):
+    requests = [r for r in _batch_requests(client) if r["user_id"] in ("u1", "u4")]
+    lines = _lines(client.post("/api/recommendations/batch", json={"requests": requests}))
+    for request, line in zip(requests, sorted(lines, key=lambda line: line["user_id"])):
+        single = client.post("/api/recommendations", json=request).json()
+        assert line["recommendations"] == single["recommendations"]
+
+
+def test_invalid_json_batch_is_a_422(client):
+    response = client.post("/api/recommendations/batch", json={"requests": [{"preferences": {}}]})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][:2] == ["body", "requests"]
@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+from services.catalog_db import DatabaseProducts, import_products
+from services.content_index import ContentIndex, catalog_fingerprint
+from services.neighbor_index import neighbor_fingerprint
+from services.product_service import ProductService, SQLiteProductService
+
+QUERIES = [
+    {},
+    {"categories": ["Electronics", "Books"]},
+    {"brands": ["Brand00003"], "min_price": 20},
+    {"min_price": 50, "max_price": 150},
+    {"categories": ["Home"], "max_price": float('inf')}
+]
+
+
+def _import(catalog_paths, records=None):
+    if records is None:
+        with open(catalog_paths['DATA_PATH']) as file:
+            records = json.load(file)
+    products = ProductService()._convert_to_product_objects(records)
+    fingerprints = {"content": catalog_fingerprint(products), "neighbors": neighbor_fingerprint(products)}
+    import_products(products, catalog_paths['CATALOG_DB_PATH'], fingerprints=fingerprints)
+    return products
+
+
+@pytest.fixture
+def database_service(catalog_paths):
+    """A SQLiteProductService over the 200 products of catalog_paths, imported into catalog.db."""
+    _import(catalog_paths)
+    return SQLiteProductService()
+
+
+def test_snapshot_matches_the_json_catalog(database_service):
+    memory = ProductService().get_catalog()
+    catalog = database_service.get_catalog()
+    assert isinstance(catalog.products, DatabaseProducts)
+    assert [p.to_dict() for p in catalog] == [p.to_dict() for p in memory]
+    for query in QUERIES:
+        assert catalog.query_positions(**query) == memory.query_positions(**query)
+        assert ([p.id for p in database_service.query_products(**query)]
+                == [p.id for p in memory.query(**query)])
+
+
+def test_query_page_walks_the_same_pages(database_service):
+    catalog = database_service.get_catalog()
+    for query in QUERIES:
+        positions, after = [], None
+        while True:
+            page = database_service.query_page(catalog, **query, after=after, limit=7)
+            assert page is not None and len(page) <= 7
+            positions += [position for position, _ in page]
+            assert all(catalog.products[position].id == product.id for position, product in page)
+            if len(page) < 7:
+                break
+            after = page[-1][0]
+        assert positions == catalog.query_positions(**query)
+
+
+def test_query_page_gives_up_after_a_reimport(database_service, catalog_paths):
+    catalog = database_service.get_catalog()
+    with open(catalog_paths['DATA_PATH']) as file:
+        records = json.load(file)
+    _import(catalog_paths, records[::-1])
+    assert database_service.is_stale()
+    assert database_service.query_page(catalog, limit=5) is None
+    # the snapshot still serves its own products
+    assert catalog.products[0].id == records[0]["id"]
+
+
+def test_search_uses_the_full_text_index(database_service):
+    target = database_service.get_catalog().products[17]
+    found = database_service.search_products(target.name)
+    assert target.id in [p.id for p in found]
+    assert database_service.search_products('"') == []
+
+
+def test_product_cache_is_bounded(catalog_paths, monkeypatch):
+    from config import config
+
+    monkeypatch.setitem(config, 'CATALOG_DB_CACHE', 10)
+    _import(catalog_paths)
+    products = SQLiteProductService().get_catalog().products
+    for position in range(0, 200, 3):
+        assert products[position].id == products.ids[position]
+    assert len(products._cache) == 10
+
+
+def test_content_index_is_never_built_at_load(database_service, catalog_paths):
+    catalog = database_service.get_catalog()
+    assert catalog._content_index is None and len(catalog.products._cache) == 0
+
+    ContentIndex.build(ProductService().get_all_products()).save(catalog_paths['CONTENT_INDEX_PATH'])
+    catalog = SQLiteProductService().get_catalog()
+    assert catalog._content_index is not None and len(catalog.products._cache) == 0
+
+
+def test_products_endpoint_pages_in_sqlite(database_service, client, monkeypatch):
+    import app
+
+    memory = ProductService().get_catalog()
+    monkeypatch.setattr(app, "product_service", database_service)
+    calls = []
+    query_rows = database_service.database.query_rows
+    monkeypatch.setattr(database_service.database, "query_rows", lambda *args: calls.append(args) or query_rows(*args))
+
+    ids, cursor = [], None
+    while True:
+        params = {"category": "Electronics", "limit": 4, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/products", params=params).json()
+        ids += [p["id"] for p in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert ids == [p.id for p in memory.query(categories=["Electronics"])]
+    assert len(calls) == -(-len(ids) // 4)
+
+    fields = client.get("/api/products", params={"limit": 2, "fields": "id,price"}).json()["items"]
+    assert fields == [{"id": p.id, "price": p.price} for p in memory.products[:2]]
@@ -0,0 +1,113 @@
+import json
+
+import numpy as np
+import pytest
+
+from config import config
+from services.catalog import Product
+from services.catalog_file import CatalogColumns, CatalogFile, LazyProducts, compile_catalog, source_stamp
+from services.content_index import ContentIndex, catalog_fingerprint
+from services.product_service import ProductService
+
+
+@pytest.fixture(scope="module")
+def bundled_products():
+    """The products.json shipped with the backend, as Products."""
+    with open(config['DATA_PATH'], 'r') as f:
+        return [Product.from_dict(p) for p in json.load(f)]
+
+
+@pytest.fixture
+def products(bundled_products):
+    # nulls and mixed number kinds on top of the bundled catalog
+    extra = [
+        Product(12345, "Numeric id", "", None, "Books", "Acme", rating=None, inventory=None),
+        Product("p-int", "Ünïcode ✓", "line\nbreak", 20, "Books", "Acme", subcategory=None,
+                features=[], tags=["gift"], inventory=0)
+    ]
+    return bundled_products + extra
+
+
+def test_round_trip(products, tmp_path):
+    path = str(tmp_path / "products.bin")
+    compile_catalog(products, path)
+    catalog_file = CatalogFile(path)
+    assert len(catalog_file) == len(products)
+    for position, product in enumerate(products):
+        expected = product.to_dict()
+        expected["id"] = str(expected["id"])
+        assert Product(**catalog_file.product_fields(position)).to_dict() == expected
+
+
+def test_number_kinds_survive(products, tmp_path):
+    path = str(tmp_path / "products.bin")
+    compile_catalog(products, path)
+    fields = CatalogFile(path).product_fields(len(products) - 1)
+    assert fields["price"] == 20 and isinstance(fields["price"], int)
+    assert fields["inventory"] == 0 and isinstance(fields["inventory"], int)
+    fields = CatalogFile(path).product_fields(len(products) - 2)
+    assert fields["price"] is None and fields["rating"] is None and fields["inventory"] is None
+
+
+def test_columns_match_products(products, tmp_path):
+    path = str(tmp_path / "products.bin")
+    compile_catalog(products, path)
+    from_file = CatalogFile(path).columns()
+    from_products = CatalogColumns.from_products(products)
+    assert list(from_file.ids) == [str(i) for i in from_products.ids]
+    np.testing.assert_array_equal(from_file.prices, from_products.prices)
+    np.testing.assert_array_equal(from_file.ratings, from_products.ratings)
+    np.testing.assert_array_equal(from_file.inventories, from_products.inventories)
+    assert ([from_file.categories[c] for c in from_file.category_codes]
+            == [from_products.categories[c] for c in from_products.category_codes])
+    assert ([from_file.brands[c] for c in from_file.brand_codes]
+            == [from_products.brands[c] for c in from_products.brand_codes])
+
+
+def test_lazy_products_build_on_access(products, tmp_path):
+    path = str(tmp_path / "products.bin")
+    compile_catalog(products, path)
+    lazy = LazyProducts(CatalogFile(path), Product)
+    assert len(lazy) == len(products) and lazy.materialized == 0
+    assert lazy[-1].id == "p-int"
+    assert lazy[-1] is lazy[len(products) - 1]
+    assert [p.id for p in lazy[:2]] == [products[0].id, products[1].id]
+    assert lazy.materialized == 3
+
+
+def test_non_numeric_number_is_rejected(tmp_path):
+    product = Product("p1", "Name", "", "19.99", "Books", "Acme")
+    with pytest.raises(Exception):
+        compile_catalog([product], str(tmp_path / "products.bin"))
+
+
+def _compile(catalog_paths):
+    with open(catalog_paths['DATA_PATH']) as f:
+        products = [Product.from_dict(p) for p in json.load(f)]
+    compile_catalog(products, catalog_paths['CATALOG_FILE_PATH'],
+                    fingerprints={"content": catalog_fingerprint(products)},
+                    source=source_stamp(catalog_paths['DATA_PATH']))
+    return products
+
+
+def test_product_service_maps_the_compiled_file(catalog_paths):
+    products = _compile(catalog_paths)
+    ContentIndex.build(products).save(catalog_paths['CONTENT_INDEX_PATH'])
+    catalog = ProductService().get_catalog()
+    assert isinstance(catalog.products, LazyProducts)
+    # indexes, engine and the prebuilt content index load without building a single Product
+    assert catalog.products.materialized == 0
+    assert catalog.content_index.fingerprint == catalog_fingerprint(products)
+    assert catalog.query_positions(categories=[products[3].category]) == [
+        i for i, p in enumerate(products) if p.category == products[3].category]
+    assert catalog.get(products[3].id).to_dict() == products[3].to_dict()
+    assert catalog.products.materialized == 1
+
+
+def test_stale_compiled_file_is_ignored(catalog_paths):
+    _compile(catalog_paths)
+    records = json.load(open(catalog_paths['DATA_PATH']))
+    with open(catalog_paths['DATA_PATH'], 'w') as f:
+        json.dump(records[:10], f)
+    catalog = ProductService().get_catalog()
+    assert isinstance(catalog.products, list) and len(catalog) == 10
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from services.product_service import ProductService
+
+
+def _write(path, records, bump=1):
+    with open(path, 'w') as f:
+        json.dump(records, f)
+    # mtimes can tie within a test; make sure the watcher sees a change
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + bump * 10 ** 9))
+
+
+def test_reload_swaps_in_a_new_snapshot(catalog_paths):
+    service = ProductService()
+    old = service.get_catalog()
+    seen = []
+    service.add_reload_listener(seen.append)
+
+    records = json.load(open(catalog_paths['DATA_PATH']))
+    records[0]['name'] = "Renamed"
+    records.append({**records[1], 'id': 'new-product'})
+    assert not service.is_stale()
+    _write(catalog_paths['DATA_PATH'], records)
+    assert service.is_stale()
+
+    version = service.reload()
+    catalog = service.get_catalog()
+    assert version == catalog.version == old.version + 1
+    assert seen == [catalog]
+    assert not service.is_stale()
+    assert catalog.get('new-product') is not None and catalog.get(records[0]['id']).name == "Renamed"
+    # readers holding the old snapshot keep a consistent view
+    assert old.get('new-product') is None and old.get(records[0]['id']).name != "Renamed"
+    assert catalog.source_id != old.source_id
+
+
+def test_failed_reload_keeps_serving_the_old_snapshot(catalog_paths):
+    service = ProductService()
+    old = service.get_catalog()
+    with open(catalog_paths['DATA_PATH'], 'w') as f:
+        f.write('[{"id": "broken"')
+    with pytest.raises(ValueError):
+        service.reload()
+    assert service.get_catalog() is old
+
+
+def test_reload_async_and_watch(catalog_paths):
+    service = ProductService()
+    records = json.load(open(catalog_paths['DATA_PATH']))
+
+    async def run():
+        version = await service.reload_async()
+        _write(catalog_paths['DATA_PATH'], records[:50])
+        watcher = asyncio.ensure_future(service.watch(0.01))
+        try:
+            for _ in range(200):
+                await asyncio.sleep(0.01)
+                if len(service.get_catalog()) == 50:
+                    break
+        finally:
+            watcher.cancel()
+        return version
+
+    version = asyncio.run(run())
+    assert len(service.get_catalog()) == 50
+    assert service.version == version + 1
+
+
+def test_admin_reload_invalidates_cached_recommendations(client):
+    import app
+
+    preferences = {"priceRange": "all", "categories": [], "brands": []}
+    client.post("/api/recommendations", json={"preferences": preferences, "browsing_history": []})
+    assert len(app.llm_service.cache) > 0
+    before = client.get("/api/stats").json()["catalog_version"]
+
+    response = client.post("/api/admin/reload").json()
+    assert response["catalog_version"] == before + 1 == client.get("/api/stats").json()["catalog_version"]
+    assert len(app.llm_service.cache) == 0
+    assert client.get("/api/products").headers["X-Catalog-Version"] == str(response["catalog_version"])
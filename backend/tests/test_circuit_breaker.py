@@ -0,0 +1,76 @@
+from services.llm_scheduler import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def _breaker(clock, **kwargs):
+    return CircuitBreaker(**{"failure_threshold": 3, "reset_timeout": 30, "half_open_probes": 1, "clock": clock, **kwargs})
+
+
+def test_opens_after_consecutive_failures(fake_clock):
+    breaker = _breaker(fake_clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats() == {"state": OPEN, "consecutive_failures": 3, "trips": 1}
+
+
+def test_half_open_lets_probes_through_after_timeout(fake_clock):
+    breaker = _breaker(fake_clock, half_open_probes=2)
+    for _ in range(3):
+        breaker.record_failure()
+    fake_clock.now += 29
+    assert not breaker.allow()
+    fake_clock.now += 1
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() and breaker.allow()
+    assert not breaker.allow()
+
+
+def test_probe_success_closes_and_failure_reopens(fake_clock):
+    breaker = _breaker(fake_clock)
+    for _ in range(3):
+        breaker.record_failure()
+    fake_clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.trips == 2
+
+    fake_clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_released_probe_can_be_granted_again(fake_clock):
+    breaker = _breaker(fake_clock)
+    for _ in range(3):
+        breaker.record_failure()
+    fake_clock.now += 30
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_release_is_a_no_op_when_closed(fake_clock):
+    breaker = _breaker(fake_clock)
+    breaker.release()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_unreported_probe_is_replaced_after_timeout(fake_clock):
+    breaker = _breaker(fake_clock)
+    for _ in range(3):
+        breaker.record_failure()
+    fake_clock.now += 30
+    assert breaker.allow()
+    fake_clock.now += 10
+    assert not breaker.allow()
+    fake_clock.now += 20
+    assert breaker.allow()
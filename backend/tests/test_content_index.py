@@ -0,0 +1,53 @@
+import numpy as np
+
+from services.catalog import Catalog, Product
+from services.content_index import ContentIndex
+
+
+def _product(product_id, name, description, category="Home", tags=()):
+    return Product(product_id, name, description, 10, category, "Acme", tags=list(tags))
+
+
+def test_similar_text_ranks_first():
+    catalog = Catalog([
+        _product("p0", "Wireless Noise Cancelling Headphones", "Over-ear bluetooth headphones"),
+        _product("p1", "Bluetooth Headphones", "Wireless over-ear headphones with noise cancelling"),
+        _product("p2", "Cast Iron Skillet", "Pre-seasoned skillet for the stove"),
+        _product("p3", "Wireless Earbuds", "Bluetooth earbuds with charging case"),
+        _product("p4", "Yoga Mat", "Non-slip mat", tags=["fitness"])
+    ], version=1)
+    similar = catalog.similar_to(["p0"], k=5)
+    assert [p.id for p, _ in similar][:2] == ["p1", "p3"]
+    assert "p0" not in [p.id for p, _ in similar]
+    assert all(score > 0 for _, score in similar)
+    assert "p4" not in [p.id for p, _ in similar]
+    assert catalog.similar_to(["unknown"]) == []
+
+
+def test_row_scores_match_full_scores(synthetic_catalog):
+    index = synthetic_catalog.content_index
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        positions = rng.choice(len(synthetic_catalog), size=rng.integers(1, 5), replace=False).tolist()
+        rows = rng.choice(len(synthetic_catalog), size=300, replace=False)
+        query = index.query(positions)
+        np.testing.assert_allclose(index.scores(query, rows), index.scores(query)[rows], atol=1e-6)
+        np.testing.assert_allclose(index.similarity(positions, rows), index.scores(query)[rows], atol=1e-6)
+
+
+def test_catalog_memo_is_read_only_and_reused(synthetic_catalog):
+    scores = synthetic_catalog.similarity([1, 2])
+    assert synthetic_catalog.similarity([2, 1]) is scores
+    assert not scores.flags.writeable
+    top = synthetic_catalog.top_similar([1, 2], 10)
+    assert top == synthetic_catalog.content_index.top_similar([1, 2], 10)
+    assert all(position not in (1, 2) for position, _ in top)
+
+
+def test_save_and_load(tmp_path, synthetic_catalog):
+    index = synthetic_catalog.content_index
+    path = str(tmp_path / "content_index.npz")
+    index.save(path)
+    loaded = ContentIndex.load(path)
+    assert loaded.fingerprint == index.fingerprint
+    np.testing.assert_array_equal(loaded.similarity([5]), index.similarity([5]))
@@ -0,0 +1,73 @@
+from services.catalog import Catalog, Product
+from services.explanations import Explainer, feature_phrase
+from services.neighbor_index import COMPLEMENTARY, SAME_BRAND, SAME_CATEGORY
+
+COMPLEMENTS = {"Phones": ["Accessories"]}
+
+
+def _product(product_id, category, brand, features=(), description="Plain, simple."):
+    return Product(product_id, f"Name {product_id}", description, 10, category, brand, features=list(features))
+
+
+def _catalog():
+    return Catalog([
+        _product("phone1", "Phones", "Acme", ["Long battery. "]),
+        _product("phone2", "Phones", "Zenith"),
+        _product("case1", "Accessories", "Acme", ["Drop Proof"]),
+        _product("lamp1", "Home", "Lumen", description="Warm light, dimmable"),
+        _product("lamp2", "Home", "Acme")
+    ], version=1)
+
+
+def test_feature_phrase_prefers_the_first_feature():
+    assert feature_phrase(_product("a", "c", "b", ["  Fast Charging.  ", "Other"])) == "fast charging"
+    assert feature_phrase(_product("a", "c", "b", description="Soft cotton, machine washable")) == "soft cotton"
+    assert feature_phrase(_product("a", "c", "b", description=None)) == ""
+
+
+def test_catalog_memoizes_phrases_of_its_own_products():
+    catalog = _catalog()
+    lamp = catalog.get("lamp1")
+    assert catalog.feature_phrase(lamp) == "warm light"
+    assert catalog._feature_phrases[3] == "warm light"
+    # an equal id from elsewhere is phrased on its own, not from the memo
+    other = _product("lamp1", "Home", "Lumen", ["Cool Tone"])
+    assert catalog.feature_phrase(other) == "cool tone"
+    assert catalog._feature_phrases[3] == "warm light"
+
+
+def test_explanations_refer_to_the_first_matching_like():
+    catalog = _catalog()
+    phone1, phone2, case1, lamp1, lamp2 = catalog.products
+    explainer = Explainer(catalog, [phone2, lamp1, phone1], COMPLEMENTS)
+
+    assert explainer.preferred(phone1) == "Since you liked Name phone2, you'll love Name phone1 for its long battery"
+    assert explainer.same_category(lamp2) == "Since you liked Name lamp1, you'll love Name lamp2 for its plain"
+    assert explainer.same_brand(lamp2) == "Since you liked Name phone1, you'll love Name lamp2 for its premium Acme quality"
+    assert explainer.complementary(case1) == (
+        "Since you liked Name phone2, you'll love Name case1 to complement it with drop proof")
+    assert explainer.other(case1) == "Based on your interest in Phones, you'll love Name case1 for its drop proof"
+
+
+def test_fallbacks_without_a_matching_like():
+    catalog = _catalog()
+    phone1, phone2, case1, lamp1, lamp2 = catalog.products
+    explainer = Explainer(catalog, [lamp1], COMPLEMENTS)
+    assert explainer.preferred(phone2) == "Based on your interest in Phones, you'll love Name phone2 for its plain"
+    assert explainer.same_category(case1) == explainer.other(case1)
+    assert explainer.same_brand(phone2) == explainer.other(phone2)
+    assert explainer.other(phone2) == "Based on your interest in Home, you'll love Name phone2 for its plain"
+    # nothing complements a lamp, so the first liked product stands in
+    assert explainer.complementary(case1).startswith("Since you liked Name lamp1,")
+
+    nothing_liked = Explainer(catalog, [], COMPLEMENTS)
+    assert nothing_liked.other(lamp1) == "Based on your interests, you'll love Name lamp1 for its warm light"
+
+
+def test_neighbor_explanations_follow_the_list_kind():
+    catalog = _catalog()
+    phone1, phone2, case1, lamp1, lamp2 = catalog.products
+    explainer = Explainer(catalog, [phone1], COMPLEMENTS)
+    assert explainer.neighbor(SAME_BRAND, lamp2, phone1).endswith("for its premium Acme quality")
+    assert explainer.neighbor(COMPLEMENTARY, case1, phone1).endswith("to complement it with drop proof")
+    assert explainer.neighbor(SAME_CATEGORY, phone2, phone1) == explainer.same_category(phone2)
@@ -0,0 +1,40 @@
+from services.json_stream import JSONArrayStream
+
+ANSWER = ('Here you go:\n```json\n[{"product_id": "prod001", "explanation": "Since you liked {X}, [try] \\"this\\""},'
+          ' {"product_id": "prod002", "explanation": "ok", "extra": {"nested": [1, {"a": "}"}]}}]\n```\ntrailing {"x": 1}')
+
+
+def test_objects_are_returned_as_soon_as_they_close():
+    stream = JSONArrayStream()
+    items = []
+    for position, char in enumerate(ANSWER):
+        new = stream.feed(char)
+        if new:
+            items.append((position, new))
+    assert [item["product_id"] for _, batch in items for item in batch] == ["prod001", "prod002"]
+    # the first object is out before the second one starts
+    assert items[0][0] < ANSWER.index('"prod002"')
+    assert items[0][1][0]["explanation"] == 'Since you liked {X}, [try] "this"'
+    assert items[1][1][0]["extra"] == {"nested": [1, {"a": "}"}]}
+    assert stream.done
+
+
+def test_whole_text_at_once():
+    stream = JSONArrayStream()
+    assert [item["product_id"] for item in stream.feed(ANSWER)] == ["prod001", "prod002"]
+    assert stream.feed('[{"product_id": "prod003"}]') == []
+
+
+def test_invalid_and_non_object_elements_are_skipped():
+    stream = JSONArrayStream()
+    items = stream.feed('[{"a": 1}, {"b": }, [1, 2], "text", 3, {"c": 3}')
+    assert items == [{"a": 1}, {"c": 3}]
+    assert not stream.done
+    assert stream.feed(']') == []
+    assert stream.done
+
+
+def test_nothing_before_the_array_opens():
+    stream = JSONArrayStream()
+    assert stream.feed('{"not": "in an array"} ') == []
+    assert stream.feed('[{"in": "array"}]') == [{"in": "array"}]
@@ -0,0 +1,120 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from services.llm_scheduler import OPEN
+from services.llm_service import LLMService
+
+PREFERENCES = {'priceRange': 'all', 'categories': [], 'brands': []}
+
+
+def _completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+                           usage=SimpleNamespace(prompt_tokens=10))
+
+
+def _llm_service(monkeypatch, delays, text='[]', **config):
+    """LLM mode with completions that answer `text` after the given delays, one per attempt."""
+    service = LLMService({'use_llm': True, 'api_key': 'test', 'cache_max_entries': 0, 'hedge_min_delay': 0.02,
+                          'timeout': 0.5, **config})
+    attempts = []
+
+    async def create_completion(messages):
+        delay = delays[min(len(attempts), len(delays) - 1)]
+        attempts.append(delay)
+        await asyncio.sleep(delay)
+        if isinstance(text, Exception):
+            raise text
+        return _completion(text)
+
+    monkeypatch.setattr(service, '_create_completion', create_completion)
+    return service, attempts
+
+
+def _run(service, coroutine):
+    async def run():
+        try:
+            return await coroutine
+        finally:
+            await service.aclose()
+    return asyncio.run(run())
+
+
+def test_slow_call_is_hedged_and_the_duplicate_wins(monkeypatch):
+    service, attempts = _llm_service(monkeypatch, [0.4, 0.01], text='answer')
+    for _ in range(20):
+        service.llm_latency.record(0.01)
+    assert _run(service, service._call_llm_api('prompt')) == 'answer'
+    assert len(attempts) == 2
+    stats = service.scheduler_stats
+    assert (stats["llm_calls"], stats["hedges_sent"], stats["hedge_wins"]) == (1, 1, 1)
+
+
+def test_no_hedging_without_enough_latency_samples(monkeypatch):
+    service, attempts = _llm_service(monkeypatch, [0.05], text='answer')
+    assert _run(service, service._call_llm_api('prompt')) == 'answer'
+    assert len(attempts) == 1 and service.scheduler_stats["hedges_sent"] == 0
+
+
+def test_timeout_falls_back_to_the_mock(synthetic_catalog, monkeypatch):
+    service, _ = _llm_service(monkeypatch, [1.0], timeout=0.05)
+    result = _run(service, service.generate_recommendations(PREFERENCES, [synthetic_catalog[0]], synthetic_catalog))
+    assert len(result["recommendations"]) == 3
+    stats = service.scheduler_stats
+    assert stats["fallbacks"]["timeout"] == 1 and stats["served"] == {"cache": 0, "llm": 0, "mock": 1}
+    assert service.breaker.stats()["consecutive_failures"] == 1
+
+
+def test_open_breaker_skips_the_llm(synthetic_catalog, monkeypatch):
+    service, attempts = _llm_service(monkeypatch, [0.0], text=RuntimeError("down"), breaker_failure_threshold=2)
+
+    async def requests():
+        for i in range(4):
+            await service.generate_recommendations(PREFERENCES, [synthetic_catalog[i]], synthetic_catalog)
+
+    _run(service, requests())
+    assert len(attempts) == 2 and service.breaker.state == OPEN
+    fallbacks = service.scheduler_stats["fallbacks"]
+    assert fallbacks["error"] == 2 and fallbacks["breaker_open"] == 2
+    assert service.scheduler_stats["served"]["mock"] == 4
+
+
+def test_llm_answer_is_served_by_the_llm_tier(synthetic_catalog, monkeypatch):
+    liked = [synthetic_catalog[0]]
+    service = LLMService({'prompt_token_budget': 2000})
+    candidates = service._select_candidates(PREFERENCES, liked, synthetic_catalog)
+    answer = json.dumps([{"product_id": synthetic_catalog.products[p].id, "explanation": "why"} for p in candidates[:3]])
+    service, _ = _llm_service(monkeypatch, [0.0], text=answer)
+    result = _run(service, service.generate_recommendations(PREFERENCES, liked, synthetic_catalog))
+    assert [r["explanation"] for r in result["recommendations"]].count("why") >= 1
+    assert service.scheduler_stats["served"] == {"cache": 0, "llm": 1, "mock": 0}
+    assert service.breaker.state == "closed"
+
+
+def test_streamed_requests_count_their_tier(synthetic_catalog):
+    service = LLMService({'cache_max_entries': 16})
+
+    async def stream():
+        return [r async for r in service.stream_recommendations(PREFERENCES, [synthetic_catalog[0]], synthetic_catalog)]
+
+    asyncio.run(stream())
+    asyncio.run(stream())
+    assert service.scheduler_stats["served"] == {"cache": 1, "llm": 0, "mock": 1}
+
+
+def test_streamed_llm_picks_count_as_the_llm_tier(synthetic_catalog, monkeypatch):
+    liked = [synthetic_catalog[0]]
+    pick = next(p for p in synthetic_catalog if p.inventory and p is not liked[0])
+    service, _ = _llm_service(monkeypatch, [0.0])
+
+    async def stream_completion(messages):
+        yield json.dumps([{"product_id": pick.id, "explanation": "why"}])
+
+    monkeypatch.setattr(service, '_stream_completion', stream_completion)
+
+    async def stream():
+        return [r async for r in service.stream_recommendations(PREFERENCES, liked, synthetic_catalog)]
+
+    results = _run(service, stream())
+    assert [r["source"] for r in results] == ["llm", "mock", "mock"]
+    assert service.scheduler_stats["served"] == {"cache": 0, "llm": 1, "mock": 0}
@@ -0,0 +1,89 @@
+import json
+
+import numpy as np
+import pytest
+
+from services.catalog import Catalog, Product
+from services.llm_service import COMPLEMENTARY_CATEGORIES, LLMService
+from services.neighbor_index import COMPLEMENTARY, CONTENT, SAME_BRAND, SAME_CATEGORY, NeighborIndex
+from services.product_service import ProductService
+
+
+@pytest.fixture(scope="module")
+def neighbors(synthetic_catalog):
+    return NeighborIndex.build(synthetic_catalog, COMPLEMENTARY_CATEGORIES, depth=10)
+
+
+def _rating(product):
+    return product.rating or 0.0
+
+
+def test_relation_lists(synthetic_catalog, neighbors):
+    products = synthetic_catalog.products
+    for position in range(0, len(products), 37):
+        product = products[position]
+        for kind, related in ((SAME_CATEGORY, lambda p: p.category == product.category),
+                              (SAME_BRAND, lambda p: p.brand == product.brand),
+                              (COMPLEMENTARY, lambda p: p.category in COMPLEMENTARY_CATEGORIES.get(product.category, ()))):
+            listed = neighbors.neighbors(position, kind)
+            assert position not in listed and len(listed) <= 10
+            assert all(related(products[p]) for p in listed)
+            ratings = [_rating(products[p]) for p in listed]
+            assert ratings == sorted(ratings, reverse=True)
+            # nothing better rated was left out
+            members = [p for p in range(len(products)) if p != position and related(products[p])]
+            if len(members) > len(listed) and listed:
+                assert max(_rating(products[p]) for p in members if p not in listed) <= ratings[-1]
+        content = neighbors.neighbors(position, CONTENT)
+        assert position not in content and len(set(content)) == len(content)
+
+
+def test_content_lists_match_brute_force(synthetic_catalog, neighbors):
+    """Content lists rank by similarity over the terms in at most 5% of products (build's max_df)."""
+    index = synthetic_catalog.content_index
+    max_count = max(1, int(0.05 * index.size))
+    document_frequency = np.diff(index.term_indptr)
+    for position in range(0, len(synthetic_catalog), 101):
+        start, stop = index.indptr[position], index.indptr[position + 1]
+        query = {term: weight for term, weight in zip(index.indices[start:stop].tolist(), index.data[start:stop].tolist())
+                 if document_frequency[term] <= max_count}
+        scores = index.scores(query)
+        scores[position] = 0
+        matching = np.flatnonzero(scores > 0)
+        expected = matching[np.lexsort((matching, -scores[matching]))][:10].tolist()
+        assert neighbors.neighbors(position, CONTENT) == expected
+
+
+def test_save_and_memory_mapped_load(tmp_path, neighbors):
+    path = str(tmp_path / "neighbors.npy")
+    neighbors.save(path)
+    loaded = NeighborIndex.load(path)
+    assert isinstance(loaded.table, np.memmap)
+    assert loaded.fingerprint == neighbors.fingerprint
+    np.testing.assert_array_equal(loaded.table, neighbors.table)
+
+
+def test_product_service_only_loads_matching_tables(catalog_paths):
+    catalog = ProductService().get_catalog()
+    assert catalog.neighbors is None
+    NeighborIndex.build(catalog, COMPLEMENTARY_CATEGORIES).save(catalog_paths['NEIGHBORS_PATH'])
+    assert ProductService().get_catalog().neighbors is not None
+
+    records = json.load(open(catalog_paths['DATA_PATH']))
+    records[0]['rating'] = 1.0 if records[0].get('rating') != 1.0 else 2.0
+    with open(catalog_paths['DATA_PATH'], 'w') as f:
+        json.dump(records, f)
+    assert ProductService().get_catalog().neighbors is None
+
+
+def test_mock_recommendations_from_neighbor_lists(synthetic_catalog, neighbors):
+    catalog = Catalog(synthetic_catalog.products, version=2, neighbors=neighbors,
+                      content_index=synthetic_catalog.content_index)
+    service = LLMService({})
+    liked = [catalog[10], catalog[20]]
+    preferences = {'priceRange': '0-150', 'categories': [], 'brands': []}
+    picks = service._generate_mock_recommendations(preferences, liked, catalog)["recommendations"]
+    assert len(picks) == 3
+    assert all(p["product"] not in liked and 0 <= p["product"].price <= 150 for p in picks)
+    assert any(p["explanation"].startswith("Since you liked") for p in picks)
+    assert len({p["product"].brand for p in picks}) == 3
@@ -0,0 +1,95 @@
+import pytest
+
+from benchmarks.synthetic import generate_products
+from services.catalog import Catalog, Product
+from services.catalog_file import CatalogFile, LazyProducts, compile_catalog
+
+
+@pytest.fixture
+def lazy_catalog_installed(client, tmp_path):
+    """A 2,000-product memory-mapped catalog serving /api/products, the bundled one restored afterwards."""
+    import app
+
+    records = generate_products(2000, seed=11)
+    path = str(tmp_path / "products.bin")
+    compile_catalog([Product.from_dict(r) for r in records], path)
+    catalog_file = CatalogFile(path)
+    previous = app.product_service.get_catalog()
+    catalog = Catalog(LazyProducts(catalog_file, Product), version=previous.version + 1,
+                      columns=catalog_file.columns(), source_id="lazy-test")
+    app.product_service.install(catalog)
+    yield catalog, records
+    app.product_service.install(previous)
+
+
+def _all_ids(client):
+    return [p["id"] for p in client.get("/api/products").json()]
+
+
+def test_cursor_pagination_walks_the_whole_catalog(client):
+    ids, cursor = [], None
+    while True:
+        params = {"limit": 7, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/products", params=params).json()
+        assert len(page["items"]) <= 7
+        ids += [p["id"] for p in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert ids == _all_ids(client)
+
+
+def test_filtered_pages_stay_filtered(client):
+    categories = [p["category"] for p in client.get("/api/products").json()]
+    category = max(set(categories), key=categories.count)
+    first = client.get("/api/products", params={"category": category, "limit": 2}).json()
+    assert first["next_cursor"] is not None
+    rest = client.get("/api/products", params={"category": category, "cursor": first["next_cursor"]}).json()
+    items = first["items"] + rest["items"]
+    assert all(p["category"] == category for p in items)
+    assert [p["id"] for p in items] == [p["id"] for p in client.get("/api/products", params={"category": category}).json()]
+
+
+def test_invalid_cursor_is_a_400(client):
+    response = client.get("/api/products", params={"limit": 5, "cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_etag_and_not_modified(client):
+    response = client.get("/api/products")
+    etag = response.headers["ETag"]
+    not_modified = client.get("/api/products", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+    assert not_modified.headers["ETag"] == etag
+    assert client.get("/api/products", headers={"If-None-Match": '"other", *'}).status_code == 304
+
+    # the query is part of the tag
+    filtered = client.get("/api/products", params={"limit": 3})
+    assert filtered.headers["ETag"] != etag
+    assert client.get("/api/products", params={"limit": 3}, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_etag_comes_from_the_snapshot_identity():
+    products = [Product("p1", "Name", "", 10, "Books", "Acme")]
+    assert Catalog(products, version=1, source_id="abc").etag == Catalog(products, version=2, source_id="abc").etag
+    assert Catalog(products, version=1, source_id="abc").etag != Catalog(products, version=1, source_id="abd").etag
+    assert Catalog(products, version=1).etag != Catalog(products, version=2).etag
+
+
+def test_pages_serialize_only_their_products(client, lazy_catalog_installed):
+    catalog, records = lazy_catalog_installed
+    response = client.get("/api/products", params={"limit": 5})
+    assert [p["id"] for p in response.json()["items"]] == [r["id"] for r in records[:5]]
+    assert catalog.products.materialized == 5
+    assert client.get("/api/products", params={"limit": 5},
+                      headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    assert catalog.products.materialized == 5
+
+
+def test_full_listing_of_an_on_demand_catalog_streams(client, lazy_catalog_installed):
+    catalog, records = lazy_catalog_installed
+    listing = client.get("/api/products").json()
+    assert listing == [Product.from_dict(r).to_dict() for r in records]
+    # nothing serialized is kept behind
+    assert catalog._products_json is None and not any(catalog._product_json)
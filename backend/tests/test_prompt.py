@@ -0,0 +1,57 @@
+import pytest
+
+from benchmarks.synthetic import generate_products
+from services.catalog import Catalog, Product
+from services.catalog_file import CatalogFile, LazyProducts, compile_catalog
+from services.content_index import ContentIndex
+from services.llm_service import LLMService
+
+
+@pytest.fixture
+def lazy_catalog(tmp_path):
+    """A compiled 5,000-product catalog whose Products are only built when touched."""
+    products = [Product.from_dict(p) for p in generate_products(5000, seed=3, brand_count=40)]
+    path = str(tmp_path / "products.bin")
+    compile_catalog(products, path)
+    catalog_file = CatalogFile(path)
+    return Catalog(LazyProducts(catalog_file, Product), version=1, columns=catalog_file.columns(),
+                   content_index=ContentIndex.build(products))
+
+
+def test_candidates_are_ranked_positions(synthetic_catalog):
+    service = LLMService({'prompt_token_budget': 400})
+    preferences = {'priceRange': '0-100', 'categories': [], 'brands': []}
+    liked = [synthetic_catalog[0]]
+    candidates = service._select_candidates(preferences, liked, synthetic_catalog)
+    assert 0 < len(candidates) <= 200
+    assert all(isinstance(position, int) for position in candidates)
+    products = [synthetic_catalog.products[position] for position in candidates]
+    assert liked[0] not in products
+    assert all(0 <= p.price <= 100 and service.ranking.available(p) for p in products)
+
+
+def test_only_prompt_lines_are_materialized(lazy_catalog):
+    service = LLMService({'prompt_token_budget': 600})
+    preferences = {'priceRange': 'all', 'categories': [], 'brands': []}
+    liked = [lazy_catalog.products[0]]
+    candidates = service._select_candidates(preferences, liked, lazy_catalog)
+    assert lazy_catalog.products.materialized == 1
+
+    prompt = service._create_recommendation_prompt(preferences, liked, lazy_catalog, candidates)
+    included = service.prompt_stats["last_candidates_included"]
+    assert service.prompt_stats["last_candidates_considered"] == len(candidates) > included
+    # plus the first line that didn't fit
+    assert lazy_catalog.products.materialized == 1 + included + 1
+    assert service._estimate_tokens(prompt) < 600 + 1000
+
+
+def test_fallback_fills_slots_within_price_range(lazy_catalog):
+    service = LLMService({'prompt_token_budget': 2000})
+    preferences = {'priceRange': '20-60', 'categories': [], 'brands': []}
+    candidates = service._select_candidates(preferences, [], lazy_catalog)
+    before = lazy_catalog.products.materialized
+    picks = service._parse_recommendation_response('[]', lazy_catalog, preferences, [], fallback=candidates)
+    assert len(picks) == service.ranking.k
+    assert all(20 <= r["product"].price <= 60 for r in picks)
+    # only the offered fallback candidates were built, not the whole candidate list
+    assert lazy_catalog.products.materialized - before <= 40 < len(candidates)
@@ -0,0 +1,115 @@
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+from services.catalog import Product
+from services.ranking import RankingStage
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _random_candidates(rng):
+    products = [
+        Product(f"p{i}", "n", "d",
+                rng.choice([rng.uniform(1, 200), None, "x"]),
+                rng.choice("ABCD"[:rng.randint(1, 4)]),
+                rng.choice("abcdef"[:rng.randint(1, 6)]),
+                rating=rng.choice([None, rng.uniform(3, 5)]),
+                inventory=rng.choice([None, 0, 1, 5, 50, "?"]))
+        for i in range(rng.randint(0, 30))
+    ]
+    return [(rng.random(), product, i) for i, product in enumerate(products)]
+
+
+PRICE_RANGES = [(0, float('inf')), (10, 50), (100, float('inf')), (20, 20)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_vectorized_scores_match_score(seed):
+    stage = RankingStage()
+    rng = random.Random(seed)
+    for _ in range(200):
+        candidates = _random_candidates(rng)
+        if not candidates:
+            continue
+        min_price, max_price = rng.choice(PRICE_RANGES)
+        vectorized = stage.scores(
+            np.array([a for a, _, _ in candidates]),
+            np.array([p.rating or 0.0 for _, p, _ in candidates]),
+            np.array([_number(p.inventory) for _, p, _ in candidates]),
+            np.array([_number(p.price) for _, p, _ in candidates]),
+            min_price, max_price
+        )
+        expected = [stage.score(p, a, min_price, max_price) for a, p, _ in candidates]
+        assert np.allclose(vectorized, expected)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_select_constraints(seed):
+    stage = RankingStage()
+    rng = random.Random(100 + seed)
+    for _ in range(200):
+        candidates = _random_candidates(rng)
+        min_price, max_price = rng.choice(PRICE_RANGES)
+        available = [p for _, p, _ in candidates if stage.available(p)]
+
+        picks = stage.select(candidates, min_price, max_price)
+        assert len(picks) == min(stage.k, len(available))
+        assert all(stage.available(p) for _, p, _ in picks)
+        assert len({p.id for _, p, _ in picks}) == len(picks)
+
+        strict = stage.select(candidates, min_price, max_price, relax=False)
+        brands = [p.brand for _, p, _ in strict]
+        assert len(set(brands)) == len(brands)
+        if len(strict) == stage.k:
+            assert len({p.category for _, p, _ in strict}) >= stage.min_categories
+        # relaxing only fills slots the constraints left empty
+        assert [c[2] for c in stage.select(candidates, min_price, max_price)[:len(strict)]] == [c[2] for c in strict]
+
+
+def test_out_of_stock_is_never_picked():
+    stage = RankingStage()
+    candidates = [
+        (1.0, Product("a", "n", "d", 10, "X", "a", inventory=0), 0),
+        (0.5, Product("b", "n", "d", 10, "Y", "b", inventory=3), 1),
+        (0.1, Product("c", "n", "d", 10, "Z", "c"), 2)
+    ]
+    assert [c[2] for c in stage.select(candidates)] == [1, 2]
+    assert [c[2] for c in RankingStage(exclude_out_of_stock=False).select(candidates)] == [0, 1, 2]
+
+
+def test_selected_products_count_towards_constraints():
+    stage = RankingStage()
+    earlier = [Product("s", "n", "d", 10, "X", "a")]
+    candidates = [
+        (1.0, Product("a2", "n", "d", 10, "Y", "a"), 0),
+        (0.9, Product("s", "n", "d", 10, "X", "a"), 1),
+        (0.5, Product("b", "n", "d", 10, "X", "b"), 2),
+        (0.4, Product("c", "n", "d", 10, "Z", "c"), 3)
+    ]
+    # brand "a" is full and "s" is taken; the earlier X pick also costs "b" the diversity penalty
+    assert [c[2] for c in stage.select(candidates, selected=earlier, relax=False)] == [3, 2]
+
+
+def test_greedy_fills_when_a_full_set_exists_in_small_cases():
+    """Not a guarantee (see the class docstring), but the greedy pass should rarely miss one."""
+    stage = RankingStage()
+    rng = random.Random(7)
+    feasible = missed = 0
+    for _ in range(500):
+        candidates = _random_candidates(rng)
+        available = [p for _, p, _ in candidates if stage.available(p)]
+        if len(available) > 14:
+            continue
+        if any(len({p.brand for p in trio}) == 3 and len({p.category for p in trio}) >= 2
+               for trio in itertools.combinations(available, 3)):
+            feasible += 1
+            missed += len(stage.select(candidates, relax=False)) < 3
+    assert feasible and missed <= feasible * 0.05
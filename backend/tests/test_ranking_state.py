@@ -0,0 +1,70 @@
+import random
+
+from services.llm_service import LLMService
+from services.scoring_engine import RankingState
+
+PRICE_RANGES = ['all', '0-50', '50-100', '100-200', '200-1000', '25-300']
+
+
+def _ids(result):
+    count, pools = result
+    return count, [[p.id for p in pool] for pool in pools]
+
+
+def _random_pool_args(rng, catalog, liked):
+    categories, brands = sorted(catalog.categories()), sorted(catalog.brands())
+    return (
+        set(rng.sample(categories, rng.randint(0, 2))),
+        {p.category for p in liked},
+        {p.brand for p in liked} | set(rng.sample(brands, rng.randint(0, 2))),
+        set(rng.sample(categories, rng.randint(0, 2)))
+    )
+
+
+def test_session_state_matches_full_ranking(synthetic_catalog):
+    """A session's incrementally updated RankingState ranks exactly like the mock path from scratch."""
+    catalog = synthetic_catalog
+    service = LLMService({})
+    rng = random.Random(1)
+    categories, brands = sorted(catalog.categories()), sorted(catalog.brands())
+    preferences = {'priceRange': 'all', 'categories': [], 'brands': []}
+    liked = []
+    for step in range(300):
+        operation = rng.randrange(4)
+        if operation == 0:
+            product = catalog[rng.randrange(len(catalog))]
+            liked.remove(product) if product in liked else liked.append(product)
+        elif operation == 1:
+            category = rng.choice(categories)
+            selected = [c for c in preferences['categories'] if c != category]
+            preferences = {**preferences, 'categories': selected if category in preferences['categories'] else selected + [category]}
+        elif operation == 2:
+            brand = rng.choice(brands)
+            selected = [b for b in preferences['brands'] if b != brand]
+            preferences = {**preferences, 'brands': selected if brand in preferences['brands'] else selected + [brand]}
+        else:
+            preferences = {**preferences, 'priceRange': rng.choice(PRICE_RANGES)}
+
+        incremental = service._generate_mock_recommendations(
+            preferences, liked, catalog, ranking_state=service._ranking_state('session', catalog)
+        )
+        full = service._generate_mock_recommendations(preferences, liked, catalog)
+        assert ([(r['product'].id, r['explanation']) for r in incremental['recommendations']]
+                == [(r['product'].id, r['explanation']) for r in full['recommendations']]), step
+
+
+def test_ranking_state_matches_engine(synthetic_catalog):
+    engine = synthetic_catalog.engine
+    rng = random.Random(2)
+    state = RankingState(engine, k=3, in_stock_only=True)
+    for step in range(200):
+        liked = rng.sample(list(synthetic_catalog), rng.randint(0, 4))
+        pool_args = _random_pool_args(rng, synthetic_catalog, liked)
+        min_price, max_price = rng.choice([(0, float('inf')), (10, 80), (50, 300)])
+        exclude_ids = {p.id for p in liked}
+        boosted = rng.sample(range(len(synthetic_catalog)), rng.randint(0, 20))
+        state.update(*pool_args, min_price=min_price, max_price=max_price, exclude_ids=exclude_ids)
+        expected = engine.rank(*pool_args, min_price=min_price, max_price=max_price, exclude_ids=exclude_ids,
+                               k=3, boosted_positions=boosted, in_stock_only=True)
+        assert _ids(state.rank(boosted)) == _ids(expected), step
+
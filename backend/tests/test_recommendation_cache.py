@@ -0,0 +1,101 @@
+import asyncio
+
+from services.catalog import Product
+from services.llm_service import LLMService
+from services.recommendation_cache import RecommendationCache, SQLiteRecommendationCache, make_cache_key
+
+
+def _result(product_id):
+    product = Product(product_id, "Name", "Desc", 19.99, "Books", "Acme", features=["Hardcover"], inventory=3)
+    return {"recommendations": [{"product": product, "explanation": f"because {product_id}"}]}
+
+
+def test_lru_evicts_least_recently_used(fake_clock):
+    cache = RecommendationCache(max_entries=2, ttl_seconds=60, clock=fake_clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl(fake_clock):
+    cache = RecommendationCache(max_entries=10, ttl_seconds=60, clock=fake_clock)
+    cache.set("a", 1)
+    fake_clock.now += 59
+    assert "a" in cache and cache.get("a") == 1
+    fake_clock.now += 1
+    assert "a" not in cache
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["size"]) == (1, 1, 1, 0)
+
+
+def test_contains_does_not_count_or_refresh(fake_clock):
+    cache = RecommendationCache(max_entries=2, ttl_seconds=60, clock=fake_clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert "a" in cache
+    cache.set("c", 3)
+    assert "a" not in cache
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 0
+
+
+def test_zero_entries_disables_the_cache():
+    cache = RecommendationCache(max_entries=0)
+    cache.set("a", 1)
+    assert len(cache) == 0 and cache.get("a") is None
+
+
+def test_clear_counts_an_invalidation():
+    cache = RecommendationCache()
+    cache.set("a", 1)
+    cache.clear()
+    assert len(cache) == 0 and cache.stats()["invalidations"] == 1
+
+
+def test_cache_key_ignores_order_and_tracks_catalog_version():
+    key = make_cache_key(["B", "A"], ["y", "x"], 0, float('inf'), ["p2", "p1"], 3)
+    assert key == make_cache_key(["A", "B"], ["x", "y"], 0, float('inf'), ["p1", "p2"], 3)
+    assert key != make_cache_key(["A", "B"], ["x", "y"], 0, float('inf'), ["p1", "p2"], 4)
+    assert key != make_cache_key(["A", "B"], ["x", "y"], 0, 100, ["p1", "p2"], 3)
+
+
+
+def test_service_serves_repeats_from_cache_until_the_catalog_changes(synthetic_catalog):
+    service = LLMService({'cache_max_entries': 16})
+    preferences = {'priceRange': 'all', 'categories': [], 'brands': []}
+    liked = [synthetic_catalog[0], synthetic_catalog[1]]
+
+    async def recommend(liked_products, catalog=synthetic_catalog):
+        return await service.generate_recommendations(preferences, liked_products, catalog)
+
+    first = asyncio.run(recommend(liked))
+    assert asyncio.run(recommend(list(reversed(liked)))) == first
+    assert service.scheduler_stats["served"] == {"cache": 1, "llm": 0, "mock": 1}
+
+    service.invalidate_cache()
+    asyncio.run(recommend(liked))
+    assert service.scheduler_stats["served"]["mock"] == 2
+
+
+def test_sqlite_cache_round_trip_ttl_and_eviction(tmp_path, fake_clock):
+    cache = SQLiteRecommendationCache(str(tmp_path / "cache.db"), max_entries=2, ttl_seconds=60, clock=fake_clock)
+    cache.set("a", _result("p1"))
+    fake_clock.now += 1
+    cache.set("b", _result("p2"))
+    cached = cache.get("a")
+    assert cached["recommendations"][0]["explanation"] == "because p1"
+    assert cached["recommendations"][0]["product"].to_dict() == _result("p1")["recommendations"][0]["product"].to_dict()
+
+    # oldest written goes first, whatever was read since
+    fake_clock.now += 1
+    cache.set("c", _result("p3"))
+    assert "a" not in cache and "b" in cache and "c" in cache
+    assert len(cache) == 2
+
+    fake_clock.now += 60
+    assert cache.get("c") is None
+    assert cache.stats()["expirations"] == 1
@@ -0,0 +1,89 @@
+import asyncio
+
+from services.llm_service import LLMService
+
+PREFERENCES = {'priceRange': 'all', 'categories': [], 'brands': []}
+
+
+def _slow_service(config, monkeypatch):
+    """An LLMService whose computations take a moment, counting how many run."""
+    service = LLMService({'cache_max_entries': 64, **config})
+    compute = service._compute_recommendations
+    calls = []
+
+    async def slow_compute(*args, **kwargs):
+        calls.append(args[0])
+        await asyncio.sleep(0.02)
+        return await compute(*args, **kwargs)
+
+    monkeypatch.setattr(service, '_compute_recommendations', slow_compute)
+    return service, calls
+
+
+def test_identical_requests_share_one_computation(synthetic_catalog, monkeypatch):
+    service, calls = _slow_service({}, monkeypatch)
+    liked = [synthetic_catalog[0]]
+
+    async def run():
+        return await asyncio.gather(*[
+            service.generate_recommendations(PREFERENCES, liked, synthetic_catalog) for _ in range(5)
+        ])
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert service.request_stats["coalesced"] == 4
+    assert all(result is results[0] for result in results) and results[0]["recommendations"]
+    assert not service._in_flight
+
+
+def test_result_is_cached_when_every_caller_went_away(synthetic_catalog, monkeypatch):
+    service, calls = _slow_service({}, monkeypatch)
+    liked = [synthetic_catalog[1]]
+
+    async def run():
+        request = asyncio.ensure_future(service.generate_recommendations(PREFERENCES, liked, synthetic_catalog))
+        await asyncio.sleep(0.005)
+        request.cancel()
+        await asyncio.sleep(0.05)
+        return await service.generate_recommendations(PREFERENCES, liked, synthetic_catalog)
+
+    result = asyncio.run(run())
+    assert len(calls) == 1 and result["recommendations"]
+    assert service.scheduler_stats["served"]["cache"] == 1
+
+
+def test_prefetch_fills_the_next_category_toggles(synthetic_catalog):
+    service = LLMService({'cache_max_entries': 256, 'speculative_prefetch': True})
+    liked = [synthetic_catalog[2]]
+    category = sorted(synthetic_catalog.categories())[0]
+
+    async def run():
+        await service.generate_recommendations(PREFERENCES, liked, synthetic_catalog)
+        await service._prefetch_task
+        toggled = {**PREFERENCES, 'categories': [category]}
+        return await service.generate_recommendations(toggled, liked, synthetic_catalog)
+
+    result = asyncio.run(run())
+    assert service.request_stats["prefetched"] == len(synthetic_catalog.categories())
+    assert service.request_stats["prefetch_hits"] == 1
+    assert result == service._generate_mock_recommendations(
+        {**PREFERENCES, 'categories': [category]}, liked, synthetic_catalog)
+
+
+def test_prefetch_waits_while_requests_are_active(synthetic_catalog):
+    service = LLMService({'cache_max_entries': 256, 'speculative_prefetch': True})
+
+    async def run():
+        await service.generate_recommendations(PREFERENCES, [synthetic_catalog[3]], synthetic_catalog)
+        # a request in progress holds the prefetch back
+        service._active_requests += 1
+        service._idle.clear()
+        await asyncio.sleep(0.02)
+        held = service.request_stats["prefetched"]
+        service._active_requests -= 1
+        service._idle.set()
+        await service._prefetch_task
+        return held
+
+    assert asyncio.run(run()) == 0
+    assert service.request_stats["prefetched"] > 0
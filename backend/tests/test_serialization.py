@@ -0,0 +1,98 @@
+import json
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from services import serialization
+from services.catalog import Product
+from services.serialization import JSONBytesResponse, dumps, recommendations_json
+
+
+def _legacy(value):
+    # what FastAPI's JSONResponse produced from the to_dict()-converted result
+    return json.dumps(jsonable_encoder(value), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(',', ':')).encode('utf-8')
+
+
+def _result(catalog):
+    outside = Product("gone-1", "Ünïcode “quoted”", "line\nbreak", "12.50", "Books", "Acme",
+                      features=["a\tb"], tags=["é"], inventory=None)
+    return {
+        "recommendations": [
+            {"product": catalog.products[5], "explanation": "Matches your interest in ✓ audio", "score": 0.75},
+            {"product": outside, "explanation": 'Says "hi" \\ bye'},
+            {"product": catalog.products[1999], "explanation": ""}
+        ],
+        "source": "mock",
+        "count": 3
+    }
+
+
+def _converted(result):
+    return {**result, "recommendations": [{**r, "product": r["product"].to_dict()} for r in result["recommendations"]]}
+
+
+@pytest.fixture(params=[True, False], ids=["orjson", "stdlib"])
+def encoder(request, monkeypatch):
+    if request.param and serialization.orjson is None:
+        pytest.skip("orjson is not installed")
+    monkeypatch.setattr(serialization, "USE_ORJSON", request.param)
+
+
+def test_bodies_match_the_former_encoding(synthetic_catalog, encoder):
+    result = _result(synthetic_catalog)
+    assert recommendations_json(result, synthetic_catalog) == _legacy(_converted(result))
+    assert recommendations_json({"recommendations": []}, synthetic_catalog) == b'{"recommendations":[]}'
+
+
+def test_leading_members_come_first(synthetic_catalog, encoder):
+    result = _result(synthetic_catalog)
+    body = recommendations_json(result, synthetic_catalog, user_id="u-1")
+    assert body == _legacy({"user_id": "u-1", **_converted(result)})
+    assert body.startswith(b'{"user_id":"u-1","recommendations":[')
+
+
+def test_catalog_products_reuse_the_snapshot_fragment(synthetic_catalog):
+    fragment = synthetic_catalog.product_json(5)
+    assert synthetic_catalog.product_json(5) is fragment
+    assert serialization.product_json(synthetic_catalog.products[5], synthetic_catalog) is fragment
+    assert json.loads(fragment) == synthetic_catalog.products[5].to_dict()
+
+
+def test_dumps_agrees_with_and_without_orjson(monkeypatch):
+    value = {"a": [1, 2.5, None, True], "é": "“x”\n", "nested": {"k": -0.1}}
+    monkeypatch.setattr(serialization, "USE_ORJSON", False)
+    stdlib = dumps(value)
+    assert stdlib == _legacy(value)
+    if serialization.orjson is not None:
+        monkeypatch.setattr(serialization, "USE_ORJSON", True)
+        assert dumps(value) == stdlib
+
+
+def test_bytes_response_passes_bodies_through():
+    assert JSONBytesResponse(b'{"x":1}').body == b'{"x":1}'
+    assert JSONBytesResponse({"x": [1]}).body == b'{"x":[1]}'
+    assert JSONBytesResponse(b'{}').media_type == "application/json"
+
+
+def test_recommendations_endpoint_returns_the_encoded_body(client):
+    products = client.get("/api/products").json()
+    response = client.post("/api/recommendations", json={
+        "preferences": {"priceRange": "all", "categories": [], "brands": []},
+        "browsing_history": [products[0]["id"]]
+    })
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    body = response.json()
+    by_id = {p["id"]: p for p in products}
+    assert body["recommendations"]
+    assert all(r["product"] == by_id[r["product"]["id"]] for r in body["recommendations"])
+
+
+def test_browsing_history_resolves_to_catalog_products(synthetic_catalog):
+    from app import resolve_liked_products
+
+    first, second = synthetic_catalog.products[3], synthetic_catalog.products[8]
+    resolved = resolve_liked_products([], [first.id, "no-such-product", second.id], synthetic_catalog)
+    assert resolved[0] is first and resolved[1] is second and len(resolved) == 2
+    assert resolve_liked_products(["sent"], [first.id], synthetic_catalog) == ["sent"]
@@ -0,0 +1,116 @@
+import time
+
+from services.catalog import Catalog, Product
+from services.session_store import InMemorySessionBackend, SessionStore, SQLiteSessionBackend
+
+CATALOG = Catalog([
+    Product("p1", "n", "d", 10, "Books", "Acme"),
+    Product("p2", "n", "d", 10, "Books", "Zenith"),
+    Product("p3", "n", "d", 10, "Home", "Acme")
+], version=1)
+
+
+def test_session_deltas(client):
+    products = client.get("/api/products").json()
+    first, second = products[0], products[1]
+    created = client.post("/api/sessions", json={
+        "preferences": {"priceRange": "all", "categories": [], "brands": []},
+        "likedProductIds": [first["id"], "no-such-product"]
+    }).json()
+    session_id = created["session_id"]
+    assert created["likedProductIds"] == [first["id"]]
+    assert created["unknownProductIds"] == ["no-such-product"]
+    assert created["affinity"]["categories"] == {first["category"]: 1}
+
+    updated = client.patch(f"/api/sessions/{session_id}", json={
+        "like": [second["id"]], "unlike": [first["id"]], "preferences": {"categories": [second["category"]]}
+    }).json()
+    assert updated["likedProductIds"] == [second["id"]]
+    assert updated["affinity"]["brands"] == {second["brand"]: 1}
+    assert updated["preferences"]["categories"] == [second["category"]]
+    assert updated["preferences"]["priceRange"] == "all"
+    assert client.get(f"/api/sessions/{session_id}").json() == {**updated, "unknownProductIds": []}
+
+    recommendations = client.get(f"/api/sessions/{session_id}/recommendations")
+    assert recommendations.status_code == 200
+    picks = [r["product"]["id"] for r in recommendations.json()["recommendations"]]
+    assert picks and second["id"] not in picks
+
+    assert client.delete(f"/api/sessions/{session_id}").json() == {"deleted": session_id}
+    assert client.get(f"/api/sessions/{session_id}").status_code == 404
+    assert client.patch(f"/api/sessions/{session_id}", json={"like": [first["id"]]}).status_code == 404
+    assert client.get(f"/api/sessions/{session_id}/recommendations").status_code == 404
+
+
+def test_session_recommendations_match_stateless(client):
+    products = client.get("/api/products").json()
+    liked = [products[3]["id"], products[10]["id"]]
+    preferences = {"priceRange": "0-100", "categories": [], "brands": []}
+    session_id = client.post("/api/sessions", json={"preferences": preferences, "likedProductIds": liked}).json()["session_id"]
+    from_session = client.get(f"/api/sessions/{session_id}/recommendations").json()
+    stateless = client.post("/api/recommendations", json={"preferences": preferences, "browsing_history": liked}).json()
+    assert ([r["product"]["id"] for r in from_session["recommendations"]]
+            == [r["product"]["id"] for r in stateless["recommendations"]])
+    client.delete(f"/api/sessions/{session_id}")
+
+
+def test_deltas_keep_affinity_counts():
+    store = SessionStore()
+    session, unknown = store.create(CATALOG, preferences={"categories": ["Books"]}, liked_ids=["p1", "p3", "nope"])
+    assert unknown == ["nope"]
+    assert session.preferences == {"priceRange": "all", "categories": ["Books"], "brands": []}
+    assert session.category_counts == {"Books": 1, "Home": 1} and session.brand_counts == {"Acme": 2}
+
+    assert store.apply_delta(session, CATALOG, like=["p2", "p1"], unlike=["p3", "p9"]) == []
+    assert session.liked_ids == ["p1", "p2"]
+    assert session.category_counts == {"Books": 2} and session.brand_counts == {"Acme": 1, "Zenith": 1}
+
+    store.apply_delta(session, CATALOG, preferences={"priceRange": "0-50", "brands": None})
+    assert session.preferences == {"priceRange": "0-50", "categories": ["Books"], "brands": []}
+    assert store.get(session.session_id) is session
+
+
+def test_unlike_of_a_product_gone_from_the_catalog():
+    store = SessionStore()
+    session, _ = store.create(CATALOG, liked_ids=["p1"])
+    smaller = Catalog([Product("p2", "n", "d", 10, "Books", "Zenith")], version=2)
+    assert session.liked_products(smaller) == []
+    store.apply_delta(session, smaller, unlike=["p1"])
+    assert session.liked_ids == []
+    # counted when liked, left as is: the product's category is no longer known
+    assert session.category_counts == {"Books": 1}
+
+
+def test_memory_backend_lru_and_ttl(monkeypatch):
+    backend = InMemorySessionBackend(max_sessions=2, ttl_seconds=60)
+    store = SessionStore(backend)
+    first, _ = store.create(CATALOG)
+    second, _ = store.create(CATALOG)
+    assert store.get(first.session_id) is first
+    third, _ = store.create(CATALOG)
+    assert store.get(second.session_id) is None
+    assert len(backend) == 2
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert store.get(first.session_id) is None and store.get(third.session_id) is None
+
+
+def test_sqlite_backend_shares_sessions_between_stores(tmp_path, monkeypatch):
+    path = str(tmp_path / "sessions.db")
+    writer = SessionStore(SQLiteSessionBackend(path, ttl_seconds=60))
+    session, _ = writer.create(CATALOG, liked_ids=["p1", "p3"])
+    reader = SessionStore(SQLiteSessionBackend(path, ttl_seconds=60))
+    loaded = reader.get(session.session_id)
+    assert loaded is not session
+    assert loaded.to_dict() == session.to_dict()
+
+    reader.apply_delta(loaded, CATALOG, unlike=["p1"])
+    assert writer.get(session.session_id).liked_ids == ["p3"]
+    reader.delete(session.session_id)
+    assert writer.get(session.session_id) is None
+
+    kept, _ = writer.create(CATALOG)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert reader.get(kept.session_id) is None
@@ -0,0 +1,41 @@
+import os
+import threading
+
+import pytest
+
+from services.sqlite_util import LocalConnection
+
+
+def test_one_connection_per_thread(tmp_path):
+    connection = LocalConnection(str(tmp_path / "local.db"))
+    assert connection() is connection()
+    assert connection().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    other = []
+    thread = threading.Thread(target=lambda: other.append(connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not connection()
+
+
+def test_read_only_connections_cannot_write(tmp_path):
+    path = str(tmp_path / "local.db")
+    with LocalConnection(path)() as conn:
+        conn.execute("CREATE TABLE t (x)")
+    with pytest.raises(Exception, match="readonly"):
+        LocalConnection(path, read_only=True)().execute("INSERT INTO t VALUES (1)")
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_child_opens_its_own_connection(tmp_path):
+    connection = LocalConnection(str(tmp_path / "local.db"))
+    inherited = connection()
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        conn = connection()
+        ok = conn is not inherited and conn.execute("SELECT 1").fetchone() == (1,)
+        os.write(write, b"1" if ok else b"0")
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read, 1) == b"1"
+    assert connection() is inherited
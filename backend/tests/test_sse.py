@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+from services.llm_service import LLMService
+
+PREFERENCES = {'priceRange': 'all', 'categories': [], 'brands': []}
+
+
+def _events(response):
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_endpoint_sends_each_pick_then_done(client):
+    products = client.get("/api/products").json()
+    body = {"preferences": {"priceRange": "0-200", "categories": [], "brands": []},
+            "browsing_history": [products[4]["id"]]}
+    response = client.post("/api/recommendations/stream", json=body)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response)
+    assert [event for event, _ in events] == ["recommendation"] * 3 + ["done"]
+    assert events[-1][1] == {"count": 3}
+    picks = [data for event, data in events if event == "recommendation"]
+    assert {data["source"] for data in picks} <= {"mock", "cache"}
+
+    # the same picks as the plain endpoint
+    plain = client.post("/api/recommendations", json=body).json()["recommendations"]
+    assert [(p["product"], p["explanation"]) for p in picks] == [(p["product"], p["explanation"]) for p in plain]
+    replay = _events(client.post("/api/recommendations/stream", json=body))
+    assert {data["source"] for _, data in replay[:3]} == {"cache"}
+
+
+def test_session_stream(client):
+    products = client.get("/api/products").json()
+    session_id = client.post("/api/sessions", json={"likedProductIds": [products[5]["id"]]}).json()["session_id"]
+    events = _events(client.get(f"/api/sessions/{session_id}/recommendations/stream"))
+    assert [event for event, _ in events][-1] == "done" and events[-1][1]["count"] == 3
+    assert client.get("/api/sessions/unknown/recommendations/stream").status_code == 404
+
+
+def _llm_service(monkeypatch, chunks, stall_after=None):
+    """LLM mode with the completion stream replaced by the given text chunks."""
+    service = LLMService({'use_llm': True, 'api_key': 'test', 'cache_max_entries': 0, 'stream_stall_timeout': 0.05})
+
+    async def stream_completion(messages):
+        for i, chunk in enumerate(chunks):
+            if i == stall_after:
+                await asyncio.sleep(1)
+            yield chunk
+
+    monkeypatch.setattr(service, '_stream_completion', stream_completion)
+    return service
+
+
+def _stream(service, liked, catalog):
+    async def run():
+        try:
+            return [r async for r in service.stream_recommendations(PREFERENCES, liked, catalog)]
+        finally:
+            await service.aclose()
+    return asyncio.run(run())
+
+
+def _answer(*items):
+    text = "```json\n" + json.dumps([{"product_id": i, "explanation": f"pick {i}"} for i in items]) + "\n```"
+    # split mid-token, as a model stream would
+    return [text[i:i + 7] for i in range(0, len(text), 7)]
+
+
+def test_llm_picks_stream_and_invalid_ones_are_filled_by_the_mock(synthetic_catalog, monkeypatch):
+    catalog = synthetic_catalog
+    liked = [catalog[0]]
+    in_stock = [p for p in catalog if p.inventory and p is not catalog[0]]
+    first, second = in_stock[0], next(p for p in in_stock if p.brand != in_stock[0].brand)
+    service = _llm_service(monkeypatch, _answer(first.id, "no-such-product", catalog[0].id, second.id))
+    results = _stream(service, liked, catalog)
+    assert [(r["product"].id, r["source"]) for r in results[:2]] == [(first.id, "llm"), (second.id, "llm")]
+    assert results[0]["explanation"] == f"pick {first.id}"
+    assert len(results) == 3 and results[2]["source"] == "mock"
+    assert service.request_stats["stream_mock_fills"] == 1
+
+
+def test_stalled_stream_keeps_what_arrived(synthetic_catalog, monkeypatch):
+    catalog = synthetic_catalog
+    first = next(p for p in catalog if p.inventory and p is not catalog[0])
+    chunks = _answer(first.id, first.id)
+    # stall right after the first object closes
+    closed = next(i for i in range(len(chunks)) if "}" in chunks[i]) + 1
+    service = _llm_service(monkeypatch, chunks, stall_after=closed)
+    results = _stream(service, [catalog[0]], catalog)
+    assert [r["source"] for r in results] == ["llm", "mock", "mock"]
+    assert service.scheduler_stats["fallbacks"]["timeout"] == 1
+    assert service.breaker.state == "closed"
@@ -0,0 +1,38 @@
+"""
+Build the TF-IDF content index for the product catalog.
+
+ProductService loads the saved index at startup when it matches the catalog and
+otherwise rebuilds it in memory, so rerun this whenever products.json changes:
+
+    python tools/build_content_index.py [--data data/products.json] [--out data/content_index.npz]
+"""
+import argparse
+import os
+import sys
+import time
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+
+from config import config
+from services.content_index import ContentIndex
+from services.product_service import ProductService
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=config['DATA_PATH'])
+    parser.add_argument("--out", default=config['CONTENT_INDEX_PATH'])
+    args = parser.parse_args()
+
+    config['DATA_PATH'] = args.data
+    products = ProductService().get_all_products()
+
+    started = time.perf_counter()
+    index = ContentIndex.build(products)
+    index.save(args.out)
+    print(f"Indexed {index.size} products ({len(index.data)} terms) in {time.perf_counter() - started:.2f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
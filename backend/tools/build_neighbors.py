@@ -0,0 +1,45 @@
+"""
+Build the item-to-item neighbor tables for the product catalog.
+
+For every product, stores its top-N same-category, same-brand, complementary and
+content-similar products in data/neighbors.npy (memory-mapped at load) plus a
+JSON sidecar with the catalog fingerprint. ProductService ignores stale tables
+rather than rebuilding them, so rerun this whenever products.json changes:
+
+    python tools/build_neighbors.py [--data data/products.json] [--out data/neighbors.npy] [--depth 20] [--max-df 0.05]
+"""
+import argparse
+import os
+import sys
+import time
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+
+from config import config
+from services.llm_service import COMPLEMENTARY_CATEGORIES
+from services.neighbor_index import NeighborIndex
+from services.product_service import ProductService
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=config['DATA_PATH'])
+    parser.add_argument("--out", default=config['NEIGHBORS_PATH'])
+    parser.add_argument("--depth", type=int, default=20, help="neighbors kept per product and kind")
+    parser.add_argument("--max-df", type=float, default=0.05,
+                        help="content neighbors ignore terms in more than this fraction of products")
+    args = parser.parse_args()
+
+    config['DATA_PATH'] = args.data
+    catalog = ProductService().get_catalog()
+
+    started = time.perf_counter()
+    neighbors = NeighborIndex.build(catalog, COMPLEMENTARY_CATEGORIES, depth=args.depth, max_df=args.max_df)
+    neighbors.save(args.out)
+    print(f"Built neighbor tables for {neighbors.size} products (depth {neighbors.depth}) "
+          f"in {time.perf_counter() - started:.2f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
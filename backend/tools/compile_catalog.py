@@ -0,0 +1,46 @@
+"""
+Compile products.json into the binary columnar catalog (data/products.bin).
+
+ProductService memory-maps the compiled file instead of parsing JSON when it was
+compiled from the current products.json (same size and mtime), so every worker
+starts without a json.load and shares the catalog pages through the OS page
+cache. Rerun this whenever products.json changes:
+
+    python tools/compile_catalog.py [--data data/products.json] [--out data/products.bin]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+
+from config import config
+from services.catalog import Product
+from services.catalog_file import compile_catalog, source_stamp
+from services.content_index import catalog_fingerprint
+from services.neighbor_index import neighbor_fingerprint
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=config['DATA_PATH'])
+    parser.add_argument("--out", default=config['CATALOG_FILE_PATH'])
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    # stamp before reading, so an edit made while compiling leaves the output stale
+    source = source_stamp(args.data)
+    with open(args.data, 'r') as f:
+        products = [Product.from_dict(p) for p in json.load(f)]
+    # the fingerprints let ProductService validate the content index and neighbor tables without touching products
+    fingerprints = {"content": catalog_fingerprint(products), "neighbors": neighbor_fingerprint(products)}
+    compile_catalog(products, args.out, fingerprints=fingerprints, source=source)
+    print(f"Compiled {len(products)} products in {time.perf_counter() - started:.2f}s "
+          f"-> {args.out} ({os.path.getsize(args.out) / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+Answers POST /v1/chat/completions with three catalog products that appear in
+the prompt, after an optional artificial delay, so the real LLM path can be
+exercised without network access. Requests with "stream": true get the same
+answer as server-sent chunks, optionally paced and stalled to exercise the
+streaming endpoint's fill-in. Failures and slow tail responses can be injected
+to exercise hedging and the circuit breaker, also at runtime via POST /fake/faults:
+
+    python tools/fake_llm_server.py --port 9000 --delay 0.5 [--data data/products.json]
+    python tools/fake_llm_server.py --port 9000 --chunk-delay 0.05 --stall-after 1
+    python tools/fake_llm_server.py --port 9000 --fail-rate 0.2 --slow-rate 0.05 --slow-delay 3
+    curl -X POST localhost:9000/fake/faults -d '{"fail_rate": 1.0}'
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://localhost:9000/v1 USE_LLM=true uvicorn app:app
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+
+from config import DATA_PATH
+
+app = FastAPI(title="Fake LLM Server")
+settings = {
+    "delay": 0.0,
+    "chunk_delay": 0.0,
+    "chunk_size": 16,
+    "stall_after": None,
+    "fail_rate": 0.0,
+    "slow_rate": 0.0,
+    "slow_delay": 0.0
+}
+counters = {"requests": 0, "failed": 0, "slow": 0}
+
+PRODUCTS = []
+POSITIONS = {}
+
+
+def _load_products(path):
+    with open(path, 'r') as f:
+        PRODUCTS[:] = json.load(f)
+    POSITIONS.clear()
+    POSITIONS.update({p['id']: i for i, p in enumerate(PRODUCTS)})
+
+
+def _pick_products(prompt, count=3):
+    # only look at the candidate section so liked products aren't echoed back
+    marker = "AVAILABLE PRODUCTS"
+    candidates_text = prompt.split(marker, 1)[1] if marker in prompt else prompt
+    # candidate lines start with the id (id|name|...); a lookup instead of a catalog scan keeps big catalogs fast
+    found = {line.split('|', 1)[0].strip() for line in candidates_text.splitlines() if '|' in line}
+    positions = sorted(POSITIONS[product_id] for product_id in found if product_id in POSITIONS)
+    return [PRODUCTS[i] for i in positions[:count]]
+
+
+def _stream(content, model):
+    """OpenAI-style chat.completion.chunk events carrying `content` a few characters at a time."""
+    def event(delta, finish_reason=None):
+        chunk = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        return f"data: {json.dumps(chunk)}\n\n"
+
+    async def events():
+        yield event({"role": "assistant", "content": ""})
+        closed_objects = 0
+        size = settings["chunk_size"]
+        for start in range(0, len(content), size):
+            piece = content[start:start + size]
+            yield event({"content": piece})
+            closed_objects += piece.count("}")
+            if settings["stall_after"] is not None and closed_objects >= settings["stall_after"]:
+                # simulate a model that stops producing tokens mid-answer
+                await asyncio.sleep(3600)
+            if settings["chunk_delay"]:
+                await asyncio.sleep(settings["chunk_delay"])
+        yield event({}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    prompt = body["messages"][-1]["content"]
+    counters["requests"] += 1
+
+    if random.random() < settings["fail_rate"]:
+        counters["failed"] += 1
+        return JSONResponse(status_code=500, content={"error": {"message": "injected failure", "type": "server_error"}})
+    if random.random() < settings["slow_rate"]:
+        counters["slow"] += 1
+        await asyncio.sleep(settings["slow_delay"])
+    if settings["delay"]:
+        await asyncio.sleep(settings["delay"])
+
+    recommendations = [
+        {
+            "product_id": p['id'],
+            "explanation": f"Based on your interest in {p['category']}, you'll love {p['name']} for its {p['description'].split(',')[0].lower()}"
+        }
+        for p in _pick_products(prompt)
+    ]
+    if body.get("stream"):
+        return _stream(json.dumps(recommendations), body.get("model", "fake"))
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": json.dumps(recommendations)},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    }
+
+
+@app.post("/fake/faults")
+async def set_faults(request: Request):
+    """Change fault injection settings (any of the keys in `settings`) while running."""
+    settings.update({key: value for key, value in (await request.json()).items() if key in settings})
+    return {"settings": settings, "counters": counters}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--data", default=DATA_PATH, help="catalog the answers are picked from")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--chunk-size", type=int, default=16, help="characters per streamed chunk")
+    parser.add_argument("--stall-after", type=int, default=None,
+                        help="stop streaming (without closing) once this many objects were sent")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests delayed by --slow-delay")
+    parser.add_argument("--slow-delay", type=float, default=2.0, help="extra seconds for slow requests")
+    args = parser.parse_args()
+    _load_products(args.data)
+    settings["delay"] = args.delay
+    settings["fail_rate"] = args.fail_rate
+    settings["slow_rate"] = args.slow_rate
+    settings["slow_delay"] = args.slow_delay
+    settings["chunk_delay"] = args.chunk_delay
+    settings["chunk_size"] = args.chunk_size
+    settings["stall_after"] = args.stall_after
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,48 @@
+"""
+Import products.json into the SQLite catalog database (data/catalog.db).
+
+With CATALOG_BACKEND=sqlite the service reads the catalog from this database
+instead of products.json. Products are fetched on demand, category/brand/price
+queries run against its indexes and /api/products/search uses its FTS5 index.
+The import replaces the whole catalog in one transaction. Running servers
+keep reading the previous catalog until it commits, and pick up the new one
+on the next reload (or automatically with CATALOG_WATCH_INTERVAL set):
+
+    python tools/import_catalog_db.py [--data data/products.json] [--db data/catalog.db]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+
+from config import config
+from services.catalog import Product
+from services.catalog_db import import_products
+from services.catalog_file import source_stamp
+from services.content_index import catalog_fingerprint
+from services.neighbor_index import neighbor_fingerprint
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=config['DATA_PATH'])
+    parser.add_argument("--db", default=config['CATALOG_DB_PATH'])
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    source = source_stamp(args.data)
+    with open(args.data, 'r') as f:
+        products = [Product.from_dict(p) for p in json.load(f)]
+    # the fingerprints let the service validate the content index and neighbor tables without reading every product
+    fingerprints = {"content": catalog_fingerprint(products), "neighbors": neighbor_fingerprint(products)}
+    import_products(products, args.db, fingerprints=fingerprints, source=source)
+    print(f"Imported {len(products)} products in {time.perf_counter() - started:.2f}s "
+          f"-> {args.db} ({os.path.getsize(args.db) / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import './styles/App.css';
 import Catalog from './components/Catalog';
 import LikedProducts from './components/BrowsingHistory';
 import Recommendations from './components/Recommendations';
 import UserPreferences from './components/UserPreferences';
-import { fetchProducts, getRecommendations } from './services/api';
+import {
+  fetchProducts,
+  getRecommendations,
+  createSession,
+  updateSession,
+  getSessionRecommendations,
+  streamSessionRecommendations
+} from './services/api';
 // State variables
 function App() {
 
@@ -31,6 +38,33 @@ function App() {
     brands: []
   });
   
+  // Server-side session; null until created (or if the backend doesn't have one)
+  const sessionIdRef = useRef(null);
+  // Deltas are sent in order; recommendations wait for the last one to land
+  const sessionSyncRef = useRef(Promise.resolve());
+  
+  // The create heads the delta queue, so likes and filter changes made before it
+  // resolves are sent to the new session instead of being dropped
+  useEffect(() => {
+    sessionSyncRef.current = sessionSyncRef.current.then(() => createSession()
+      .then(session => { sessionIdRef.current = session.session_id; })
+      .catch(error => console.error('Error creating session:', error)));
+  }, []);
+  
+  // Queue a delta for the session; failures just drop the session so the next
+  // recommendation request recreates it from the full client state
+  const syncSession = (delta) => {
+    sessionSyncRef.current = sessionSyncRef.current.then(async () => {
+      if (!sessionIdRef.current) return;
+      try {
+        await updateSession(sessionIdRef.current, delta);
+      } catch (error) {
+        console.error('Error updating session:', error);
+        sessionIdRef.current = null;
+      }
+    });
+  };
+  
   useEffect(() => {
     const loadProducts = async () => {
       try {
@@ -92,9 +126,11 @@ function App() {
     if (likedProducts.includes(productId)) {
       // If product is already liked, unlike it
       setLikedProducts(likedProducts.filter(id => id !== productId));
+      syncSession({ unlike: [productId] });
     } else {
       // If product is not liked, like it
       setLikedProducts([...likedProducts, productId]);
+      syncSession({ like: [productId] });
     }
   };
   
@@ -112,6 +148,66 @@ function App() {
       ...userPreferences,
       ...changes
     });
+    syncSession({ preferences: changes });
+  };
+  
+  // Session recommendations, recreating the session from full state if it was
+  // lost (expired, server restart, or a failed delta). With onProgress they are
+  // streamed, and onProgress sees each recommendation as soon as it arrives.
+  const fetchSessionRecommendations = async (onProgress) => {
+    await sessionSyncRef.current;
+    const request = sessionId => (onProgress
+      ? streamSessionRecommendations(sessionId, onProgress)
+      : getSessionRecommendations(sessionId));
+    if (sessionIdRef.current) {
+      try {
+        return await request(sessionIdRef.current);
+      } catch (error) {
+        if (error.status !== 404) throw error;
+      }
+    }
+    const session = await createSession(userPreferences, likedProducts);
+    sessionIdRef.current = session.session_id;
+    return await request(session.session_id);
+  };
+  
+  // While recommendations are showing, keep them in step with filter and like
+  // toggles; the server applies each change to the session's ranking as a delta
+  const hasRecommendations = recommendations.length > 0;
+  useEffect(() => {
+    if (!hasRecommendations || likedProducts.length === 0) return;
+    let cancelled = false;
+    const timer = setTimeout(() => {
+      fetchSessionRecommendations()
+        .then(data => {
+          if (!cancelled && data && Array.isArray(data.recommendations)) {
+            setRecommendations(data.recommendations);
+          }
+        })
+        .catch(error => console.error('Error refreshing recommendations:', error));
+    }, 300);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [userPreferences, likedProducts]);
+  
+  // Original stateless request carrying every liked product
+  const fetchFullStateRecommendations = async () => {
+    // Format liked products to include necessary product details
+    const likedProductsObjects = likedProducts.map(id => {
+      const product = products.find(p => p.id === id);
+      return {
+        id: product.id,
+        name: product.name,
+        category: product.category,
+        brand: product.brand,
+        price: product.price
+      };
+    });
+    
+    return await getRecommendations(userPreferences, likedProductsObjects);
   };
   
   // Get recommendations based on preferences and liked products
@@ -125,19 +221,14 @@ function App() {
     setIsLoading(true);
     
     try {
-      // Format liked products to include necessary product details
-      const likedProductsObjects = likedProducts.map(id => {
-        const product = products.find(p => p.id === id);
-        return {
-          id: product.id,
-          name: product.name,
-          category: product.category,
-          brand: product.brand,
-          price: product.price
-        };
-      });
-      
-      const data = await getRecommendations(userPreferences, likedProductsObjects);
+      let data;
+      try {
+        data = await fetchSessionRecommendations(setRecommendations);
+      } catch (error) {
+        // Fall back to sending the full state in one request
+        console.error('Session recommendations failed, sending full state:', error);
+        data = await fetchFullStateRecommendations();
+      }
       
       // Check if we have valid data
       if (!data || typeof data !== 'object') {
@@ -172,6 +263,7 @@ function App() {
   // Clear liked products
   const handleClearLikes = () => {
     setLikedProducts([]);
+    syncSession({ unlike: likedProducts });
   };
   
   // Toggle recommendations modal
@@ -42,4 +42,84 @@ export const getRecommendations = async (preferences, likes) => {
     console.error('Error getting recommendations:', error);
     throw error;
   }
-};
\ No newline at end of file
+};
+
+// Sessions keep liked products and preferences on the server, so the client
+// only sends what changed instead of the whole state on every request.
+const sessionRequest = async (path, method, body) => {
+  const response = await fetch(`${API_BASE_URL}/sessions${path}`, {
+    method,
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: body === undefined ? undefined : JSON.stringify(body),
+  });
+
+  if (!response.ok) {
+    const error = new Error(`HTTP error ${response.status}`);
+    error.status = response.status;
+    throw error;
+  }
+
+  return await response.json();
+};
+
+// Start a session, optionally seeded with the full current state
+export const createSession = async (preferences, likedProductIds = []) => {
+  return sessionRequest('', 'POST', { preferences, likedProductIds });
+};
+
+// Send a delta: { like: [ids], unlike: [ids], preferences: {changed fields} }
+export const updateSession = async (sessionId, delta) => {
+  return sessionRequest(`/${sessionId}`, 'PATCH', delta);
+};
+
+// Recommendations for the session's server-side state
+export const getSessionRecommendations = async (sessionId) => {
+  return sessionRequest(`/${sessionId}/recommendations`, 'GET');
+};
+
+// Read a text/event-stream response, calling onEvent(event, data) for each event
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      const data = [];
+      block.split('\n').forEach(line => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+      });
+      if (data.length) onEvent(event, JSON.parse(data.join('\n')));
+    }
+  }
+};
+
+// Session recommendations streamed one at a time; onProgress gets the list so far
+export const streamSessionRecommendations = async (sessionId, onProgress) => {
+  const response = await fetch(`${API_BASE_URL}/sessions/${sessionId}/recommendations/stream`);
+  if (!response.ok) {
+    const error = new Error(`HTTP error ${response.status}`);
+    error.status = response.status;
+    throw error;
+  }
+
+  const recommendations = [];
+  await readEventStream(response, (event, data) => {
+    if (event === 'recommendation') {
+      recommendations.push(data);
+      if (onProgress) onProgress([...recommendations]);
+    } else if (event === 'error') {
+      throw new Error(data.detail);
+    }
+  });
+  return { recommendations };
+};